@@ -0,0 +1,125 @@
+"""Checks the app factory, Config overrides and that the pipeline loads lazily.
+
+    python Tests/appFactory_Test.py
+
+What gets imported is checked in fresh interpreters, run in a scratch
+directory so their stores start empty; cold-start times are measured by
+startup_benchmark.py.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(HERE, '..', 'backend')
+sys.path.insert(0, BACKEND)
+
+from config import Config
+
+CHILD = r'''
+import io, json, os, sys
+sys.path.insert(0, sys.argv[1])
+mode, image = sys.argv[2], sys.argv[3]
+state = {}
+import app as api
+state['import'] = sorted(m for m in ('cv2', 'numpy') if m in sys.modules)
+if mode == 'module_app':
+    state['lazy_app'] = 'app' not in vars(api)
+    flask_app = api.app
+else:
+    from config import Config
+    flask_app = api.create_app(Config(UPLOAD_FOLDER='store', WARM_UP=mode, OCR_BACKEND='local'))
+state['create'] = sorted(m for m in ('cv2', 'numpy') if m in sys.modules)
+state['backends_built'] = api._ocr_backends is not None
+client = flask_app.test_client()
+with open(image, 'rb') as f:
+    response = client.post('/upload', data={'image': (io.BytesIO(f.read()), 'm.jpg'), 'device_id': 'meter'},
+                           content_type='multipart/form-data')
+state['reading'] = response.get_json().get('meter_reading')
+state['upload'] = sorted(m for m in ('cv2', 'numpy') if m in sys.modules)
+print(json.dumps(state))
+'''
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def child(mode):
+    env = dict(os.environ, WARM_UP='off', OCR_BACKEND='local', LOG_LEVEL='ERROR')
+    out = subprocess.run([sys.executable, '-c', CHILD, BACKEND, mode, os.path.join(HERE, 'meter_sample.jpg')],
+                         cwd=tempfile.mkdtemp(prefix='app_factory_test_'), env=env, capture_output=True,
+                         text=True, timeout=300)
+    return json.loads(out.stdout.strip().splitlines()[-1]) if out.returncode == 0 else {'stderr': out.stderr}
+
+
+def test_loading():
+    lazy, eager, module_app = child('off'), child('eager'), child('module_app')
+    return [check("importing app and create_app() load neither OpenCV nor NumPy; the first upload does",
+                  lazy.get('import') == lazy.get('create') == [] and not lazy.get('backends_built')
+                  and lazy.get('upload') == ['cv2', 'numpy'] and lazy.get('reading') == '15709'),
+            check("WARM_UP=eager loads the pipeline before create_app() returns",
+                  eager.get('import') == [] and eager.get('create') == ['cv2', 'numpy']
+                  and eager.get('backends_built') and eager.get('reading') == '15709'),
+            check("`app:app` is built from the environment on first access",
+                  module_app.get('lazy_app') is True and module_app.get('reading') == '15709')]
+
+
+def test_config():
+    previous = os.environ.get('OCR_JPEG_QUALITY')
+    os.environ['OCR_JPEG_QUALITY'] = '70'
+    try:
+        from_env = Config().OCR_JPEG_QUALITY
+        overridden = Config(OCR_JPEG_QUALITY=60).OCR_JPEG_QUALITY
+    finally:
+        if previous is None:
+            del os.environ['OCR_JPEG_QUALITY']
+        else:
+            os.environ['OCR_JPEG_QUALITY'] = previous
+
+    paths = Config(UPLOAD_FOLDER='store', READINGS_DB='')
+    derived = (paths.OCR_USAGE_DB, paths.CALIBRATION_FILE, paths.FRAME_QUALITY_FILE, paths.READINGS_DB)
+
+    refused = []
+    for overrides in ({'OCR_JPEG_QUALTY': 60}, {'WARM_UP': 'sometimes'}):
+        try:
+            Config(**overrides)
+        except ValueError:
+            refused.append(overrides)
+    return [check("settings come from the environment when a Config is built, overrides win",
+                  from_env == 70 and overridden == 60),
+            check("stores without a path of their own follow an UPLOAD_FOLDER override",
+                  derived == (os.path.join('store', 'ocr_usage.db'), os.path.join('store', 'calibration.json'),
+                              os.path.join('store', 'frame_quality.json'), '')),
+            check("a misspelt setting or an unknown WARM_UP is refused", len(refused) == 2)]
+
+
+def test_reconfigure():
+    import app as api
+
+    workdir = tempfile.mkdtemp(prefix='app_factory_test_')
+
+    def store_for(readings_db):
+        api.create_app(Config(OCR_API_KEY='test-key', UPLOAD_FOLDER=workdir, READINGS_DB=readings_db, WARM_UP='off'))
+        return api.get_readings_store()
+
+    first = store_for(os.path.join(workdir, 'first.db'))
+    disabled = store_for('')
+    second = store_for(os.path.join(workdir, 'second.db'))
+    second.add('meter', '15709', 3600)
+    return [check("a second create_app() in the process builds the stores from its own settings",
+                  disabled is None and second is not first
+                  and os.path.exists(os.path.join(workdir, 'second.db')))]
+
+
+def main():
+    results = [*test_loading(), *test_config(), *test_reconfigure()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
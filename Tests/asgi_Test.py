@@ -0,0 +1,195 @@
+"""Drives backend/asgi.py in-process against the stub OCR server.
+
+    python Tests/asgi_Test.py
+
+No uvicorn needed: requests are fed to the ASGI app as receive/send
+messages. The stub answers every OCR call after STUB_LATENCY seconds, so
+200 concurrent uploads finish in a few latencies only if the OCR calls
+really overlap.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+
+from ocr_stub_server import StubOCRServer
+
+STUB_LATENCY = 0.5
+CONCURRENT = 200
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pic3.jpg')
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def frames(n):
+    """n distinct JPEGs of the sample meter, so neither the result cache nor coalescing kicks in"""
+    image = cv2.resize(cv2.imread(SAMPLE), None, fx=0.5, fy=0.5)
+    rng = np.random.default_rng(7)
+    out = []
+    for _ in range(n):
+        noise = rng.integers(0, 6, image.shape, dtype=np.uint8)
+        out.append(cv2.imencode('.jpg', cv2.add(image, noise))[1].tobytes())
+    return out
+
+
+def multipart(fields, image, boundary='asgitestboundary'):
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode()
+             for k, v in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="m.jpg"\r\n'
+                 f'Content-Type: image/jpeg\r\n\r\n'.encode() + image + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+async def call(app, method, path, body=b'', headers=None, chunks=None, query=''):
+    """One request through the ASGI app; chunks splits the body over several messages without a length"""
+    headers = dict(headers or {})
+    if chunks is None:
+        headers['content-length'] = str(len(body))
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    else:
+        size = -(-len(body) // chunks)
+        pieces = [body[i:i + size] for i in range(0, len(body), size)]
+        messages = [{'type': 'http.request', 'body': p, 'more_body': i < len(pieces) - 1}
+                    for i, p in enumerate(pieces)]
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+        'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    status = sent[0]['status']
+    payload = b''.join(m.get('body', b'') for m in sent[1:])
+    try:
+        return status, json.loads(payload)
+    except ValueError:
+        return status, payload.decode()
+
+
+async def run_checks(app, server):
+    results = []
+    image = frames(1)[0]
+
+    body, content_type = multipart({'device_id': 'asgi-contract'}, image)
+    status, reply = await call(app, 'POST', '/upload', body, {'content-type': content_type})
+    results.append(check("multipart /upload returns the Flask contract",
+                         status == 200 and reply.get('meter_reading') == '15709' and 'payload_bytes' in reply))
+
+    status, reply = await call(app, 'POST', '/upload/raw', image,
+                               {'content-type': 'image/jpeg', 'x-device-id': 'asgi-raw'}, chunks=7)
+    results.append(check("chunked raw upload is read in full", status == 200 and reply.get('meter_reading') == '15709'))
+
+    status, _ = await call(app, 'POST', '/upload/raw', b'x' * (1024 * 1024 + 1), {'content-type': 'image/jpeg'})
+    status_type, _ = await call(app, 'POST', '/upload/raw', image, {'content-type': 'text/plain'})
+    results.append(check("oversized body gets 413, wrong type 415", status == 413 and status_type == 415))
+
+    status, reply = await call(app, 'POST', '/upload', *multipart({}, b'')[:1],
+                               {'content-type': multipart({}, b'')[1]}, query='backend=nope')
+    results.append(check("unknown backend gets 400", status == 400 and 'available' in reply))
+
+    status, queued = await call(app, 'POST', '/upload/raw', image,
+                                {'content-type': 'image/jpeg', 'x-device-id': 'asgi-async'}, query='async=1')
+    job_status, job = await call(app, 'GET', f"/jobs/{queued.get('job_id')}", query='wait=10')
+    unknown, _ = await call(app, 'GET', '/jobs/nope')
+    results.append(check("?async=1 queues a job that GET /jobs/<id> answers",
+                         status == 202 and job_status == 200 and job['result'].get('meter_reading') == '15709'
+                         and unknown == 404))
+
+    requests_before = server.requests
+    batch = frames(CONCURRENT)
+    started = time.perf_counter()
+    replies = await asyncio.gather(*[
+        call(app, 'POST', '/upload/raw', data, {'content-type': 'image/jpeg', 'x-device-id': f'meter-{i}'})
+        for i, data in enumerate(batch)
+    ])
+    elapsed = time.perf_counter() - started
+    ok = sum(1 for status, reply in replies if status == 200 and reply.get('meter_reading') == '15709')
+    print(f"   {CONCURRENT} uploads in {elapsed:.2f}s, {server.requests - requests_before} OCR calls, "
+          f"{server.connections} connections (sequential would take {CONCURRENT * STUB_LATENCY:.0f}s)")
+    results.append(check(f"{CONCURRENT} concurrent uploads all read", ok == CONCURRENT))
+    results.append(check("OCR calls overlap", elapsed < CONCURRENT * STUB_LATENCY / 10))
+    return results
+
+
+async def cancelled_leader():
+    """Followers of a coalesced call whose leader is cancelled still get an answer"""
+    from ocr_backends import OCRBackend
+    from quota import QuotaGovernor
+
+    class SlowClient:
+        calls = 0
+
+        async def request_detailed(self, image):
+            SlowClient.calls += 1
+            await asyncio.sleep(0.2)
+            return '15709', None, None
+
+    governor = QuotaGovernor(OCRBackend(), monthly_limit=0, rate_per_minute=0)
+    client = SlowClient()
+    leader = asyncio.ensure_future(governor.request_detailed_async(b'same', client))
+    await asyncio.sleep(0.05)
+    followers = [asyncio.ensure_future(governor.request_detailed_async(b'same', client)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    leader.cancel()
+    try:
+        answers = await asyncio.wait_for(asyncio.gather(*followers), 2)
+    except asyncio.TimeoutError:
+        answers = None
+    return check("when the leader of a coalesced call is cancelled a follower takes over",
+                 answers == [('15709', None, None)] * 2 and SlowClient.calls == 2)
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='asgi_test_')
+    server = StubOCRServer(latency=STUB_LATENCY).start()
+    os.environ.update({
+        'OCR_API_KEY': 'test-key',
+        'OCR_API_URL': server.url,
+        'UPLOAD_FOLDER': workdir,
+        'OCR_RATE_PER_MINUTE': '0',
+        'OCR_MONTHLY_QUOTA': '0',
+        'CHANGE_THRESHOLD': '-1',
+        'AUTO_CALIBRATE': 'false',
+        'VALIDATE_READINGS': 'false',
+        'RAW_UPLOAD_MAX_BYTES': str(1024 * 1024),
+        'ASGI_CPU_WORKERS': '4',
+        'LOG_LEVEL': 'WARNING',
+    })
+
+    import asgi
+    app = asgi.create_asgi_app()
+
+    async def session():
+        await app.startup()
+        try:
+            return await run_checks(app, server)
+        finally:
+            await app.shutdown()
+
+    try:
+        results = asyncio.run(session()) + [asyncio.run(cancelled_leader())]
+    finally:
+        server.stop()
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,121 @@
+"""Checks /upload/batch: multipart and archive input, per-image results, the batch limit and streaming.
+
+    python Tests/batch_Test.py
+
+Every image is the same photo with a different trailing byte, so each
+one misses the result cache and goes through preprocessing and OCR.
+"""
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from ocr_stub_server import StubOCRServer, app_config
+
+STUB_LATENCY = 0.3
+
+with open(os.path.join(HERE, 'pic1.jpg'), 'rb') as f:
+    PHOTO = f.read()
+_serial = iter(range(1, 10 ** 6))
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def fresh_image():
+    """The photo with bytes after its end marker: decodes the same, hashes differently"""
+    return PHOTO + next(_serial).to_bytes(4, 'big')
+
+
+def archive(kind, members):
+    buf = io.BytesIO()
+    if kind == 'zip':
+        with zipfile.ZipFile(buf, 'w') as z:
+            for name, data in members.items():
+                z.writestr(name, data)
+    else:
+        with tarfile.open(fileobj=buf, mode='w:gz') as t:
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                t.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='batch_test_')
+    server = StubOCRServer(latency=STUB_LATENCY).start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server, BATCH_OCR_CONCURRENCY=4, BATCH_MAX_IMAGES=6))
+    client = flask_app.test_client()
+    results = []
+    try:
+        files = [(io.BytesIO(fresh_image()), f'{i}.jpg') for i in range(4)] + [(io.BytesIO(b'garbage'), 'bad.jpg')]
+        started = time.perf_counter()
+        multipart = lines(client.post('/upload/batch', data={'images': files}, content_type='multipart/form-data'))
+        elapsed = time.perf_counter() - started
+        statuses = {r['filename']: r['status'] for r in multipart}
+        results.append(check("one NDJSON line per image, a broken image failing on its own",
+                             sorted(r['index'] for r in multipart) == list(range(5))
+                             and statuses == {'0.jpg': 200, '1.jpg': 200, '2.jpg': 200, '3.jpg': 200, 'bad.jpg': 500}
+                             and all(r['meter_reading'] == '15709' for r in multipart if r['status'] == 200)))
+        print(f"   4 images in {elapsed:.2f}s (OCR alone would take {4 * STUB_LATENCY:.1f}s one at a time)")
+        results.append(check("OCR calls for a batch overlap", elapsed < 4 * STUB_LATENCY))
+
+        members = {'frames/a.jpg': fresh_image(), 'frames/b.jpg': fresh_image(), 'notes.txt': b'not a frame'}
+        zipped = lines(client.post('/upload/batch', data=archive('zip', members), content_type='application/zip'))
+        tarred = lines(client.post('/upload/batch', data=archive('tar', {'c.jpg': fresh_image()}),
+                                   content_type='application/gzip'))
+        results.append(check("zip and tar.gz bodies are read, members that are not images skipped",
+                             sorted(r['filename'] for r in zipped) == ['a.jpg', 'b.jpg']
+                             and [r['filename'] for r in tarred] == ['c.jpg']
+                             and all(r['status'] == 200 for r in zipped + tarred)))
+
+        files = [(io.BytesIO(fresh_image()), f'{i}.jpg') for i in range(8)]
+        limited = lines(client.post('/upload/batch', data={'images': files}, content_type='multipart/form-data'))
+        results.append(check("images past BATCH_MAX_IMAGES are refused with one 413 line",
+                             sum(r['status'] == 200 for r in limited) == 6
+                             and [r['index'] for r in limited if r['status'] == 413] == [6]))
+
+        from batch import run_batch
+        from extraction import extract_reading
+
+        events = []
+
+        def images():
+            for i in range(6):
+                events.append('read')
+                yield f'{i}.jpg', fresh_image()
+
+        for _ in run_batch(images(), api.get_ocr_backend(), extract_reading, api.get_batch_pool(), window=2):
+            events.append('result')
+        ahead = max(events[:i].count('read') - events[:i].count('result') for i in range(len(events) + 1))
+        results.append(check(f"results stream while the input is read, at most the window ahead ({ahead})",
+                             events.index('result') < len(events) - events[::-1].index('read') - 1
+                             and ahead <= 2 and events.count('result') == 6))
+    finally:
+        server.stop()
+        if api._batch_pool is not None:
+            api._batch_pool.shutdown()
+
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,304 @@
+"""Offline accuracy & latency benchmark over the labelled Tests/ images.
+
+Runs every image in benchmark_manifest.json through the same stages the
+/upload memory path uses (decode -> calibrate -> crop -> filter -> encode
+-> OCR -> extract) and reports accuracy, per-stage latency percentiles,
+peak memory and throughput as JSON, so two commits can be compared:
+
+    python benchmark.py --output before.json
+    ... change something ...
+    python benchmark.py --baseline before.json
+
+OCR backends:
+    recorded  replays OCR.space responses saved with --record, so the run
+              is offline but the OCR stage still sees real API output
+              (default once benchmark_recordings.json exists)
+    local     the offline digit engine (default until then, no network)
+    ocrspace  the live API (needs OCR_API_KEY); with --record the responses
+              are written to the recordings file for later replays
+
+Each image is auto-calibrated as a device's first frame would be, since
+/upload calibrates per device by default; --no-calibrate uses the fixed
+default crop, which misses the counter on most of the photos.
+
+--profile runs the filter chain with another filter_engine profile, to
+check a cheaper one reads as many meters right before it is served:
+
+    python benchmark.py --backend ocrspace --output bilateral.json
+    python benchmark.py --backend ocrspace --profile guided --baseline bilateral.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from calibration import ROICalibrator
+from extraction import extract_candidates
+from filter_engine import PROFILES
+from local_ocr import LocalDigitEngine
+from ocr_backends import OCRBackend
+from ocr_client import OCRSpaceClient
+from preprocessing import PREPROCESS_CONFIG, config_signature, crop_display, decode_image, filter_display, \
+    prepare_for_ocr
+
+MANIFEST = os.path.join(HERE, 'benchmark_manifest.json')
+RECORDINGS = os.path.join(HERE, 'benchmark_recordings.json')
+STAGES = ('decode', 'calibrate', 'crop', 'filter', 'encode', 'ocr', 'extract')
+PERCENTILES = (50, 90, 95, 99)
+
+
+class RecordedResponses(OCRBackend):
+    """Replays OCR.space text + word boxes saved by a --record run, keyed by image file"""
+    name = 'recorded'
+
+    def __init__(self, path=RECORDINGS):
+        with open(path) as f:
+            recordings = json.load(f)
+        self.signature = recordings.get('config_signature')
+        self.calibrate = recordings.get('calibrate', False)
+        self.responses = recordings.get('responses', {})
+        self.current = None
+
+    def request(self, image):
+        text, _, error = self.request_detailed(image)
+        return text, error
+
+    def request_detailed(self, image):
+        entry = self.responses.get(self.current)
+        if entry is None:
+            return None, None, f"No recorded response for {self.current}"
+        return entry.get('text'), entry.get('words'), entry.get('error')
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarise(values):
+    summary = {f'p{p}': round(percentile(values, p), 3) for p in PERCENTILES} if values else {}
+    if values:
+        summary.update(mean=round(sum(values) / len(values), 3), max=round(max(values), 3), count=len(values))
+    return summary
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_image(path, backend, calibrator, device_id):
+    """One pass of the upload pipeline; returns (reading, candidate, error, stage timings in ms)"""
+    timings = {}
+
+    def timed(stage, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings[stage] = (time.perf_counter() - started) * 1000
+        return result
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    img = timed('decode', decode_image, data)
+    if img is None:
+        return None, None, 'Could not decode image', timings
+
+    config = PREPROCESS_CONFIG
+    if calibrator is not None:
+        config = timed('calibrate', calibrator.config_for, device_id, img)
+    display = timed('crop', crop_display, img, config)
+    processed = display if backend.wants_display else timed('filter', filter_display, display, config)
+    if not backend.accepts_arrays:
+        processed, _ = timed('encode', prepare_for_ocr, processed, config)
+
+    ocr_text, words, error = timed('ocr', backend.request_detailed, processed)
+    if error:
+        return None, None, error, timings
+    candidates = timed('extract', extract_candidates, ocr_text, words)
+    best = candidates[0] if candidates else None
+    return (best['reading'] if best else None), best, None, timings
+
+
+def run(entries, backend, repeat=1, warmup=1, calibrate=False, trace_memory=False):
+    calibrator = ROICalibrator(path=None) if calibrate else None
+    for entry in entries[:warmup]:
+        # Template building, lazy imports and the first TLS handshake are not steady state
+        if isinstance(backend, RecordedResponses):
+            backend.current = entry['file']
+        run_image(os.path.join(HERE, entry['file']), backend, calibrator, entry['file'])
+
+    if trace_memory:
+        tracemalloc.start()
+    stage_times = {stage: [] for stage in STAGES}
+    totals, results = [], []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for entry in entries:
+            if isinstance(backend, RecordedResponses):
+                backend.current = entry['file']
+            image_started = time.perf_counter()
+            reading, best, error, timings = run_image(
+                os.path.join(HERE, entry['file']), backend, calibrator, entry['file'])
+            totals.append((time.perf_counter() - image_started) * 1000)
+            for stage, ms in timings.items():
+                stage_times[stage].append(ms)
+            results.append({
+                'file': entry['file'],
+                'meter': entry.get('meter'),
+                'expected': entry['reading'],
+                'reading': reading,
+                'correct': reading == entry['reading'],
+                'confidence': best['confidence'] if best else None,
+                'strategy': best['strategy'] if best else None,
+                'error': error,
+                'ms': {stage: round(ms, 3) for stage, ms in timings.items()},
+            })
+    elapsed = time.perf_counter() - started
+    heap_peak = None
+    if trace_memory:
+        heap_peak = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+
+    correct = sum(r['correct'] for r in results)
+    report = {
+        'commit': git_commit(),
+        'backend': backend.name,
+        'calibrate': calibrate,
+        'profile': PREPROCESS_CONFIG['profile'],
+        'config_signature': config_signature(),
+        'images': len(entries),
+        'runs': len(results),
+        'accuracy': round(correct / len(results), 4) if results else None,
+        'correct': correct,
+        'errors': sum(1 for r in results if r['error']),
+        'throughput_images_per_sec': round(len(results) / elapsed, 2) if elapsed else None,
+        'latency_ms': {'total': summarise(totals),
+                       **{stage: summarise(ms) for stage, ms in stage_times.items() if ms}},
+        'memory_mb': {'peak_rss': peak_rss_mb(), 'python_heap_peak': heap_peak},
+        'results': results,
+    }
+    return report
+
+
+def record(entries, client, path=RECORDINGS, calibrate=False):
+    """Saves live OCR.space responses for every manifest image"""
+    calibrator = ROICalibrator(path=None) if calibrate else None
+    responses = {}
+    for entry in entries:
+        with open(os.path.join(HERE, entry['file']), 'rb') as f:
+            img = decode_image(f.read())
+        config = calibrator.config_for(entry['file'], img) if calibrator else PREPROCESS_CONFIG
+        payload, _ = prepare_for_ocr(filter_display(crop_display(img, config), config), config)
+        text, words, error = client.request_detailed(payload)
+        responses[entry['file']] = {'text': text, 'words': words, 'error': error}
+        print(f"🎙️ {entry['file']}: {text!r}" if not error else f"❌ {entry['file']}: {error}")
+    with open(path, 'w') as f:
+        json.dump({'config_signature': config_signature(), 'calibrate': calibrate, 'responses': responses},
+                  f, indent=2)
+    print(f"💾 Saved {len(responses)} responses to {path}")
+
+
+def compare(report, baseline):
+    """Prints accuracy/latency/throughput deltas; returns False when accuracy regressed"""
+    print(f"\n📊 vs baseline {baseline.get('commit') or '(unknown commit)'}")
+    print(f"   accuracy   {baseline['accuracy']} -> {report['accuracy']}")
+    print(f"   throughput {baseline['throughput_images_per_sec']} -> {report['throughput_images_per_sec']} img/s")
+    for stage, summary in report['latency_ms'].items():
+        before = baseline.get('latency_ms', {}).get(stage, {})
+        if 'p50' in summary and 'p50' in before:
+            print(f"   {stage:<10} p50 {before['p50']:>9.3f} -> {summary['p50']:>9.3f} ms   "
+                  f"p95 {before['p95']:>9.3f} -> {summary['p95']:>9.3f} ms")
+    return (report['accuracy'] or 0) >= (baseline['accuracy'] or 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--manifest', default=MANIFEST)
+    parser.add_argument('--backend', choices=('local', 'recorded', 'ocrspace'),
+                        help='default: recorded if the recordings file exists, else local')
+    parser.add_argument('--recordings', default=RECORDINGS)
+    parser.add_argument('--record', action='store_true', help='save live OCR.space responses and exit')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--calibrate', action=argparse.BooleanOptionalAction, default=True,
+                        help='auto-calibrate the ROI per image (default), as /upload does per device')
+    parser.add_argument('--profile', choices=PROFILES, help='filter chain profile (default: the served one)')
+    parser.add_argument('--trace-memory', action='store_true', help='also track the Python heap peak (slower)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='JSON report from an earlier commit to compare against')
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        entries = json.load(f)['images']
+    if args.profile:
+        # Part of config_signature: replaying recordings made with another profile warns
+        PREPROCESS_CONFIG['profile'] = args.profile
+    if args.backend is None:
+        args.backend = 'recorded' if os.path.exists(args.recordings) else 'local'
+        print(f"🔌 Backend: {args.backend}", file=sys.stderr)
+
+    if args.backend == 'ocrspace' or args.record:
+        client = OCRSpaceClient(os.getenv('OCR_API_KEY'), overlay=True)
+        if args.record:
+            record(entries, client, args.recordings, calibrate=args.calibrate)
+            return 0
+        backend = client
+    elif args.backend == 'recorded':
+        if not os.path.exists(args.recordings):
+            parser.error(f"{args.recordings} not found: record it once with OCR_API_KEY set and --record")
+        backend = RecordedResponses(args.recordings)
+        if backend.signature != config_signature() or backend.calibrate != args.calibrate:
+            print("⚠️ Recordings were made with a different preprocessing config; re-record for exact replays")
+    else:
+        backend = LocalDigitEngine()
+
+    report = run(entries, backend, repeat=args.repeat, warmup=args.warmup,
+                 calibrate=args.calibrate, trace_memory=args.trace_memory)
+    backend.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.output}: accuracy={report['accuracy']} "
+              f"throughput={report['throughput_images_per_sec']} img/s")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            if not compare(report, json.load(f)):
+                print("❌ Accuracy regressed")
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
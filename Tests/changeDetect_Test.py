@@ -0,0 +1,97 @@
+"""Checks that unchanged-frame detection never skips a frame whose reading changed.
+
+    python Tests/changeDetect_Test.py
+
+Uses the synthetic counter frames of digitCells_Test.py; the end-to-end
+check runs the Flask app with digit cells off, so the change detector is
+what decides whether OCR is called.
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+
+from digitCells_Test import calibrated_crop, display_of, draw_frame
+from ocr_stub_server import StubOCRServer, app_config
+
+HOUR = 3600
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def noisy(frame, seed, gain=1.0):
+    """The same frame re-exposed, with sensor noise and a JPEG round trip"""
+    rng = np.random.default_rng(seed)
+    frame = np.clip(frame.astype(float) * gain + rng.normal(0, 6, frame.shape), 0, 255).astype(np.uint8)
+    return cv2.imdecode(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])[1], cv2.IMREAD_COLOR)
+
+
+def test_detector():
+    from change_detect import ChangeDetector
+
+    detector = ChangeDetector()
+    detector.accept('m', detector.signature(display_of(draw_frame('15709'))), '15709')
+    # Every single-drum change, plus the readings the 8x8 dHash could not tell from 15709
+    changed = {'15709'[:i] + d + '15709'[i + 1:] for i in range(5) for d in '0123456789'} - {'15709'}
+    changed |= {'15710', '16000', '99999'}
+    skipped = [reading for reading in sorted(changed)
+               if detector.match('m', detector.signature(display_of(draw_frame(reading))))[0] is not None]
+    same = [detector.match('m', detector.signature(display_of(noisy(draw_frame('15709'), seed, gain))))[0]
+            for seed, gain in ((1, 1.0), (2, 0.8), (3, 1.15))]
+    return [check(f"no changed reading is taken for the last one ({len(changed)} tried, skipped {skipped})",
+                  not skipped),
+            check("the same reading re-exposed and re-encoded is unchanged", same == ['15709'] * 3)]
+
+
+def test_end_to_end():
+    workdir = tempfile.mkdtemp(prefix='change_detect_test_')
+    server = StubOCRServer(text='kW-h\n15709.\n').start()
+    calibration = os.path.join(workdir, 'calibration.json')
+    with open(calibration, 'w') as f:
+        json.dump({'meter': {'crop': calibrated_crop(), 'confidence': 1.0, 'calibrated_at': 0, 'misses': 0}}, f)
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server, CALIBRATION_FILE=calibration,
+                                          READINGS_DB=os.path.join(workdir, 'readings.db'), DIGIT_CELLS=False))
+    client = flask_app.test_client()
+
+    def post(frame, at):
+        data = cv2.imencode('.jpg', frame)[1].tobytes()
+        return client.post('/upload', data={'image': (io.BytesIO(data), 'm.jpg'), 'device_id': 'meter',
+                                            'captured_at': str(at)},
+                           content_type='multipart/form-data').get_json()
+
+    try:
+        post(draw_frame('15709'), HOUR)
+        server.text = 'kW-h\n15710.\n'
+        changed = post(draw_frame('15710'), 2 * HOUR)
+        requests = server.requests
+        unchanged = post(noisy(draw_frame('15710'), 1), 3 * HOUR)
+        skipped_calls = server.requests - requests
+    finally:
+        server.stop()
+    return [check("a frame one drum on is sent to OCR and read",
+                  changed.get('meter_reading') == '15710' and not changed.get('ocr_skipped')),
+            check("the same frame again skips OCR and keeps the reading's confidence",
+                  unchanged.get('ocr_skipped') is True and skipped_calls == 0
+                  and unchanged.get('confidence') == changed.get('confidence') is not None)]
+
+
+def main():
+    results = [*test_detector(), *test_end_to_end()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
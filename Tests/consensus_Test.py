@@ -0,0 +1,110 @@
+"""Checks consensus voting over preprocessing variants and the result-cache keys.
+
+    python Tests/consensus_Test.py
+
+Voting is driven with a fake backend that answers from a list, so the
+number of variants OCR'd can be counted; the cache checks go through the
+Flask app and the stub OCR server.
+"""
+import io
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+
+from ocr_backends import OCRBackend
+from ocr_stub_server import StubOCRServer, app_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+class ListBackend(OCRBackend):
+    """Answers each call with the next text in `answers`"""
+    name = 'list'
+    accepts_arrays = True
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def request(self, image):
+        with self.lock:
+            answer = self.answers[min(self.calls, len(self.answers) - 1)]
+            self.calls += 1
+        return answer, None
+
+
+def test_voting():
+    from extraction import extract_reading
+    from variants import VariantStats, read_with_consensus
+
+    crop = cv2.imread(os.path.join(HERE, 'pic1.jpg'))[200:400, 300:700]
+    pool = ThreadPoolExecutor(max_workers=3)
+    try:
+        agreeing = ListBackend(['15709'])
+        early = read_with_consensus(crop, agreeing, extract_reading, pool, VariantStats(), concurrency=1, agree=2)
+        split = ListBackend(['15709', '15710', '15709'])
+        outvoted = read_with_consensus(crop, split, extract_reading, pool, VariantStats(), concurrency=1, agree=2)
+    finally:
+        pool.shutdown()
+
+    stats = VariantStats()
+    stats.record({'otsu': '15709', 'gray': '15710'}, '15709')
+    return [check("voting stops once two variants agree",
+                  early['reading'] == '15709' and early['votes'] == 2 and agreeing.calls == 2),
+            check("a reading one variant disagrees with is outvoted",
+                  outvoted['reading'] == '15709' and outvoted['votes'] == 2 and split.calls == 3),
+            check("a variant that agreed with the vote is tried before one that did not",
+                  stats.ordered(['gray', 'otsu']) == ['otsu', 'gray'])]
+
+
+def test_cache_keys():
+    workdir = tempfile.mkdtemp(prefix='consensus_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server))
+    client = flask_app.test_client()
+    with open(os.path.join(HERE, 'pic1.jpg'), 'rb') as f:
+        image = f.read()
+
+    def upload(query=''):
+        return client.post(f'/upload{query}', data={'image': (io.BytesIO(image), 'm.jpg')},
+                           content_type='multipart/form-data').get_json()
+
+    try:
+        batch = client.post('/upload/batch', data={'images': [(io.BytesIO(image), 'm.jpg')]},
+                            content_type='multipart/form-data').get_data(as_text=True)
+        single = upload()
+        requests = server.requests
+        consensus = upload('?consensus=1')
+        consensus_calls = server.requests - requests
+        again = upload('?consensus=1')
+    finally:
+        server.stop()
+    return [check("a reading from /upload/batch answers the same image on /upload",
+                  '"meter_reading": "15709"' in batch and single.get('cache_hit') is True),
+            check("the consensus pipeline keeps its own cache entries",
+                  consensus.get('cache_hit') is False and consensus_calls > 0 and again.get('cache_hit') is True)]
+
+
+def main():
+    results = [*test_voting(), *test_cache_keys()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,157 @@
+"""Checks per-digit recognition on synthetic counter frames.
+
+    python Tests/digitCells_Test.py
+
+Frames are drawn with OpenCV: five white-on-black drums in a window, any
+of which can be caught mid-roll. The end-to-end checks run the Flask app
+against the stub OCR server with a pre-calibrated device.
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+
+from calibration import PAD_X, PAD_Y
+from ocr_stub_server import StubOCRServer, app_config
+
+FRAME_W, FRAME_H = 640, 480
+WINDOW = (120, 180, 400, 80)  # x, y, w, h
+HOUR = 3600
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def draw_drum(digit, roll=0.0):
+    """One drum face; roll is how far (0-1) it has turned from digit towards digit + 1"""
+    _, _, w, h = WINDOW
+    pitch = w // 5
+    drum = np.zeros((h, pitch), np.uint8)
+    for value, offset in ((digit, -roll), ((digit + 1) % 10, 1 - roll)):
+        baseline = int(h / 2 + 22 + offset * h)
+        cv2.putText(drum, str(value), (pitch // 2 - 16, baseline), cv2.FONT_HERSHEY_SIMPLEX, 1.8, 255, 4)
+    return drum
+
+
+def draw_frame(reading, rolls=None):
+    frame = np.full((FRAME_H, FRAME_W, 3), 200, np.uint8)
+    x, y, w, h = WINDOW
+    drums = [draw_drum(int(d), (rolls or {}).get(i, 0.0)) for i, d in enumerate(reading)]
+    frame[y:y + h, x:x + w] = cv2.cvtColor(np.hstack(drums), cv2.COLOR_GRAY2BGR)
+    return frame
+
+
+def calibrated_crop():
+    x, y, w, h = WINDOW
+    return [(y - h * PAD_Y) / FRAME_H, (y + h * (1 + PAD_Y)) / FRAME_H,
+            (x - w * PAD_X) / FRAME_W, (x + w * (1 + PAD_X)) / FRAME_W]
+
+
+def display_of(frame):
+    from preprocessing import PREPROCESS_CONFIG, crop_display
+
+    return crop_display(frame, dict(PREPROCESS_CONFIG, crop=calibrated_crop()))
+
+
+def test_changed_cells():
+    from digit_cells import DigitCellCache
+
+    cache = DigitCellCache()
+    first = cache.frame('m', display_of(draw_frame('15709')))
+    cache.accept('m', first, '15709')
+    second = cache.frame('m', display_of(draw_frame('15710')))
+    return check("only the drums that turned are sent for recognition",
+                 first.changed == [0, 1, 2, 3, 4] and second.partial and second.changed == [3, 4])
+
+
+def test_rolling():
+    from digit_cells import is_rolling, split_cells
+
+    display = display_of(draw_frame('15709', rolls={4: 0.5}))
+    flags = [is_rolling(cell) for cell in split_cells(display)]
+    return check("a drum between two digits is detected as rolling", flags == [False, False, False, False, True])
+
+
+def test_rounding():
+    from digit_cells import DigitCellCache
+
+    cache = DigitCellCache()
+    cache.accept('m', cache.frame('m', display_of(draw_frame('15709'))), '15709')
+
+    # Last drum half way 9 -> 0 drags the tens drum along; neither has finished, so the reading stays
+    carrying = cache.frame('m', display_of(draw_frame('15709', rolls={3: 0.5, 4: 0.5})))
+    # Last drum already on 0: the tens drum still mid-roll has completed its step
+    carried = cache.frame('m', display_of(draw_frame('15700', rolls={3: 0.5})))
+    return check("mid-roll drums are rounded from their neighbour",
+                 carrying.changed == [] and carrying.merge('') == '15709'
+                 and carried.changed == [4] and carried.merge('0') == '15710')
+
+
+def test_end_to_end():
+    workdir = tempfile.mkdtemp(prefix='digit_cells_test_')
+    server = StubOCRServer(text='kW-h\n15709.\n').start()
+    calibration = os.path.join(workdir, 'calibration.json')
+    with open(calibration, 'w') as f:
+        json.dump({'meter': {'crop': calibrated_crop(), 'confidence': 1.0, 'calibrated_at': 0, 'misses': 0}}, f)
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server, CALIBRATION_FILE=calibration,
+                                          READINGS_DB=os.path.join(workdir, 'readings.db')))
+    client = flask_app.test_client()
+
+    def post(reading, at, rolls=None, exposure=0):
+        data = cv2.imencode('.jpg', cv2.add(draw_frame(reading, rolls), exposure))[1].tobytes()
+        return client.post('/upload', data={'image': (io.BytesIO(data), 'm.jpg'), 'device_id': 'meter',
+                                            'captured_at': str(at)},
+                           content_type='multipart/form-data').get_json()
+
+    try:
+        results = []
+        first = post('15709', HOUR)
+        server.text = '10'
+        second = post('15710', 2 * HOUR)
+        results.append(check("a turned drum is read from its cells, the rest from cache",
+                             first['meter_reading'] == '15709' and 'digit_cells' not in first
+                             and second['meter_reading'] == '15710' and second['digit_cells'] == [3, 4]
+                             and second['payload_bytes'] < first['payload_bytes']))
+
+        server.text = 'kW-h\n15711.\n'
+        third = post('15711', 3 * HOUR)
+        results.append(check("cells that do not read as digits fall back to the whole display",
+                             third['meter_reading'] == '15711' and third.get('digit_cells_fallback') is True))
+
+        requests = server.requests
+        fourth = post('15711', 4 * HOUR, exposure=10)
+        results.append(check("a frame with no drum moved skips OCR and keeps the reading's confidence",
+                             fourth['meter_reading'] == '15711' and fourth['ocr_skipped'] and server.requests == requests
+                             and fourth['confidence'] == third['confidence'] is not None))
+
+        # No cell counts as moved any more: only CHANGE_THRESHOLD can tell the turned drum from noise
+        api.get_digit_cells().threshold = 0.5
+        server.text = 'kW-h\n15712.\n'
+        fifth = post('15712', 5 * HOUR)
+        results.append(check("CHANGE_THRESHOLD, not DIGIT_CELL_THRESHOLD, decides whether a frame is unchanged",
+                             fifth['meter_reading'] == '15712' and not fifth['ocr_skipped']
+                             and fourth['change_distance'] <= api.settings.CHANGE_THRESHOLD))
+        return results
+    finally:
+        server.stop()
+
+
+def main():
+    results = [test_changed_cells(), test_rolling(), test_rounding(), *test_end_to_end()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
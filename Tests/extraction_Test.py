@@ -0,0 +1,87 @@
+"""Checks how readings are pulled out of OCR text and ranked by confidence.
+
+    python Tests/extraction_Test.py
+
+The texts are shaped like what OCR.space returns for the counter crops.
+"""
+import io
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from extraction import extract_candidates, extract_reading, parse_overlay
+from ocr_stub_server import StubOCRServer, app_config
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def best(text, words=None):
+    candidates = extract_candidates(text, words)
+    return (candidates[0]['reading'], candidates[0]['strategy']) if candidates else None
+
+
+def word(text, left, top, height):
+    return {'WordText': text, 'Left': left, 'Top': top, 'Width': height * 0.6 * len(text), 'Height': height}
+
+
+def test_strategies():
+    ranked = extract_candidates('SN 2024117\nkW-h\n15709.\n')
+    return [check("the decimal drum's trailing dot marks the reading",
+                  best('kW-h\n15709.\n') == ('15709', 'decimal')),
+            check("drums read as separate digits are joined", best('1 5 7 0 9\n') == ('15709', 'spaced')),
+            check("OCR artifacts between drums are dropped", best("15•70'9") == ('15709', 'word')),
+            check("a longer serial number ranks below the reading, confidences best first",
+                  ranked[0]['reading'] == '15709'
+                  and all(a['confidence'] >= b['confidence'] for a, b in zip(ranked, ranked[1:]))
+                  and all(0 < c['confidence'] <= 1 for c in ranked)),
+            check("text without five digits gives no reading",
+                  extract_candidates('kW-h 230V') == [] and extract_reading('') is None)]
+
+
+def test_overlay():
+    # Two five-digit words; the meter's drums are the tall ones in the middle
+    result = {'TextOverlay': {'Lines': [
+        {'Words': [word('40000', 0, 0, 10)]},
+        {'Words': [word('15709', 20, 30, 40)]},
+        {'Words': [word('50Hz', 0, 90, 10)]},
+    ]}}
+    words = parse_overlay(result)
+    return [check("without geometry the first five-digit word wins", best('40000\n15709\n50Hz') == ('40000', 'word')),
+            check("with the overlay the tallest, most central word wins",
+                  best('40000\n15709\n50Hz', words) == ('15709', 'word')
+                  and parse_overlay({'TextOverlay': {'Lines': []}}) == [] and parse_overlay({}) is None)]
+
+
+def test_upload():
+    workdir = tempfile.mkdtemp(prefix='extraction_test_')
+    server = StubOCRServer(text='SN 2024117\nkW-h\n15709.\n').start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server))
+    with open(os.path.join(HERE, 'pic3.jpg'), 'rb') as f:
+        image = f.read()
+    try:
+        body = flask_app.test_client().post('/upload', data={'image': (io.BytesIO(image), 'm.jpg')},
+                                            content_type='multipart/form-data').get_json()
+    finally:
+        server.stop()
+    return [check("/upload answers with the best candidate's confidence and strategy",
+                  body.get('meter_reading') == '15709' and body.get('strategy') == 'decimal'
+                  and body.get('confidence', 0) >= 0.9)]
+
+
+def main():
+    results = [*test_strategies(), *test_overlay(), *test_upload()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,71 @@
+"""Checks the buffered filter chain against the original one and the profile gate.
+
+    python Tests/filterEngine_Test.py
+
+Latency and pixel agreement per profile are measured by
+preprocess_benchmark.py; these checks cover what must always hold.
+"""
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+import cv2
+import numpy as np
+
+from filter_engine import PROFILES, FilterEngine
+from ocr_stub_server import app_config
+from preprocess_benchmark import legacy_chain, load_crops
+from preprocessing import PREPROCESS_CONFIG
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def test_engine():
+    crops = load_crops()
+    engine = FilterEngine()
+    config = dict(PREPROCESS_CONFIG, profile='bilateral')
+    same = all(np.array_equal(engine.filter(crop, config), legacy_chain(crop, config)) for crop in crops)
+
+    engine.filter(crops[0], config)
+    allocations = engine.allocations
+    first, second = engine.filter(crops[0], config), engine.filter(crops[1], config)
+
+    outputs = {profile: FilterEngine().filter(crops[0], dict(PREPROCESS_CONFIG, profile=profile))
+               for profile in PROFILES}
+    return [check("the bilateral profile matches the original chain pixel for pixel", same),
+            check("same-sized crops reuse the buffers and get their own output",
+                  engine.allocations == allocations and not np.shares_memory(first, second)),
+            check("every profile returns a binary image of the crop's size",
+                  all(out.shape == crops[0].shape[:2] and not np.any((out != 0) & (out != 255))
+                      for out in outputs.values()))]
+
+
+def test_profile_gate():
+    workdir = tempfile.mkdtemp(prefix='filter_engine_test_')
+
+    import app as api
+
+    api.create_app(app_config(workdir, PREPROCESS_PROFILE='clahe'))
+    try:
+        api.load_preprocessing()
+        refused = False
+    except ValueError:
+        refused = True
+    return [check("a profile not yet benchmarked for reading accuracy is refused",
+                  refused and PREPROCESS_CONFIG['profile'] == 'bilateral')]
+
+
+def main():
+    results = [*test_engine(), *test_profile_gate()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,155 @@
+"""Checks the frame-quality gate on the sample photos and degraded copies of them.
+
+    python Tests/frameQuality_Test.py
+
+Degradations are made with OpenCV: darkened, washed out, a glare spot
+over the counter region and a heavy blur. The end-to-end checks run the
+Flask app against the stub OCR server, which must not be called for a
+refused frame.
+"""
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+
+from ocr_stub_server import StubOCRServer, app_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE = os.path.join(HERE, 'pic3.jpg')
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def degraded(image, kind):
+    from preprocessing import PREPROCESS_CONFIG
+
+    if kind == 'too_dark':
+        return (image * 0.15).astype(np.uint8)
+    if kind == 'overexposed':
+        return cv2.add(image, 180)
+    if kind == 'glare':
+        height, width = image.shape[:2]
+        start_y, end_y, start_x, end_x = PREPROCESS_CONFIG['crop']
+        centre = (int(width * (start_x + end_x) / 2), int(height * (start_y + end_y) / 2))
+        spot = image.copy()
+        cv2.ellipse(spot, centre, (int(width * 0.15), int(height * 0.1)), 0, 0, 360, (255, 255, 255), -1)
+        return spot
+    if kind == 'blurry':
+        return cv2.GaussianBlur(image, (0, 0), 8)
+    raise ValueError(kind)
+
+
+def test_samples_pass():
+    from frame_quality import FrameQualityGate
+    from preprocessing import PREPROCESS_CONFIG
+
+    gate = FrameQualityGate()
+    refused = {}
+    for path in sorted(glob.glob(os.path.join(HERE, '*.jpg'))):
+        reason, _ = gate.check(cv2.imread(path), crop=PREPROCESS_CONFIG['crop'])
+        if reason:
+            refused[os.path.basename(path)] = reason
+    return check(f"every sample photo passes the default gate {refused or ''}".rstrip(), not refused)
+
+
+def test_reasons():
+    from frame_quality import FrameQualityGate
+    from preprocessing import PREPROCESS_CONFIG
+
+    gate = FrameQualityGate()
+    image = cv2.imread(SAMPLE)
+    kinds = ['too_dark', 'overexposed', 'glare', 'blurry']
+    reasons = [gate.check(degraded(image, kind), crop=PREPROCESS_CONFIG['crop'])[0] for kind in kinds]
+
+    timings = []
+    for _ in range(20):
+        started = time.perf_counter()
+        gate.check(image, crop=PREPROCESS_CONFIG['crop'])
+        timings.append((time.perf_counter() - started) * 1000)
+    median = sorted(timings)[len(timings) // 2]
+    return [check("dark, washed out, glared and blurred frames each get their own reason", reasons == kinds),
+            check(f"a {image.shape[1]}x{image.shape[0]} frame is judged in {median:.1f} ms", median < 20)]
+
+
+def test_device_thresholds():
+    from frame_quality import FrameQualityGate
+    from preprocessing import PREPROCESS_CONFIG
+
+    path = os.path.join(tempfile.mkdtemp(prefix='frame_quality_test_'), 'frame_quality.json')
+    gate = FrameQualityGate(path=path)
+    blurred = degraded(cv2.imread(SAMPLE), 'blurry')
+    gate.set_thresholds('soft-lens', {'min_sharpness': 0})
+
+    reloaded = FrameQualityGate(path=path)
+    try:
+        reloaded.set_thresholds('soft-lens', {'min_sharpnes': 1})
+        typo_refused = False
+    except ValueError:
+        typo_refused = True
+    crop = PREPROCESS_CONFIG['crop']
+    return check("per-device thresholds loosen one camera only and survive a restart",
+                 reloaded.check(blurred, 'soft-lens', crop)[0] is None
+                 and reloaded.check(blurred, 'other', crop)[0] == 'blurry' and typo_refused)
+
+
+def test_uploads():
+    workdir = tempfile.mkdtemp(prefix='frame_quality_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server, AUTO_CALIBRATE=False))
+    client = flask_app.test_client()
+    image = cv2.imread(SAMPLE)
+
+    def post(frame, device_id='meter'):
+        data = cv2.imencode('.jpg', frame)[1].tobytes()
+        response = client.post('/upload/raw', data=data,
+                               headers={'Content-Type': 'image/jpeg', 'X-Device-Id': device_id})
+        return response.status_code, response.get_json()
+
+    try:
+        results = []
+        status, body = post(degraded(image, 'too_dark'))
+        results.append(check("a dark frame is refused with a recapture reason and no OCR call",
+                             status == 422 and body['recapture'] == 'too_dark' and body['hint']
+                             and 'brightness' in body['quality'] and server.requests == 0))
+
+        metrics = client.get('/metrics').get_data(as_text=True)
+        results.append(check("refusals are counted by reason and outcome",
+                             'ceb_frame_rejects_total{reason="too_dark"} 1' in metrics
+                             and 'ceb_uploads_total{outcome="recapture"} 1' in metrics))
+
+        bad = client.put('/meters/meter/frame-quality', json={'min_brightness': 'dim'})
+        # A frame this dark also measures as blurry, so both checks are loosened
+        put = client.put('/meters/meter/frame-quality', json={'min_brightness': 0, 'min_sharpness': 5})
+        status, body = post(degraded(image, 'too_dark'))
+        with open(os.path.join(workdir, 'frame_quality.json')) as f:
+            stored = json.load(f)
+        results.append(check("PUT /meters/<id>/frame-quality loosens the gate for that meter",
+                             bad.status_code == 400 and put.get_json()['thresholds']['min_brightness'] == 0
+                             and stored == {'meter': {'min_brightness': 0.0, 'min_sharpness': 5.0}}
+                             and body.get('recapture') is None and server.requests == 1))
+        return results
+    finally:
+        server.stop()
+
+
+def main():
+    results = [test_samples_pass(), *test_reasons(), test_device_thresholds(), *test_uploads()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,197 @@
+import base64
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from ingest import Checkpoint, capture_time, ingest, main, pull
+
+with open(os.path.join(HERE, 'meter_sample.jpg'), 'rb') as f:
+    JPEG = f.read()
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def git(repo, *args):
+    subprocess.run(['git', '-C', repo, *args], check=True, capture_output=True)
+
+
+class ArchiveFixture:
+    """A bare 'GitHub' repo the firmware pushes to, and the clone ingest reads"""
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp()
+        self.remote = os.path.join(self.root, 'remote.git')
+        self.device = os.path.join(self.root, 'device')
+        self.clone = os.path.join(self.root, 'clone')
+        subprocess.run(['git', 'init', '--bare', '-q', self.remote], check=True)
+        subprocess.run(['git', 'clone', '-q', self.remote, self.device], check=True, capture_output=True)
+        git(self.device, 'config', 'user.email', 'esp32@example.com')
+        git(self.device, 'config', 'user.name', 'esp32')
+        self.upload({'README.md': b'ESP32-CAM frames\n'})
+        subprocess.run(['git', 'clone', '-q', self.remote, self.clone], check=True, capture_output=True)
+
+    def upload(self, files):
+        """One commit per call, like the firmware's contents API PUTs"""
+        for name, data in files.items():
+            path = os.path.join(self.device, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        git(self.device, 'add', '-A')
+        git(self.device, 'commit', '-q', '-m', f'Upload {", ".join(files)}')
+        git(self.device, 'push', '-q', 'origin', 'HEAD')
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class Recorder:
+    """process() stand-in; statuses maps a filename to the error status it answers with"""
+
+    def __init__(self, fail=(), statuses=None):
+        self.seen = []
+        self.fail = set(fail)
+        self.statuses = statuses or {}
+        self.lock = threading.Lock()
+
+    def __call__(self, data, filename, captured_at):
+        if filename in self.fail:
+            raise KeyboardInterrupt
+        with self.lock:
+            self.seen.append(filename)
+        if filename in self.statuses:
+            return {'error': 'OCR failed'}, self.statuses[filename]
+        return {'reading': 15709, 'jpeg': data[:2] == b'\xff\xd8'}, 200
+
+
+def test_filenames():
+    old = capture_time('photo_20250614_083000.jpg')
+    new = capture_time('2025-06-14_08-30.jpg')
+    return check("both firmware filename formats parse as Sri Lanka local time",
+                 old == new == 1749870000.0 and capture_time('photo_unknown.jpg') is None)
+
+
+def test_incremental():
+    archive = ArchiveFixture()
+    checkpoint = os.path.join(archive.root, 'checkpoint.json')
+    try:
+        archive.upload({'images/photo_20250614_083000.jpg': JPEG})
+        archive.upload({'images/2025-06-14_09-30.jpg': base64.b64encode(JPEG)})
+        archive.upload({'images/2025-06-14_10-30.jpg': json.dumps({'content': base64.b64encode(JPEG).decode()}).encode(),
+                        'images/photo_unknown.jpg': JPEG})
+        pulled = pull(archive.clone)
+        first = Recorder()
+        results = list(ingest(archive.clone, first, checkpoint, concurrency=2))
+        ok = check("first run processes every timestamped frame",
+                   pulled and sorted(first.seen) == sorted(['photo_20250614_083000.jpg', '2025-06-14_09-30.jpg',
+                                                            '2025-06-14_10-30.jpg'])
+                   and all(r['jpeg'] for r in results))
+
+        archive.upload({'images/2025-06-14_11-30.jpg': JPEG})
+        pull(archive.clone)
+        second = Recorder()
+        list(ingest(archive.clone, second, checkpoint, concurrency=2))
+        ok &= check("second run only processes the new frame", second.seen == ['2025-06-14_11-30.jpg'])
+        return ok
+    finally:
+        archive.close()
+
+
+def test_resume():
+    archive = ArchiveFixture()
+    checkpoint = os.path.join(archive.root, 'checkpoint.json')
+    names = [f'images/2025-06-{day:02d}_08-00.jpg' for day in range(1, 9)]
+    try:
+        for name in names:
+            archive.upload({name: JPEG})
+        pull(archive.clone)
+        interrupted = Recorder(fail={'2025-06-05_08-00.jpg'})
+        try:
+            list(ingest(archive.clone, interrupted, checkpoint, concurrency=1))
+        except KeyboardInterrupt:
+            pass
+        resumed = Recorder()
+        list(ingest(archive.clone, resumed, checkpoint, concurrency=3))
+        everything = [os.path.basename(n) for n in names]
+        return check("an interrupted backfill resumes without skipping or repeating frames",
+                     interrupted.seen == everything[:4] and sorted(resumed.seen) == everything[4:])
+    finally:
+        archive.close()
+
+
+def test_transient_failures():
+    archive = ArchiveFixture()
+    checkpoint = os.path.join(archive.root, 'checkpoint.json')
+    names = [f'2025-06-{day:02d}_08-00.jpg' for day in range(1, 7)]
+    try:
+        for name in names:
+            archive.upload({f'images/{name}': JPEG})
+        pull(archive.clone)
+        failing = Recorder(statuses={names[1]: 429, names[3]: 503, names[4]: 422})
+        list(ingest(archive.clone, failing, checkpoint, concurrency=2))
+        retried = Recorder()
+        list(ingest(archive.clone, retried, checkpoint, concurrency=2))
+        again = Recorder()
+        list(ingest(archive.clone, again, checkpoint, concurrency=2))
+        return check("frames refused for quota or a server error are retried next run, a 422 is not",
+                     sorted(failing.seen) == names and sorted(retried.seen) == [names[1], names[3]]
+                     and again.seen == [])
+    finally:
+        archive.close()
+
+
+def test_out_of_order_checkpoint():
+    path = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+    a, b, c = (1.0, 'a.jpg'), (2.0, 'b.jpg'), (3.0, 'c.jpg')
+    checkpoint = Checkpoint(path)
+    checkpoint.complete(c, a)  # c finished while a and b were still running
+    checkpoint.complete(a, b)
+    reloaded = Checkpoint(path)
+    shutil.rmtree(os.path.dirname(path))
+    return check("frames finished out of order are kept ahead of the watermark",
+                 reloaded.watermark == a and reloaded.ahead == {c}
+                 and reloaded.is_done(c) and not reloaded.is_done(b))
+
+
+def test_pipeline():
+    """The CLI end to end with the offline digit engine, which reads meter_sample.jpg as 15709"""
+    archive = ArchiveFixture()
+    cwd = os.getcwd()
+    try:
+        archive.upload({'images/2025-06-14_08-30.jpg': JPEG, 'images/2025-06-14_09-30.jpg': JPEG})
+        os.chdir(archive.root)  # app.py keeps its stores under ./uploads
+        started = time.perf_counter()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = main([archive.clone, '--meter', 'fixture', '--backend', 'local', '--pull'])
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        checkpoint = os.path.join(archive.root, 'uploads', 'ingest_fixture.json')
+        with open(checkpoint) as f:
+            state = json.load(f)
+        print(f"   {time.perf_counter() - started:.2f}s for 2 frames")
+        return check("CLI reads every frame through the upload pipeline and checkpoints",
+                     code == 0 and [r.get('meter_reading') for r in results] == ['15709', '15709']
+                     and state['watermark'][1] == '2025-06-14_09-30.jpg')
+    finally:
+        os.chdir(cwd)
+        archive.close()
+
+
+if __name__ == "__main__":
+    results = [test_filenames(), test_incremental(), test_resume(), test_transient_failures(),
+               test_out_of_order_checkpoint(), test_pipeline()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,131 @@
+"""Checks the async upload job queue: the 202 + /jobs round trip, the worker pool and the durable queue.
+
+    python Tests/jobs_Test.py
+
+The queue is driven directly with small handlers; the round trip goes
+through the Flask app and the stub OCR server.
+"""
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from jobs import JobQueue
+from ocr_stub_server import StubOCRServer, app_config
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def test_queue():
+    def slow(payload):
+        time.sleep(0.2)
+        return {'echo': payload['n']}, 200
+
+    def broken(payload):
+        raise RuntimeError('boom')
+
+    pool = JobQueue(slow, workers=4)
+    started = time.perf_counter()
+    ids = [pool.submit({'n': n}) for n in range(4)]
+    done = [pool.get(job_id, wait=5) for job_id in ids]
+    elapsed = time.perf_counter() - started
+    pool.close()
+
+    failing = JobQueue(broken, workers=1)
+    failed = failing.get(failing.submit({}), wait=5)
+    failing.close()
+    return [check(f"jobs run side by side on the workers (4 x 0.2 s in {elapsed:.2f}s)",
+                  [job['result'] for job in done] == [{'echo': n} for n in range(4)] and elapsed < 0.6),
+            check("a job whose handler raises finishes with a 500",
+                  failed['status'] == 'done' and failed['status_code'] == 500 and failed['result'] == {'error': 'boom'})]
+
+
+def test_durable_queue():
+    db_path = os.path.join(tempfile.mkdtemp(prefix='jobs_test_'), 'jobs.db')
+
+    # No workers: the process "stops" with one job queued and, after marking it so, one running
+    before = JobQueue(lambda payload: ({}, 200), workers=0, db_path=db_path)
+    running = before.submit({'data': b'jpeg-1'})
+    queued = before.submit({'data': b'jpeg-2'})
+    before.close()
+    with sqlite3.connect(db_path) as db:
+        db.execute("UPDATE upload_jobs SET state = 'running' WHERE id = ?", (running,))
+
+    after = JobQueue(lambda payload: ({'bytes': len(payload['data'])}, 200), workers=1, db_path=db_path)
+    results = [after.get(job_id, wait=5) for job_id in (running, queued)]
+    after.close()
+    with sqlite3.connect(db_path) as db:
+        kept = db.execute('SELECT COUNT(*) FROM upload_jobs WHERE data IS NOT NULL').fetchone()[0]
+    return [check("with JOB_QUEUE_DB, jobs not finished when the queue stopped run after a restart",
+                  [job and job['result'] for job in results] == [{'bytes': 6}] * 2),
+            check("a finished job's image is dropped from the queue database", kept == 0)]
+
+
+def test_round_trip():
+    workdir = tempfile.mkdtemp(prefix='jobs_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server))
+    client = flask_app.test_client()
+    with open(os.path.join(HERE, 'pic2.jpg'), 'rb') as f:
+        image = f.read()
+    try:
+        queued = client.post('/upload?async=1', data={'image': (io.BytesIO(image), 'm.jpg')},
+                             content_type='multipart/form-data')
+        job = client.get(f"{queued.headers['Location']}?wait=10")
+        unknown = client.get('/jobs/nope').status_code
+        bad_wait = client.get(f"{queued.headers['Location']}?wait=soon").status_code
+    finally:
+        server.stop()
+        if api._job_queue is not None:
+            api._job_queue.close()
+    body = job.get_json()
+    return [check("?async=1 answers 202 and /jobs/<id>?wait returns the reading",
+                  queued.status_code == 202 and job.status_code == 200 and body['status'] == 'done'
+                  and body['status_code'] == 200 and body['result'].get('meter_reading') == '15709'),
+            check("an unknown job is a 404 and a wait that is not a number a 400", unknown == 404 and bad_wait == 400)]
+
+
+def test_single_queue():
+    import app as api
+
+    class SlowJobQueue(JobQueue):
+        def __init__(self, *args, **kwargs):
+            time.sleep(0.2)
+            super().__init__(*args, **kwargs)
+
+    api.create_app(app_config(tempfile.mkdtemp(prefix='jobs_test_')))
+    built = []
+    api.JobQueue = SlowJobQueue
+    try:
+        threads = [threading.Thread(target=lambda: built.append(api.get_job_queue())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        api.JobQueue = JobQueue
+        if api._job_queue is not None:
+            api._job_queue.close()
+    return [check("concurrent first requests share one job queue", len(built) == 4 and len(set(map(id, built))) == 1)]
+
+
+def main():
+    results = [*test_queue(), *test_durable_queue(), *test_round_trip(), *test_single_queue()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,334 @@
+"""Concurrent load generator for /upload, against a local OCR.space stand-in.
+
+Replays the Tests/*.jpg images at a fixed concurrency (closed loop) or
+arrival rate (open loop) and reports throughput, latency percentiles and
+the error breakdown. By default it starts the stub OCR server and the
+backend itself, so the numbers are the server's, not the real API's:
+
+    python load_test.py --serve flask --concurrency 8 --duration 20
+    python load_test.py --serve uvicorn --rate 50 --concurrency 200 --duration 30
+    python load_test.py --serve flask --sweep 1,2,4,8,16,32 --duration 10 --output flask.json
+
+--serve flask     the Werkzeug threaded server (create_app().run)
+--serve gunicorn  gunicorn gthread workers (--workers, --threads)
+--serve uvicorn   the ASGI app (asgi:app)
+--url URL         an already running server; point its OCR_API_URL at the
+                  stub this prints, or at the real API
+
+The stub's latency, jitter, 503 rate and quota (403) answers are set with
+--stub-*. Quota limits and rate limiting in the backend are turned off
+(OCR_MONTHLY_QUOTA=0, OCR_RATE_PER_MINUTE=0) unless --keep-quota is given;
+any other setting can be passed through the environment, e.g.
+MOSAIC_WINDOW_MS=50 python load_test.py ...
+
+Latency is measured from each request's scheduled start, so time spent
+waiting for a free slot counts (no coordinated omission); 'service' is
+from when it was actually sent.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(HERE, '..', 'backend')
+sys.path.insert(0, BACKEND)
+
+from benchmark import summarise
+from ocr_stub_server import StubOCRServer
+
+# Throughput has saturated once another step up in concurrency gains less than this
+SATURATION_GAIN = 1.1
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def load_images(pattern):
+    images = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read()))
+    if not images:
+        raise SystemExit(f"No images match {pattern}")
+    return images
+
+
+class ServerProcess:
+    """The backend in a subprocess, in a scratch directory, talking to the stub"""
+
+    def __init__(self, mode, stub_url, workers=2, threads=8, keep_quota=False):
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.scratch = tempfile.TemporaryDirectory(prefix='load_test_')
+        env = dict(os.environ, OCR_API_KEY=os.environ.get('OCR_API_KEY', 'load-test'), OCR_API_URL=stub_url,
+                   UPLOAD_FOLDER=self.scratch.name, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+        if not keep_quota:
+            env.update(OCR_MONTHLY_QUOTA='0', OCR_RATE_PER_MINUTE='0')
+
+        if mode == 'flask':
+            command = [sys.executable, '-c', 'import app; app.create_app().run(host="127.0.0.1", port=%d, '
+                                             'threaded=True)' % self.port]
+        elif mode == 'gunicorn':
+            command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+                       '--worker-class', 'gthread', '--bind', f'127.0.0.1:{self.port}', 'app:create_app()']
+        elif mode == 'uvicorn':
+            command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+                       '--port', str(self.port), '--log-level', 'warning']
+        else:
+            raise ValueError(f'Unknown server mode: {mode}')
+        self.process = subprocess.Popen(command, cwd=os.path.abspath(BACKEND), env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+    def wait_ready(self, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited: {self.process.stderr.read().strip()[-500:]}")
+            try:
+                if requests.get(self.url + '/', timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Server not ready after {timeout}s")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.scratch.cleanup()
+
+
+def outcome_of(response):
+    """'ok', or '<status> <error message>' for the error breakdown"""
+    if response.status_code == 200:
+        return 'ok'
+    try:
+        error = response.json().get('error') or ''
+    except ValueError:
+        error = response.text[:60]
+    return f'{response.status_code} {error}'.strip()
+
+
+class LoadRun:
+    """One load level: `concurrency` in-flight requests at most, arriving at `rate`/s (0 = back to back)"""
+
+    def __init__(self, url, images, concurrency, rate=0.0, poisson=False, endpoint='upload', devices=0,
+                 unique=True, timeout=60.0, seed=None):
+        self.url = url.rstrip('/') + ('/upload/raw' if endpoint == 'raw' else '/upload')
+        self.images = images
+        self.concurrency = concurrency
+        self.rate = rate
+        self.poisson = poisson
+        self.endpoint = endpoint
+        self.devices = devices
+        self.unique = unique
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.results = []
+
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def payload(self, n):
+        filename, data = self.images[n % len(self.images)]
+        if self.unique:
+            # Bytes after the JPEG end marker are ignored by decoders but give every request its own
+            # cache key, so the result cache does not answer repeats
+            data = data + n.to_bytes(8, 'big')
+        return filename, data
+
+    def one(self, n, scheduled):
+        filename, data = self.payload(n)
+        device = f'load-{n % self.devices}' if self.devices else None
+        sent = time.perf_counter()
+        try:
+            if self.endpoint == 'raw':
+                headers = {'Content-Type': 'image/jpeg', 'X-Filename': filename}
+                if device:
+                    headers['X-Device-Id'] = device
+                response = self.session().post(self.url, data=data, headers=headers, timeout=self.timeout)
+            else:
+                form = {'device_id': device} if device else {}
+                response = self.session().post(self.url, files={'image': (filename, data, 'image/jpeg')},
+                                               data=form, timeout=self.timeout)
+            outcome = outcome_of(response)
+        except requests.Timeout:
+            outcome = 'client timeout'
+        except requests.RequestException as e:
+            outcome = f'connection error ({type(e).__name__})'
+        done = time.perf_counter()
+        with self.lock:
+            self.results.append((outcome, (done - scheduled) * 1000, (done - sent) * 1000, done))
+
+    def run(self, duration=None, total=None):
+        slots = threading.BoundedSemaphore(self.concurrency)
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        started = time.perf_counter()
+        next_at = started
+        n = 0
+        try:
+            while (total is None or n < total) and (duration is None or time.perf_counter() - started < duration):
+                if self.rate:
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    scheduled = next_at
+                    gap = self.random.expovariate(self.rate) if self.poisson else 1.0 / self.rate
+                    next_at += gap
+                else:
+                    scheduled = None
+                slots.acquire()
+                scheduled = scheduled or time.perf_counter()
+                pool.submit(self._release_after, slots, n, scheduled)
+                n += 1
+        finally:
+            pool.shutdown(wait=True)
+        self.sent = n
+        return self.report(time.perf_counter() - started)
+
+    def _release_after(self, slots, n, scheduled):
+        try:
+            self.one(n, scheduled)
+        finally:
+            slots.release()
+
+    def report(self, elapsed):
+        outcomes = Counter(outcome for outcome, _, _, _ in self.results)
+        ok = outcomes.get('ok', 0)
+        return {
+            'concurrency': self.concurrency,
+            'rate': self.rate or None,
+            'requests': len(self.results),
+            'elapsed_s': round(elapsed, 2),
+            'throughput_rps': round(len(self.results) / elapsed, 2) if elapsed else None,
+            'ok_rps': round(ok / elapsed, 2) if elapsed else None,
+            'error_rate': round(1 - ok / len(self.results), 4) if self.results else None,
+            'latency_ms': summarise([latency for _, latency, _, _ in self.results]),
+            'service_ms': summarise([service for _, _, service, _ in self.results]),
+            'outcomes': dict(outcomes.most_common()),
+        }
+
+
+def saturation(levels):
+    """The level past which more concurrency stops buying throughput (None if it never flattens)"""
+    for previous, level in zip(levels, levels[1:]):
+        if (level['ok_rps'] or 0) < (previous['ok_rps'] or 0) * SATURATION_GAIN:
+            return previous['concurrency']
+    return None
+
+
+def print_level(level):
+    latency = level['latency_ms']
+    errors = {k: v for k, v in level['outcomes'].items() if k != 'ok'}
+    print(f"{level['concurrency']:>6}{level['requests']:>9}{level['ok_rps']:>10.1f}"
+          f"{latency.get('p50', 0):>10.0f}{latency.get('p95', 0):>10.0f}{latency.get('p99', 0):>10.0f}"
+          f"  {json.dumps(errors) if errors else '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--serve', choices=('flask', 'gunicorn', 'uvicorn'), default='flask')
+    target.add_argument('--url', help='load an already running server instead of starting one')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--keep-quota', action='store_true', help="keep the backend's OCR quota and rate limits")
+
+    parser.add_argument('--concurrency', type=int, default=8, help='most requests in flight at once')
+    parser.add_argument('--sweep', help='comma-separated concurrency levels to run one after another')
+    parser.add_argument('--rate', type=float, default=0.0, help='arrivals per second (0 = closed loop)')
+    parser.add_argument('--poisson', action='store_true', help='exponential inter-arrival times at --rate')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per level')
+    parser.add_argument('--requests', type=int, help='stop each level after this many requests instead')
+    parser.add_argument('--images', default=os.path.join(HERE, '*.jpg'))
+    parser.add_argument('--endpoint', choices=('upload', 'raw'), default='upload')
+    parser.add_argument('--devices', type=int, default=0, help='spread requests over this many device ids')
+    parser.add_argument('--cache-hits', action='store_true', help='resend identical bytes (lets the result cache answer)')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--seed', type=int)
+
+    parser.add_argument('--stub-port', type=int, default=0)
+    parser.add_argument('--stub-latency', type=float, default=0.3, help='seconds per OCR call')
+    parser.add_argument('--stub-jitter', type=float, default=0.2, help='extra random seconds per OCR call')
+    parser.add_argument('--stub-error-rate', type=float, default=0.0, help='fraction of OCR calls answered 503')
+    parser.add_argument('--stub-quota-rate', type=float, default=0.0, help='fraction answered with a quota 403')
+    parser.add_argument('--stub-quota-after', type=int, help='OCR calls before the stub quota runs out')
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    stub = StubOCRServer(port=args.stub_port, latency=args.stub_latency, jitter=args.stub_jitter,
+                         error_rate=args.stub_error_rate, quota_rate=args.stub_quota_rate,
+                         quota_after=args.stub_quota_after, seed=args.seed).start()
+    server = None
+    try:
+        if args.url:
+            url = args.url
+            print(f"🧪 Stub OCR.space on {stub.url}; the server under test must use it as OCR_API_URL")
+        else:
+            server = ServerProcess(args.serve, stub.url, args.workers, args.threads, args.keep_quota).wait_ready()
+            url = server.url
+            print(f"🚀 {args.serve} on {url}, stub OCR.space on {stub.url}")
+
+        levels = [int(c) for c in args.sweep.split(',')] if args.sweep else [args.concurrency]
+        print(f"{'conc':>6}{'requests':>9}{'ok/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  errors")
+        reports = []
+        for concurrency in levels:
+            before = stub.stats()
+            run = LoadRun(url, images, concurrency, rate=args.rate, poisson=args.poisson, endpoint=args.endpoint,
+                          devices=args.devices, unique=not args.cache_hits, timeout=args.timeout, seed=args.seed)
+            level = run.run(duration=None if args.requests else args.duration, total=args.requests)
+            after = stub.stats()
+            level['stub'] = {k: after[k] - before[k] for k in ('requests', 'errors', 'quota')}
+            reports.append(level)
+            print_level(level)
+
+        report = {
+            'target': args.url or args.serve,
+            'endpoint': args.endpoint,
+            'images': len(images),
+            'stub': {'latency': args.stub_latency, 'jitter': args.stub_jitter, 'error_rate': args.stub_error_rate,
+                     'quota_rate': args.stub_quota_rate, 'quota_after': args.stub_quota_after},
+            'levels': reports,
+        }
+        if len(reports) > 1:
+            report['saturation_concurrency'] = saturation(reports)
+            print(f"\n📈 Throughput stops scaling after concurrency {report['saturation_concurrency']}"
+                  if report['saturation_concurrency'] else "\n📈 Throughput still scaling at the last level")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"💾 Report written to {args.output}")
+    finally:
+        if server:
+            server.stop()
+        stub.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
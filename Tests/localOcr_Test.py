@@ -0,0 +1,112 @@
+"""Checks the offline digit engine against the labelled sample photos.
+
+    python Tests/localOcr_Test.py
+
+Accuracy is measured on the whole frames and on the counter crops the
+calibrator finds, against the readings in benchmark_manifest.json. The
+floors are what the engine reads today; a change that drops below them
+is a regression.
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+
+from ocr_stub_server import app_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(HERE, 'benchmark_manifest.json')) as f:
+    MANIFEST = json.load(f)['images']
+
+# Least share of the sample photos that must read exactly
+MIN_FRAME_ACCURACY = 0.75
+# Over every photo, one without a crop counting as a miss; 9/16 before the calibrator's row fit
+MIN_CROP_ACCURACY = 0.68
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def drum_row(digits):
+    """Light digits on a dark counter window set in a light panel, like the meters in the photos"""
+    img = np.full((300, 700), 200, np.uint8)
+    cv2.rectangle(img, (80, 90), (100 + len(digits) * 100, 210), 30, -1)
+    for i, digit in enumerate(digits):
+        cv2.putText(img, digit, (105 + i * 100, 190), cv2.FONT_HERSHEY_SIMPLEX, 3, 235, 6, cv2.LINE_AA)
+    return cv2.GaussianBlur(img, (3, 3), 0)
+
+
+def test_synthetic():
+    from local_ocr import LocalDigitEngine
+
+    engine = LocalDigitEngine()
+    reads = [engine.request(drum_row(digits))[0] for digits in ('01234', '56789')]
+    blank, error = engine.request(np.full((300, 700), 200, np.uint8))
+    return [check("every digit 0-9 on a rendered drum row is named", reads == ['01234', '56789']),
+            check("a frame with no counter gives 'No digits found', not a guess",
+                  blank is None and error == 'No digits found')]
+
+
+def test_sample_frames():
+    from local_ocr import LocalDigitEngine
+
+    engine = LocalDigitEngine()
+    misread = {}
+    for entry in MANIFEST:
+        text, error = engine.request(os.path.join(HERE, entry['file']))
+        if text != entry['reading']:
+            misread[entry['file']] = text or error
+    correct = len(MANIFEST) - len(misread)
+    print(f"   misread: {misread}")
+    return check(f"{correct}/{len(MANIFEST)} sample photos read exactly from the whole frame",
+                 correct / len(MANIFEST) >= MIN_FRAME_ACCURACY)
+
+
+def test_calibrated_crops():
+    from calibration import find_counter_roi
+    from local_ocr import LocalDigitEngine
+    from preprocessing import crop_display
+
+    engine = LocalDigitEngine()
+    correct = 0
+    for entry in MANIFEST:
+        img = cv2.imread(os.path.join(HERE, entry['file']))
+        crop, _ = find_counter_roi(img)
+        if crop is None:
+            continue
+        text, _ = engine.request(crop_display(img, {'crop': crop}))
+        correct += text == entry['reading']
+    return check(f"{correct}/{len(MANIFEST)} sample photos read exactly from their calibrated counter crop",
+                 correct / len(MANIFEST) >= MIN_CROP_ACCURACY)
+
+
+def test_upload():
+    workdir = tempfile.mkdtemp(prefix='local_ocr_test_')
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir))
+    client = flask_app.test_client()
+    with open(os.path.join(HERE, 'pic1.jpg'), 'rb') as f:
+        response = client.post('/upload/raw?backend=local', data=f.read(),
+                               headers={'Content-Type': 'image/jpeg', 'X-Device-Id': 'local-meter'})
+    body = response.get_json()
+    return check("/upload/raw?backend=local reads the unfiltered counter crop (13854)",
+                 response.status_code == 200 and body.get('meter_reading') == '13854')
+
+
+def main():
+    results = [*test_synthetic(), test_sample_frames(), test_calibrated_crops(), test_upload()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
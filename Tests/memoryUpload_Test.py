@@ -0,0 +1,84 @@
+"""Checks that /upload reads images in memory and only touches disk when asked to.
+
+    python Tests/memoryUpload_Test.py
+
+UPLOAD_FOLDER is a directory of its own, with the stores kept elsewhere,
+so any file an upload writes shows up in it.
+"""
+import io
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from ocr_stub_server import StubOCRServer, app_config
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def image(name):
+    with open(os.path.join(HERE, name), 'rb') as f:
+        return f.read()
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='memory_upload_test_')
+    uploads = os.path.join(workdir, 'uploads')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    def make_client(**overrides):
+        return api.create_app(app_config(
+            workdir, server, UPLOAD_FOLDER=uploads, OCR_USAGE_DB=os.path.join(workdir, 'usage.db'),
+            CALIBRATION_FILE=os.path.join(workdir, 'calibration.json'),
+            FRAME_QUALITY_FILE=os.path.join(workdir, 'frame_quality.json'), **overrides,
+        )).test_client()
+
+    def post(client, data, filename):
+        response = client.post('/upload', data={'image': (io.BytesIO(data), filename)},
+                               content_type='multipart/form-data')
+        return response.get_json(), response.status_code
+
+    results = []
+    try:
+        client = make_client()
+        read, status = post(client, image('pic1.jpg'), 'memory.jpg')
+        results.append(check("an upload is read without writing anything to UPLOAD_FOLDER",
+                             status == 200 and read.get('meter_reading') == '15709' and os.listdir(uploads) == []))
+        body, status = post(client, b'not an image', 'broken.jpg')
+        results.append(check("bytes that do not decode are refused, still without a file",
+                             status == 500 and 'error' in body and os.listdir(uploads) == []))
+
+        saved, other = image('meter_sample.jpg'), image('pic2.jpg')
+        client = make_client(SAVE_UPLOADS=True)
+        read, status = post(client, saved, 'kept.jpg')
+        post(client, other, 'kept.jpg')
+        api._save_executor.submit(lambda: None).result()  # the copies are written off the request thread
+        copies = []
+        for name in sorted(os.listdir(uploads)):
+            with open(os.path.join(uploads, name), 'rb') as f:
+                copies.append(f.read())
+        results.append(check("SAVE_UPLOADS keeps an exact copy of each upload, same file name or not",
+                             status == 200 and read.get('meter_reading')
+                             and sorted(copies) == sorted([saved, other])))
+
+        disk = image('Test_1.jpg')
+        read, status = post(make_client(UPLOAD_MODE='disk'), disk, 'disk.jpg')
+        results.append(check("UPLOAD_MODE=disk still saves the upload and reads it",
+                             status == 200 and read.get('meter_reading') == '15709'
+                             and os.path.exists(api.upload_path(disk, 'disk.jpg'))))
+    finally:
+        server.stop()
+
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,133 @@
+"""Checks the Prometheus metrics, the upload outcome labels and log sampling.
+
+    python Tests/metrics_Test.py
+
+The /metrics check reads the counters before and after uploads through
+the Flask app and the stub OCR server.
+"""
+import io
+import logging
+import os
+import re
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from event_log import configure_logging, log_event, logger
+from metrics import Registry, upload_outcome
+from ocr_stub_server import StubOCRServer, app_config
+
+SAMPLE_LINE = re.compile(r'^[a-z_]+(\{[^}]*\})? -?[0-9.e+-]+$')
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def sample(text, series):
+    """Value of one series line such as 'ceb_uploads_total{outcome="success"}', 0 when absent"""
+    for line in text.splitlines():
+        if line.startswith(series + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_registry():
+    registry = Registry()
+    seconds = registry.histogram('t_seconds', 'test', ('stage',), buckets=(0.005, 0.025))
+    calls = registry.counter('t_total', 'test', ('route',))
+    for value in (0.003, 0.02, 50):
+        seconds.observe(value, stage='ocr')
+    calls.inc(route='say "hi"')
+    text = registry.render()
+    lines = [line for line in text.splitlines() if not line.startswith('#')]
+    return [check("histogram buckets are cumulative with +Inf, sum and count",
+                  sample(text, 't_seconds_bucket{stage="ocr",le="0.005"}') == 1
+                  and sample(text, 't_seconds_bucket{stage="ocr",le="0.025"}') == 2
+                  and sample(text, 't_seconds_bucket{stage="ocr",le="+Inf"}') == 3
+                  and sample(text, 't_seconds_count{stage="ocr"}') == 3
+                  and abs(sample(text, 't_seconds_sum{stage="ocr"}') - 50.023) < 1e-9),
+            check("every metric has HELP and TYPE and every sample line parses, quotes escaped",
+                  text.count('# HELP') == text.count('# TYPE') == 2 and all(map(SAMPLE_LINE.match, lines))
+                  and 't_total{route="say \\"hi\\""} 1' in lines)]
+
+
+def test_outcomes():
+    cases = [(({'meter_reading': '1', 'cache_hit': True}, 200), 'cache_hit'),
+             (({'meter_reading': '1', 'ocr_skipped': True}, 200), 'unchanged'),
+             (({'meter_reading': '1'}, 200), 'success'),
+             (({'error': 'x', 'recapture': 'blurred'}, 422), 'recapture'),
+             (({'error': 'x'}, 422), 'unreadable'),
+             (({'error': 'x'}, 429), 'quota'),
+             (({'error': 'Image preprocessing failed'}, 500), 'preprocess_error'),
+             (({'error': 'x'}, 502), 'ocr_error'),
+             (({'error': 'x'}, 400), 'rejected')]
+    wrong = [expected for (body, status), expected in cases if upload_outcome(body, status) != expected]
+    return [check("each upload result maps to its outcome label", not wrong)]
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def emit(self, record):
+        self.events.append(record.getMessage())
+
+
+def test_sampling():
+    capture = Capture()
+    logger.addHandler(capture)
+    try:
+        configure_logging('INFO', sample_rate=0)
+        log_event('per_request', sampled=True)
+        log_event('error', logging.ERROR)
+        configure_logging('INFO', sample_rate=1)
+        log_event('per_request', sampled=True)
+    finally:
+        logger.removeHandler(capture)
+    return [check("sampled events follow LOG_SAMPLE_RATE, unsampled ones are always kept",
+                  capture.events == ['error', 'per_request'])]
+
+
+def test_endpoint():
+    workdir = tempfile.mkdtemp(prefix='metrics_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server, LOG_SAMPLE_RATE=0))
+    client = flask_app.test_client()
+    with open(os.path.join(HERE, 'pic1.jpg'), 'rb') as f:
+        image = f.read()
+
+    def upload():
+        client.post('/upload', data={'image': (io.BytesIO(image), 'm.jpg')}, content_type='multipart/form-data')
+
+    series = ('ceb_uploads_total{outcome="success"}', 'ceb_uploads_total{outcome="cache_hit"}',
+              'ceb_stage_seconds_count{stage="ocr"}', 'ceb_stage_seconds_count{stage="decode"}',
+              'ceb_upload_seconds_count{outcome="success"}')
+    try:
+        before = client.get('/metrics').get_data(as_text=True)
+        upload()
+        upload()
+        response = client.get('/metrics')
+    finally:
+        server.stop()
+    after = response.get_data(as_text=True)
+    deltas = [sample(after, s) - sample(before, s) for s in series]
+    return [check(f"/metrics counts a read and a cache hit and times their stages {deltas}",
+                  response.mimetype == 'text/plain' and deltas == [1, 1, 1, 1, 1])]
+
+
+def main():
+    results = [*test_registry(), *test_outcomes(), *test_sampling(), *test_endpoint()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
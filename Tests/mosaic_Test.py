@@ -0,0 +1,152 @@
+"""Checks mosaic batching against the stub OCR server.
+
+    python Tests/mosaic_Test.py
+
+The stub "reads" a mosaic by reporting one word per horizontal band of
+ink - its width in px - with its box, so each caller can be checked for
+getting back exactly its own tile.
+"""
+import io
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+
+from ocr_stub_server import StubOCRServer, app_config
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pic3.jpg')
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def band_reader(text=None):
+    """Stub reader: one word per ink band, reading its width (or a fixed text)"""
+    def read(data):
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        inked = (img < 128).any(axis=1)
+        lines, top = [], None
+        for y, row in enumerate(list(inked) + [False]):
+            if row and top is None:
+                top = y
+            elif not row and top is not None:
+                columns = np.flatnonzero((img[top:y] < 128).any(axis=0))
+                left, width = int(columns[0]), int(columns[-1] - columns[0] + 1)
+                lines.append([{'WordText': text or str(width), 'Left': left, 'Top': top,
+                               'Width': width, 'Height': y - top}])
+                top = None
+        return lines
+    return read
+
+
+def bar(width):
+    tile = np.full((40, 200), 255, np.uint8)
+    tile[10:30, 5:5 + width] = 0
+    return cv2.imencode('.png', tile)[1].tobytes()
+
+
+def batcher_for(server, window=0.3, max_tiles=8):
+    from mosaic import MosaicBatcher
+    from ocr_client import OCRSpaceClient
+
+    client = OCRSpaceClient('test-key', server.url, max_retries=0, overlay=True)
+    return MosaicBatcher(client, window=window, max_tiles=max_tiles)
+
+
+def concurrently(fn, items):
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(fn, items))
+
+
+def test_mapping():
+    server = StubOCRServer(reader=band_reader()).start()
+    batcher = batcher_for(server)
+    try:
+        widths = [30, 45, 60, 75, 90, 105]
+        results = concurrently(lambda w: batcher.request_detailed(bar(w)), widths)
+        mapped = all(text == f'{w}\n' and words[0]['top'] == 10 and error is None
+                     for w, (text, words, error) in zip(widths, results))
+        return check("6 concurrent requests share one call and each gets its own tile's words",
+                     mapped and server.requests == 1)
+    finally:
+        batcher.close()
+        server.stop()
+
+
+def test_max_tiles():
+    server = StubOCRServer(reader=band_reader()).start()
+    batcher = batcher_for(server, window=1.0, max_tiles=4)
+    try:
+        widths = list(range(20, 120, 10))
+        results = concurrently(lambda w: batcher.request_detailed(bar(w)), widths)
+        return check("a full batch is sent without waiting out the window",
+                     server.requests == 3 and all(text == f'{w}\n' for w, (text, _, _) in zip(widths, results)))
+    finally:
+        batcher.close()
+        server.stop()
+
+
+def test_no_overlay():
+    server = StubOCRServer(text='15709\n').start()
+    batcher = batcher_for(server)
+    try:
+        results = concurrently(lambda w: batcher.request_detailed(bar(w)), [30, 60, 90])
+        return check("without word boxes every tile is sent on its own",
+                     server.requests == 4 and all(text == '15709\n' for text, _, _ in results))
+    finally:
+        batcher.close()
+        server.stop()
+
+
+def test_blank_tiles():
+    server = StubOCRServer(reader=lambda data: []).start()
+    batcher = batcher_for(server)
+    try:
+        results = concurrently(lambda w: batcher.request_detailed(bar(w)), [30, 60, 90])
+        return check("an overlay with no words gives every tile an empty result from the one call",
+                     server.requests == 1 and results == [('', [], None)] * 3)
+    finally:
+        batcher.close()
+        server.stop()
+
+
+def test_uploads():
+    workdir = tempfile.mkdtemp(prefix='mosaic_test_')
+    server = StubOCRServer(reader=band_reader('15709.')).start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server, MOSAIC_WINDOW_MS=300, MOSAIC_MAX_TILES=8, WARM_UP='eager'))
+    image = cv2.imread(SAMPLE)
+    frames = [cv2.imencode('.jpg', cv2.add(image, i))[1].tobytes() for i in range(6)]
+
+    def post(data):
+        client = flask_app.test_client()
+        return client.post('/upload', data={'image': (io.BytesIO(data), 'm.jpg')},
+                           content_type='multipart/form-data').get_json()
+
+    try:
+        replies = concurrently(post, frames)
+        usage = api.get_ocr_governor().report()
+        return check("6 concurrent uploads are read from one OCR.space call and counted once",
+                     all(r.get('meter_reading') == '15709' for r in replies)
+                     and server.requests == 1 and usage['used'] == 1)
+    finally:
+        server.stop()
+
+
+def main():
+    results = [test_mapping(), test_max_tiles(), test_no_overlay(), test_blank_tiles(), test_uploads()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from ocr_backends import QUOTA_ERROR
+from ocr_client import OCRSpaceClient
+from ocr_stub_server import StubOCRServer
+
+SAMPLE = b'\xff\xd8\xff\xe0 not really a jpeg'
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def test_keep_alive():
+    server = StubOCRServer().start()
+    client = OCRSpaceClient('test-key', server.url, pool_size=2)
+    try:
+        texts = [client.request(SAMPLE)[0] for _ in range(5)]
+        return check("5 requests reuse one connection",
+                     all(t and '15709' in t for t in texts) and server.connections == 1)
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_retries():
+    server = StubOCRServer(fail_first=2).start()
+    client = OCRSpaceClient('test-key', server.url, max_retries=2, backoff=0)
+    try:
+        text, error = client.request(SAMPLE)
+        return check("503s are retried until success", error is None and server.requests == 3)
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_retries_bounded():
+    server = StubOCRServer(fail_first=10).start()
+    client = OCRSpaceClient('test-key', server.url, max_retries=1, backoff=0)
+    try:
+        text, error = client.request(SAMPLE)
+        return check("retries stop after max_retries", error == "API Error" and server.requests == 2)
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_read_timeout():
+    server = StubOCRServer(latency=1.0).start()
+    client = OCRSpaceClient('test-key', server.url, read_timeout=0.2, max_retries=0)
+    try:
+        text, error = client.request(SAMPLE)
+        return check("slow API hits the read timeout", error == "OCR request timed out")
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_quota_response():
+    server = StubOCRServer(quota_after=0).start()
+    client = OCRSpaceClient('test-key', server.url, max_retries=2, backoff=0)
+    try:
+        text, error = client.request(SAMPLE)
+        return check("a quota answer is reported as such and not retried",
+                     error == QUOTA_ERROR and server.requests == 1)
+    finally:
+        client.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    results = [test_keep_alive(), test_retries(), test_retries_bounded(), test_read_timeout(), test_quota_response()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,176 @@
+import argparse
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# What OCR.space sends once an account's rate or monthly limit is used up
+QUOTA_MESSAGE = 'You may only perform this action upto maximum 180 number of times within 3600 seconds'
+
+
+class StubOCRHandler(BaseHTTPRequestHandler):
+    """Answers POST /parse/image the way api.ocr.space does"""
+    protocol_version = 'HTTP/1.1'  # keep-alive, so pooled clients can reuse connections
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            count = server.requests
+            roll = server.random.random()
+            delay = server.latency + (server.random.uniform(0, server.jitter) if server.jitter else 0)
+
+        if delay:
+            time.sleep(delay)
+
+        if count <= server.fail_first or roll < server.error_rate:
+            server.count('errors')
+            status, body = 503, {'OCRExitCode': 3, 'ErrorMessage': 'Service unavailable'}
+        elif (server.quota_after is not None and count > server.quota_after) \
+                or roll < server.error_rate + server.quota_rate:
+            server.count('quota')
+            status, body = 403, {'OCRExitCode': 99, 'ErrorMessage': QUOTA_MESSAGE}
+        elif server.reader:
+            lines = server.reader(self._image(body))
+            status, body = 200, {
+                'OCRExitCode': 1,
+                'ParsedResults': [{
+                    'ParsedText': ''.join(' '.join(w['WordText'] for w in line) + '\n' for line in lines),
+                    'TextOverlay': {'Lines': [{'Words': line} for line in lines]},
+                }],
+            }
+        else:
+            status, body = 200, {
+                'OCRExitCode': 1,
+                'ParsedResults': [{'ParsedText': server.text}],
+            }
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _image(self, body):
+        """The uploaded file's bytes from the multipart body"""
+        from werkzeug.formparser import parse_form_data
+
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'CONTENT_TYPE': self.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+        }
+        _, _, files = parse_form_data(environ)
+        return files['file'].read() if 'file' in files else b''
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubOCRServer(ThreadingHTTPServer):
+    """Local stand-in for OCR.space.
+
+    latency    -- seconds to sleep before answering each request
+    jitter     -- extra random delay, uniform in [0, jitter] seconds
+    fail_first -- number of initial requests answered with 503
+    error_rate -- fraction of requests answered with 503 at random
+    quota_rate -- fraction of requests answered with OCR.space's 403 quota response
+    quota_after -- requests served before every answer becomes the quota response
+    text       -- ParsedText returned on success
+    reader     -- optional callable(image bytes) -> lines of OCR.space overlay words
+                  ({'WordText', 'Left', 'Top', 'Width', 'Height'}); replaces text and
+                  adds a TextOverlay to the response
+    """
+    daemon_threads = True
+    request_queue_size = 256  # load tests open hundreds of connections at once
+
+    def __init__(self, port=0, text='kW-h\n15709.\n', latency=0.0, fail_first=0, reader=None,
+                 jitter=0.0, error_rate=0.0, quota_rate=0.0, quota_after=None, seed=None):
+        super().__init__(('127.0.0.1', port), StubOCRHandler)
+        self.text = text
+        self.reader = reader
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_first = fail_first
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.quota_after = quota_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.injected = {'errors': 0, 'quota': 0}
+
+    def count(self, kind):
+        with self.lock:
+            self.injected[kind] += 1
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'connections': self.connections, **self.injected}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/parse/image'
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def app_config(workdir, server=None, **overrides):
+    """Config for a test app: stores under workdir, OCR.space at the stub server, no rate limit or quota.
+
+    The readings store is off unless READINGS_DB is given; overrides win.
+    """
+    from config import Config
+
+    settings = {'OCR_API_KEY': 'test-key', 'UPLOAD_FOLDER': workdir, 'READINGS_DB': '', 'OCR_RATE_PER_MINUTE': 0,
+                'OCR_MONTHLY_QUOTA': 0, 'WARM_UP': 'off'}
+    if server is not None:
+        settings['OCR_API_URL'] = server.url
+    return Config(**{**settings, **overrides})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the OCR.space API')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--text', default='kW-h\n15709.\n', help='ParsedText of every successful answer')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each answer')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random delay, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction answered with 503')
+    parser.add_argument('--quota-rate', type=float, default=0.0, help='fraction answered with the 403 quota error')
+    parser.add_argument('--quota-after', type=int, help='requests served before the quota runs out')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = StubOCRServer(port=args.port, text=args.text, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, quota_rate=args.quota_rate,
+                           quota_after=args.quota_after, seed=args.seed)
+    print(f"🧪 Stub OCR.space listening on {server.url} (start the backend with OCR_API_URL={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {server.stats()}")
+
+
+if __name__ == "__main__":
+    main()
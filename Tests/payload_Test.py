@@ -0,0 +1,98 @@
+"""Checks the OCR payload shaping: downscaling to a digit height and picking the smallest encoding.
+
+    python Tests/payload_Test.py
+
+Runs on synthetic binary displays, then /upload against the stub OCR
+server to see the payload stats reported.
+"""
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+
+from ocr_stub_server import StubOCRServer, app_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def binary_display(scale):
+    """White digits 15709 on black, about 22 * scale px tall, thresholded like filter_display output"""
+    img = np.zeros((int(40 * scale), int(130 * scale)), np.uint8)
+    cv2.putText(img, '15709', (int(5 * scale), int(31 * scale)), cv2.FONT_HERSHEY_SIMPLEX, scale, 255,
+                max(1, int(2 * scale)))
+    _, img = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)
+    return img
+
+
+def test_downscale():
+    from preprocessing import downscale_for_ocr, estimate_digit_height, is_binary
+
+    large, small = binary_display(5), binary_display(1.2)
+    shrunk = downscale_for_ocr(large, 40)
+    height = estimate_digit_height(shrunk)
+    return [check(f"a display with {estimate_digit_height(large):.0f} px digits is shrunk to ~40 px ({height:.0f})",
+                  height is not None and 34 <= height <= 46 and shrunk.shape[1] < large.shape[1]),
+            check("a shrunk binary display is still binary", is_binary(shrunk)),
+            check("a display with small digits is never upscaled", downscale_for_ocr(small, 40) is small)]
+
+
+def test_encoding():
+    from preprocessing import encode_for_ocr, encode_image
+
+    display = binary_display(3)
+    data, fmt = encode_for_ocr(display)
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    eight_bit = encode_image(display, '.png', [cv2.IMWRITE_PNG_COMPRESSION, 9])
+    rng = np.random.default_rng(0)
+    gray = cv2.GaussianBlur(rng.integers(0, 256, (120, 390), dtype=np.uint8), (5, 5), 0)
+    return [check("a binary display goes out as a lossless PNG",
+                  fmt == 'png' and np.array_equal(decoded, display)),
+            check(f"the 1-bit PNG is smaller than an 8-bit one ({len(data)} vs {len(eight_bit)} bytes)",
+                  len(data) < len(eight_bit)),
+            check("a grayscale display goes out as JPEG", encode_for_ocr(gray)[1] == 'jpg')]
+
+
+def test_upload_stats():
+    workdir = tempfile.mkdtemp(prefix='payload_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    with open(os.path.join(HERE, 'meter_sample.jpg'), 'rb') as f:
+        image = f.read()
+
+    def upload(**overrides):
+        flask_app = api.create_app(app_config(workdir, server, **overrides))
+        return flask_app.test_client().post('/upload', data={'image': (io.BytesIO(image), 'm.jpg')},
+                                            content_type='multipart/form-data').get_json()
+
+    try:
+        default, body = upload(), upload(OCR_PAYLOAD_STATS=True)
+    finally:
+        server.stop()
+    return [check(f"/upload reports a smaller payload than a full-size JPEG "
+                  f"({body.get('payload_bytes')} bytes {body.get('payload_format')}, saved {body.get('bytes_saved')})",
+                  body.get('payload_bytes', 0) > 0 and body.get('bytes_saved', 0) > 0
+                  and body.get('payload_format') in ('png', 'jpg')),
+            check("without OCR_PAYLOAD_STATS no full-size JPEG is encoded just for bytes_saved",
+                  default.get('payload_bytes') == body.get('payload_bytes') and 'bytes_saved' not in default)]
+
+
+def main():
+    results = [*test_downscale(), *test_encoding(), *test_upload_stats()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,134 @@
+"""Filter chain benchmark: the original allocate-per-step chain vs the buffered engine.
+
+Frames from Tests/ are resized to UXGA (1600x1200, the ESP32-CAM's largest
+frame) and cropped with the default ROI, then filtered by:
+
+    legacy            cvtColor -> bilateralFilter -> equalizeHist -> adaptiveThreshold,
+                      each step returning a fresh array (the pre-engine filter_display)
+    <profile>         FilterEngine.filter with each filter_engine.PROFILES entry
+
+For each it reports per-image latency percentiles, arrays allocated per
+image, traced allocation peak per image, and how many output pixels agree
+with the legacy chain. Pixel agreement is not reading accuracy: compare
+that with benchmark.py --profile against OCR.space.
+
+    python preprocess_benchmark.py [--repeat 20] [--output report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from benchmark import summarise
+from filter_engine import PROFILES, FilterEngine
+from preprocessing import PREPROCESS_CONFIG, crop_display
+
+UXGA = (1600, 1200)
+IMAGES = ('meter_sample.jpg', 'Test_1.jpg', 'pic1.jpg', 'pic2.jpg', 'pic3.jpg', 'setuptest1.jpg',
+          'setuptest5.jpg', 'test11.jpg')
+
+
+def legacy_chain(crop, config, steps=None):
+    """The filter chain as it was before the engine: every step allocates its output"""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    blur = cv2.bilateralFilter(gray, *config['bilateral'])
+    equalized = cv2.equalizeHist(blur)
+    thresh = cv2.adaptiveThreshold(equalized, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY, config['adaptive_block'], config['adaptive_c'])
+    if steps is not None:
+        steps.extend([gray, blur, equalized, thresh])
+    return thresh
+
+
+def load_crops():
+    crops = []
+    for name in IMAGES:
+        img = cv2.imread(os.path.join(HERE, name))
+        if img is not None:
+            crops.append(crop_display(cv2.resize(img, UXGA, interpolation=cv2.INTER_AREA)))
+    return crops
+
+
+def traced_peak_per_image(fn, images):
+    """Peak bytes allocated while filtering, per image, after one warm-up call"""
+    fn(images)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    fn(images)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round((peak - baseline) / 1024 / len(images), 1)
+
+
+def run_case(name, fn, crops, repeat, arrays_per_image, reference):
+    fn(crops)  # warm-up: first-size buffer allocation and OpenCV dispatch
+    per_image = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        outputs = fn(crops)
+        per_image.append((time.perf_counter() - started) * 1000 / len(crops))
+    agreement = np.mean([np.mean(out == ref) for out, ref in zip(outputs, reference)])
+    return {
+        'case': name,
+        'ms_per_image': summarise(per_image),
+        'arrays_allocated_per_image': arrays_per_image,
+        'traced_kib_per_image': traced_peak_per_image(fn, crops),
+        'pixel_agreement_with_legacy': round(float(agreement), 4),
+    }
+
+
+def engine_arrays_per_image(fn, crops):
+    """Engine buffers allocated in a steady-state call, plus the returned arrays, per image"""
+    engine = FilterEngine()
+    fn(engine, crops)
+    before = engine.allocations
+    outputs = fn(engine, crops)
+    owned = sum(1 for out in outputs if out.flags.owndata)
+    return round((engine.allocations - before + owned) / len(crops), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    crops = load_crops()
+    shape = crops[0].shape
+    config = dict(PREPROCESS_CONFIG)
+
+    steps = []
+    legacy_chain(crops[0], config, steps)
+    reference = [legacy_chain(crop, config) for crop in crops]
+    cases = [run_case('legacy', lambda images: [legacy_chain(c, config) for c in images], crops,
+                      args.repeat, len(steps), reference)]
+
+    for profile in PROFILES:
+        profile_config = dict(config, profile=profile)
+        engine = FilterEngine()
+        single = lambda images, e=engine, c=profile_config: [e.filter(crop, c) for crop in images]
+        cases.append(run_case(profile, single, crops, args.repeat, engine_arrays_per_image(
+            lambda e, images, c=profile_config: [e.filter(crop, c) for crop in images], crops), reference))
+
+    report = {'crop_shape': list(shape), 'images': len(crops), 'repeat': args.repeat, 'cases': cases}
+    print(f"{'case':<28}{'p50 ms':>9}{'p95 ms':>9}{'arrays':>8}{'KiB':>9}{'agree':>8}")
+    for case in cases:
+        ms = case['ms_per_image']
+        print(f"{case['case']:<28}{ms['p50']:>9.2f}{ms['p95']:>9.2f}{case['arrays_allocated_per_image']:>8}"
+              f"{case['traced_kib_per_image']:>9}{case['pixel_agreement_with_legacy']:>8.3f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""Checks the OCR.space quota governor: token bucket, quota pause and fallback routing.
+
+    python Tests/quota_Test.py
+
+The governor is driven with in-process fake engines, so every call and
+where it went can be counted. Usage billing is checked with the real
+clients against the stub OCR server; the last checks go through the Flask
+app and the stub with OCR.space's 403 quota answer injected.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from ocr_backends import QUOTA_ERROR, OCRBackend
+from ocr_stub_server import StubOCRServer, app_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+class FakeEngine(OCRBackend):
+    """Answers from `answers` in turn (text or QUOTA_ERROR), repeating the last; counts its calls"""
+
+    def __init__(self, name, answers=('15709',)):
+        self.name = name
+        self.answers = list(answers)
+        self.calls = 0
+
+    def request(self, image):
+        answer = self.answers[min(self.calls, len(self.answers) - 1)]
+        self.calls += 1
+        if answer == QUOTA_ERROR:
+            return None, QUOTA_ERROR
+        return answer, None
+
+
+def governor(primary, fallback=None, **kwargs):
+    from quota import QuotaGovernor, UsageStore
+
+    options = dict(usage=UsageStore(), monthly_limit=0, rate_per_minute=0, max_wait=0, cooldown=60)
+    options.update(kwargs)
+    return QuotaGovernor(primary, fallback=fallback, **options)
+
+
+def test_token_bucket():
+    from quota import TokenBucket
+
+    bucket = TokenBucket(rate_per_minute=600, burst=2)
+    burst = [bucket.acquire(0) for _ in range(3)]
+    started = time.monotonic()
+    refilled = bucket.acquire(0.5)
+    waited = time.monotonic() - started
+    unlimited = TokenBucket(rate_per_minute=0, burst=1)
+    return [check("a bucket hands out its burst, then refuses", burst == [True, True, False]),
+            check(f"a token refills at the per-minute rate (waited {waited * 1000:.0f} ms for 100 ms)",
+                  refilled and 0.05 <= waited <= 0.3),
+            check("a rate of 0 means no limit", all(unlimited.acquire(0) for _ in range(100)))]
+
+
+def test_routing():
+    primary, fallback = FakeEngine('ocrspace'), FakeEngine('google', ['13854'])
+    rated = governor(primary, fallback, rate_per_minute=60, burst=1)
+    first, second = rated.request(b'a'), rated.request(b'b')
+
+    primary, fallback = FakeEngine('ocrspace'), FakeEngine('google', ['13854'])
+    budget = governor(primary, fallback, monthly_limit=10, reserve=2)
+    budget.usage.add('ocrspace', 8)
+    low = budget.request(b'a')
+
+    refused = governor(FakeEngine('ocrspace'), rate_per_minute=60, burst=1)
+    refused.request(b'a')
+    return [check("a call with no rate token left goes to the fallback",
+                  first == ('15709', None) and second == ('13854', None)
+                  and rated.usage.month_total('google') == 1),
+            check("inside the quota reserve every call goes to the fallback",
+                  low == ('13854', None) and primary.calls == 0 and budget.report()['budget_low']),
+            check("without a fallback the call is refused with the quota error",
+                  refused.request(b'b') == (None, QUOTA_ERROR))]
+
+
+def test_quota_pause():
+    primary = FakeEngine('ocrspace', [QUOTA_ERROR, '15709', '15710'])
+    lone = governor(primary)
+    answers = [lone.request(b'a'), lone.request(b'b'), lone.request(b'c')]
+
+    primary = FakeEngine('ocrspace', [QUOTA_ERROR, QUOTA_ERROR, '15709'])
+    paused = governor(primary, strikes=2, cooldown=0.2)
+    paused.request(b'a'), paused.request(b'b')
+    during = paused.request(b'c')
+    calls_during = primary.calls
+    time.sleep(0.25)
+    after = paused.request(b'd')
+
+    refusing = FakeEngine('ocrspace', [QUOTA_ERROR])
+    growing = governor(refusing, strikes=1, pause=0.05, cooldown=0.15)
+    pauses = []
+    for i in range(4):
+        growing.request(str(i).encode())
+        pauses.append(round(growing.paused_until - time.time(), 2))
+        time.sleep(pauses[-1] + 0.01)
+
+    # One API call in ten answered 403, as under the load test's --stub-quota-rate 0.1
+    primary = FakeEngine('ocrspace', ([QUOTA_ERROR] + ['15709'] * 9) * 3)
+    stray = governor(primary)
+    errors = sum(stray.request(str(i).encode())[1] == QUOTA_ERROR for i in range(30))
+    return [check("a lone quota error diverts only its own call",
+                  answers == [(None, QUOTA_ERROR), ('15709', None), ('15710', None)]),
+            check("quota errors in a row pause the primary until the cooldown ends",
+                  during == (None, QUOTA_ERROR) and calls_during == 2 and after == ('15709', None)),
+            check(f"the pause doubles while the API keeps refusing, up to the cooldown {pauses}",
+                  all(abs(p - e) < 0.02 for p, e in zip(pauses, [0.05, 0.1, 0.15, 0.15])) and refusing.calls == 4),
+            check(f"stray 403s on 10% of calls fail {errors}/30 calls, not the calls after them",
+                  errors == 3 and primary.calls == 30)]
+
+
+def test_fallback_config():
+    import app as api
+    from local_ocr import LocalDigitEngine
+
+    try:
+        governor(FakeEngine('ocrspace'), LocalDigitEngine())
+        local_refused = False
+    except ValueError:
+        local_refused = True
+
+    workdir = tempfile.mkdtemp(prefix='quota_test_')
+    api.create_app(app_config(workdir, GOOGLE_VISION_API_KEY=None, OCR_FALLBACK_BACKEND='google'))
+    try:
+        api.get_ocr_backends()
+        unconfigured_refused = False
+    except ValueError:
+        unconfigured_refused = True
+    return check("only a configured engine that reads the OCR.space payload can be the fallback",
+                 local_refused and unconfigured_refused)
+
+
+def test_uploads():
+    workdir = tempfile.mkdtemp(prefix='quota_test_')
+    server = StubOCRServer(quota_rate=0.1, seed=5).start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server, OCR_MAX_RETRIES=0, OCR_FALLBACK_BACKEND=''))
+    client = flask_app.test_client()
+    with open(os.path.join(HERE, 'pic1.jpg'), 'rb') as f:
+        image = f.read()
+
+    try:
+        statuses = []
+        for i in range(30):
+            # Trailing bytes after the JPEG end marker keep each upload out of the result cache
+            response = client.post('/upload/raw', data=image + str(i).encode(),
+                                   headers={'Content-Type': 'image/jpeg', 'X-Device-Id': f'meter-{i}'})
+            statuses.append(response.status_code)
+        injected = server.stats()["quota"]
+
+        with open(os.path.join(HERE, 'test11.jpg'), 'rb') as f:
+            unreadable = client.post('/upload/raw?backend=local', data=f.read(),
+                                     headers={'Content-Type': 'image/jpeg'})
+        return [check(f"with 10% of API calls answered 403, {statuses.count(200)}/30 uploads are read "
+                      f"({injected} refused)", statuses.count(200) == 30 - injected and set(statuses) <= {200, 429}),
+                check("an image the local engine finds no digits in is a 422, not a 500",
+                      unreadable.status_code == 422 and unreadable.get_json()['error'] == 'No digits found')]
+    finally:
+        server.stop()
+
+
+def test_billing():
+    import asyncio
+    import socket
+
+    from ocr_client import AsyncOCRSpaceClient, OCRSpaceClient
+
+    server = StubOCRServer(fail_first=2).start()
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        unreachable = f'http://127.0.0.1:{closed.getsockname()[1]}/parse/image'
+    try:
+        retried = governor(OCRSpaceClient('test-key', server.url, max_retries=2, backoff=0))
+        answer = retried.request(b'a')
+        refused = governor(OCRSpaceClient('test-key', unreachable, max_retries=1, backoff=0))
+        failed = refused.request(b'a')
+
+        async def async_call():
+            client = AsyncOCRSpaceClient('test-key', server.url, max_retries=2, backoff=0)
+            try:
+                return await async_governor.request_detailed_async(b'b', client)
+            finally:
+                await client.aclose()
+
+        server.fail_first, server.requests = 1, 0
+        async_governor = governor(OCRSpaceClient('test-key', server.url))  # as asgi.py pairs them
+        async_answer = asyncio.run(async_call())
+    finally:
+        server.stop()
+    return check("usage counts every HTTP response, retried ones included, and no call that got none",
+                 answer == ('kW-h\n15709.\n', None) and retried.usage.month_total('ocrspace') == 3
+                 and failed[1] and refused.usage.month_total('ocrspace') == 0
+                 and async_answer[0] == 'kW-h\n15709.\n' and async_governor.usage.month_total('ocrspace') == 2)
+
+
+def main():
+    results = [*test_token_bucket(), *test_routing(), *test_quota_pause(), test_fallback_config(), test_billing(),
+               *test_uploads()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,73 @@
+"""Checks /upload/raw on the Flask app: plain and chunked bodies, the size cap and short bodies.
+
+    python Tests/rawUpload_Test.py
+
+The same paths on the ASGI app are checked in asgi_Test.py. Chunked
+bodies carry wsgi.input_terminated, as gunicorn and the Werkzeug server
+set it for them.
+"""
+import io
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from ocr_stub_server import StubOCRServer, app_config
+
+MAX_BYTES = 200 * 1024
+CHUNKED = {'wsgi.input_terminated': True}
+
+with open(os.path.join(HERE, 'pic1.jpg'), 'rb') as f:
+    PHOTO = f.read()
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='raw_upload_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    client = api.create_app(app_config(workdir, server, RAW_UPLOAD_MAX_BYTES=MAX_BYTES)).test_client()
+
+    def post(body, headers=None, environ=None):
+        response = client.post('/upload/raw', input_stream=io.BytesIO(body),
+                               headers={'Content-Type': 'image/jpeg', **(headers or {})},
+                               environ_overrides=environ)
+        return response.status_code, response.get_json()
+
+    results = []
+    try:
+        status, reply = post(PHOTO, {'Content-Length': str(len(PHOTO))})
+        results.append(check("a body with a Content-Length is read in full",
+                             status == 200 and reply.get('meter_reading') == '15709'))
+        status, reply = post(PHOTO, {'Transfer-Encoding': 'chunked'}, CHUNKED)
+        results.append(check("a chunked body is read in full",
+                             status == 200 and reply.get('meter_reading') == '15709'))
+
+        big = b'x' * (MAX_BYTES + 1)
+        status, reply = post(big, {'Content-Length': str(len(big))})
+        chunked_status, _ = post(big, {'Transfer-Encoding': 'chunked'}, CHUNKED)
+        results.append(check("a body over RAW_UPLOAD_MAX_BYTES is refused with 413, chunked or not",
+                             status == 413 and 'error' in reply and chunked_status == 413))
+
+        requests = server.requests
+        status, reply = post(PHOTO[:1000], environ={'CONTENT_LENGTH': str(len(PHOTO))})
+        results.append(check("a body shorter than its Content-Length is refused with 400 and no OCR call",
+                             status == 400 and reply == {'error': 'Body shorter than Content-Length'}
+                             and server.requests == requests))
+    finally:
+        server.stop()
+
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,92 @@
+"""Checks the per-meter readings store and the history routes.
+
+    python Tests/readings_Test.py
+
+How validation uses the stored history is checked in validation_Test.py.
+"""
+import io
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from ocr_stub_server import StubOCRServer, app_config
+from readings_store import ReadingsStore, parse_timestamp
+
+HOUR = 3600
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def test_store():
+    store = ReadingsStore(os.path.join(tempfile.mkdtemp(prefix='readings_test_'), 'readings.db'))
+    # Added out of order, two with the same capture time
+    for reading, at in (('00003', 5 * HOUR), ('99990', 1 * HOUR), ('99995', 2 * HOUR), ('99996', 2 * HOUR),
+                        ('99998', 4 * HOUR)):
+        store.add('m', reading, at)
+    store.add('other', '12345', 3 * HOUR)
+
+    pages, cursor = [], None
+    while True:
+        rows, cursor = store.range('m', limit=2, after=cursor)
+        pages.append([row['reading'] for row in rows])
+        if cursor is None:
+            break
+    window, _ = store.range('m', 2 * HOUR, 4 * HOUR)
+    deltas, total = store.consumption('m')
+    last = store.last('m', before=4 * HOUR)
+    store.close()
+    return [check("epoch seconds and ISO 8601 parse, a naive time as UTC",
+                  parse_timestamp('3600') == parse_timestamp('1970-01-01T01:00:00Z')
+                  == parse_timestamp('1970-01-01T01:00:00') == 3600.0 and parse_timestamp('soon') is None),
+            check("pages of a meter's history come oldest first, each row exactly once",
+                  pages == [['99990', '99995'], ['99996', '99998'], ['00003']]),
+            check("from/to bound the range inclusively and other meters stay out",
+                  [row['reading'] for row in window] == ['99995', '99996', '99998']),
+            check(f"consumption sums the deltas across a counter roll-over (total {total})",
+                  total == 13 and deltas[-1]['delta'] == 5 and last['reading'] == '99996')]
+
+
+def test_routes():
+    workdir = tempfile.mkdtemp(prefix='readings_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    def make_client(readings_db):
+        return api.create_app(app_config(workdir, server, READINGS_DB=readings_db)).test_client()
+
+    try:
+        disabled = make_client('').get('/meters/home/readings').status_code
+        client = make_client(os.path.join(workdir, 'readings.db'))
+        with open(os.path.join(HERE, 'pic1.jpg'), 'rb') as f:
+            image = f.read()
+        client.post('/upload', data={'image': (io.BytesIO(image), 'm.jpg'), 'device_id': 'home',
+                                     'captured_at': '2025-06-14T08:30:00+05:30'},
+                    content_type='multipart/form-data')
+        history = client.get('/meters/home/readings?from=2025-06-14T00:00:00Z').get_json()
+        bad = client.get('/meters/home/readings?from=yesterday').status_code
+        bad_to = client.get('/meters/home/consumption?to=later').status_code
+    finally:
+        server.stop()
+    rows = history.get('readings', [])
+    return [check("with READINGS_DB='' the history routes answer 404", disabled == 404),
+            check("a read upload is stored under its device id and capture time",
+                  [(row['reading'], row['captured_at']) for row in rows] == [('15709', '2025-06-14T03:00:00+00:00')]
+                  and history.get('next_cursor') is None),
+            check("a from/to that is not a time is a 400", bad == 400 and bad_to == 400)]
+
+
+def main():
+    results = [*test_store(), *test_routes()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,100 @@
+"""Checks the content-hash result cache: keys, LRU and TTL, the SQLite tier and /upload hits.
+
+    python Tests/resultCache_Test.py
+
+Which pipelines share cache entries is checked in consensus_Test.py.
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from ocr_stub_server import StubOCRServer, app_config
+from result_cache import ResultCache, reading_key
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def test_cache():
+    key = reading_key(b'frame', 'config', 'ocrspace')
+    changed = [reading_key(b'frame2', 'config', 'ocrspace'), reading_key(b'frame', 'config2', 'ocrspace'),
+               reading_key(b'frame', 'config', 'local'), reading_key(b'frame', 'config', 'ocrspace', 'consensus')]
+
+    lru = ResultCache(max_entries=2)
+    lru.set('a', '1')
+    lru.set('b', '2')
+    lru.get('a')
+    lru.set('c', '3')
+
+    expiring = ResultCache(ttl=0.05)
+    expiring.set('a', '1')
+    fresh = expiring.get('a')
+    time.sleep(0.1)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='result_cache_test_'), 'cache.db')
+    ResultCache(db_path=db_path).set('a', '15709', 0.95)
+    reopened = ResultCache(max_entries=0, db_path=db_path)
+    return [check("the key changes with the bytes, the config, the backend and the pipeline",
+                  len({key, *changed}) == 5 and key == reading_key(b'frame', 'config', 'ocrspace')),
+            check("the least recently used entry is evicted first",
+                  lru.get('a') == ('1', None) and lru.get('b') is None and lru.get('c') == ('3', None)),
+            check("an entry past its TTL is gone", fresh == ('1', None) and expiring.get('a') is None),
+            check("the SQLite tier answers after a restart with the confidence, even with no memory tier",
+                  reopened.get('a') == ('15709', 0.95))]
+
+
+def test_upload():
+    workdir = tempfile.mkdtemp(prefix='result_cache_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(workdir, server, READINGS_DB=os.path.join(workdir, 'readings.db')))
+    client = flask_app.test_client()
+
+    def upload(name):
+        with open(os.path.join(HERE, name), 'rb') as f:
+            data = f.read()
+        return client.post('/upload', data={'image': (io.BytesIO(data), name), 'device_id': 'meter'},
+                           content_type='multipart/form-data').get_json()
+
+    try:
+        first = upload('pic2.jpg')
+        requests = server.requests
+        again = upload('pic2.jpg')
+        repeat_calls = server.requests - requests
+
+        server.text = 'no digits here'
+        unread = upload('pic3.jpg')
+        server.text = 'kW-h\n15709.\n'
+        requests = server.requests
+        retried = upload('pic3.jpg')
+        retry_calls = server.requests - requests
+        history = client.get('/meters/meter/readings').get_json()['readings']
+    finally:
+        server.stop()
+    return [check("the same image again is answered from the cache without an OCR call",
+                  first.get('cache_hit') is False and again.get('cache_hit') is True
+                  and again.get('meter_reading') == first.get('meter_reading') and repeat_calls == 0
+                  and again.get('confidence') == first.get('confidence') is not None),
+            check("a cache hit adds no second history row for the same frame",
+                  [row['reading'] for row in history] == ['15709', '15709']),
+            check("an image that gave no reading is not cached",
+                  'error' in unread and retried.get('meter_reading') == '15709' and retry_calls > 0)]
+
+
+def main():
+    results = [*test_cache(), *test_upload()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,113 @@
+"""Worker cold-start benchmark for backend/app.py.
+
+Each run is a fresh Python process (as a new gunicorn worker or a
+serverless cold start would be) that measures:
+
+    import         `import app`
+    create         building the WSGI app: create_app(), or the module's
+                   `app` on trees from before the factory
+    warm_up        app.warm_up(), when the tree has it and --warm is given
+    first_request  the first /upload (local backend, no network)
+    second_request a second /upload with a different image
+
+and the process wall time from spawn to the end of the first request.
+Runs happen in a scratch directory so the stores start empty each time.
+
+    python startup_benchmark.py [--runs 10] [--warm] [--backend-dir ../backend] [--output startup.json]
+
+--backend-dir can point at another checkout (e.g. a git worktree of an
+older commit) to compare the two.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend'))
+
+from benchmark import summarise
+
+CHILD = r'''
+import io, json, os, sys, time
+backend_dir, warm, first, second = sys.argv[1], sys.argv[2] == '1', sys.argv[3], sys.argv[4]
+sys.path.insert(0, backend_dir)
+timings = {}
+
+started = time.perf_counter()
+import app as module
+timings['import'] = time.perf_counter() - started
+
+started = time.perf_counter()
+wsgi = module.create_app() if hasattr(module, 'create_app') else module.app
+timings['create'] = time.perf_counter() - started
+
+if warm and hasattr(module, 'warm_up'):
+    started = time.perf_counter()
+    module.warm_up()
+    timings['warm_up'] = time.perf_counter() - started
+
+client = wsgi.test_client()
+for name, path in (('first_request', first), ('second_request', second)):
+    with open(path, 'rb') as f:
+        data = f.read()
+    started = time.perf_counter()
+    response = client.post('/upload?backend=local', data={'image': (io.BytesIO(data), os.path.basename(path))},
+                           content_type='multipart/form-data')
+    timings[name] = time.perf_counter() - started
+    timings[name + '_status'] = response.status_code
+print(json.dumps({k: round(v * 1000, 2) if isinstance(v, float) else v for k, v in timings.items()}))
+'''
+
+STAGES = ('import', 'create', 'warm_up', 'first_request', 'second_request', 'ready_wall')
+
+
+def run_once(backend_dir, warm):
+    env = dict(os.environ, OCR_API_KEY=os.environ.get('OCR_API_KEY', 'benchmark-key'), LOG_LEVEL='WARNING')
+    with tempfile.TemporaryDirectory() as scratch:
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD, backend_dir, '1' if warm else '0',
+             os.path.join(HERE, 'meter_sample.jpg'), os.path.join(HERE, 'pic1.jpg')],
+            cwd=scratch, env=env, capture_output=True, text=True)
+        wall = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'child failed')
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    # Everything up to the first response; the second request is not part of cold start
+    timings['ready_wall'] = round(wall - timings['second_request'], 2)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--warm', action='store_true', help='call app.warm_up() before the first request')
+    parser.add_argument('--backend-dir', default=os.path.join(HERE, '..', 'backend'))
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    backend_dir = os.path.abspath(args.backend_dir)
+    runs = [run_once(backend_dir, args.warm) for _ in range(args.runs)]
+    report = {
+        'backend_dir': backend_dir,
+        'warm': args.warm,
+        'runs': args.runs,
+        'statuses': sorted({r['first_request_status'] for r in runs} | {r['second_request_status'] for r in runs}),
+        'ms': {stage: summarise([r[stage] for r in runs if stage in r]) for stage in STAGES},
+    }
+    print(f"{'stage':<16}{'p50 ms':>10}{'p90 ms':>10}{'max ms':>10}")
+    for stage, summary in report['ms'].items():
+        if summary:
+            print(f"{stage:<16}{summary['p50']:>10.1f}{summary['p90']:>10.1f}{summary['max']:>10.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
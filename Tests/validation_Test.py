@@ -0,0 +1,104 @@
+"""Checks reading validation: the monotonic/rate rule and recovery from a misread in the history.
+
+    python Tests/validation_Test.py
+
+The upload checks go through the Flask app and the stub OCR server, whose
+answer is changed between uploads; capture times an hour apart come in
+the X-Capture-Time header.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from ocr_stub_server import StubOCRServer, app_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HOUR = 3600.0
+START = 1_760_000_000.0
+
+
+def check(name, ok):
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def test_rules():
+    from validation import choose_reading, rejection_run
+
+    rate = 10
+    backwards = choose_reading(['15708'], '15709', START, START + HOUR, rate)
+    too_fast = choose_reading(['15800'], '15709', START, START + HOUR, rate)
+    wrapped = choose_reading(['00002'], '99999', START, START + HOUR, rate)
+    second = choose_reading(['95710', '15710'], '15709', START, START + HOUR, rate)
+    fresh = choose_reading(['95709'], None, None, START, rate)
+
+    rejections = [('15709', START + HOUR), ('15710', START + 2 * HOUR)]
+    agreeing = rejection_run('15712', START + 3 * HOUR, rejections, rate)
+    broken = rejection_run('15712', START + 3 * HOUR, rejections + [('88888', START + 2.5 * HOUR)], rate)
+    return [check("a reading below the last one is rejected", backwards == (None, ['15708'])),
+            check("a rise faster than MAX_CONSUMPTION_PER_HOUR is rejected", too_fast == (None, ['15800'])),
+            check("99999 -> 00002 is a roll-over, not a drop", wrapped == ('00002', [])),
+            check("a later candidate from the same text that fits is taken", second == ('15710', ['95710'])),
+            check("a meter without history takes the first candidate", fresh == ('95709', [])),
+            check("rejections that follow each other make one run",
+                  [r for r, _ in agreeing] == ['15709', '15710', '15712']),
+            check("a misread between rejections ends the run", [r for r, _ in broken] == ['15712'])]
+
+
+def test_recovery():
+    workdir = tempfile.mkdtemp(prefix='validation_test_')
+    server = StubOCRServer().start()
+
+    import app as api
+
+    flask_app = api.create_app(app_config(
+        workdir, server, READINGS_DB=os.path.join(workdir, 'readings.db'), OCR_MAX_RETRIES=0,
+        OCR_FALLBACK_BACKEND='', CHANGE_THRESHOLD=-1, DIGIT_CELLS=False, VALIDATION_RECOVER_AFTER=3,
+    ))
+    client = flask_app.test_client()
+    with open(os.path.join(HERE, 'pic1.jpg'), 'rb') as f:
+        image = f.read()
+
+    def upload(text, hours):
+        server.text = f'kW-h\n{text}\n'
+        before = server.stats()['requests']
+        # Trailing bytes after the JPEG end marker keep each upload out of the result cache
+        response = client.post('/upload/raw', data=image + str(hours).encode(), headers={
+            'Content-Type': 'image/jpeg', 'X-Device-Id': 'meter-1', 'X-Capture-Time': str(START + hours * HOUR)})
+        return response.status_code, server.stats()['requests'] - before
+
+    try:
+        misread = upload('95709', 0)
+        first = upload('15709', 1)
+        second = upload('15710', 2)
+        recovered = upload('15712', 3)
+        after = upload('15715', 4)
+        stray = upload('95716', 5)
+        history = client.get('/meters/meter-1/readings').get_json()
+        consumption = client.get('/meters/meter-1/consumption').get_json()
+    finally:
+        server.stop()
+
+    sources = [(r['reading'], r['source']) for r in history['readings']]
+    return [check("a misread with no history before it is accepted", misread == (200, 1)),
+            check("the first reading that contradicts it is rejected after the variant retries",
+                  first == (422, 3)),
+            check("a rejection that continues the earlier one skips the retries", second == (422, 1)),
+            check("the third agreeing rejection is accepted and the misread superseded",
+                  recovered == (200, 1) and ('95709', 'superseded') in sources),
+            check("readings after the recovery validate against the recovered one", after == (200, 1)),
+            check("a lone misread after that is still rejected", stray[0] == 422),
+            check(f"consumption skips the superseded misread (total {consumption.get('total')})",
+                  consumption.get('total') == 3)]
+
+
+def main():
+    results = [*test_rules(), *test_recovery()]
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -1,26 +1,302 @@
-from flask import Flask, request, jsonify
-from dotenv import load_dotenv
-import cv2, os, re, requests
+"""Meter reading API.
+
+create_app() is the entry point (`flask --app app run`, `gunicorn 'app:create_app()'`;
+`app:app` still works). Importing this module is cheap: OpenCV, the OCR
+clients and the SQLite stores are loaded on first use by the get_*()
+functions below, and warm_up() loads them all once per worker.
+"""
+import hashlib, logging, os, threading, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
+from werkzeug.exceptions import ClientDisconnected
 from werkzeug.utils import secure_filename
 
-# 🔑 Load environment variables from .env
-load_dotenv()
-
-app = Flask(__name__)
-
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-OCR_API_KEY = os.getenv('OCR_API_KEY')  # ✅ pulled from .env
-OCR_API_URL = 'https://api.ocr.space/parse/image'
-
-app = Flask(__name__)
-
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+from config import Config
+from event_log import configure_logging, elapsed_ms, log_event
+from extraction import extract_candidates, extract_reading
+from jobs import JobQueue
+from metrics import FRAME_REJECTS, REGISTRY, UPLOAD_SECONDS, UPLOADS, StageTimer, upload_outcome
+from ocr_backends import QUOTA_ERROR, error_status
+from raw_upload import BodyTooLarge, IncompleteBody, is_raw_image, read_body
+from readings_store import ReadingsStore, parse_timestamp
+from result_cache import ResultCache, reading_key
+from validation import allowed_delta, choose_reading, is_plausible, rejection_run
+
+api = Blueprint('api', __name__)
+
+# Confidence reported for readings assembled from recognised digit cells and cached digits
+DIGIT_CELL_CONFIDENCE = 0.9
+
+# The active Config, set by configure(); one pipeline per process
+settings = None
+
+# Built on first use; _init_lock keeps a request and the warm-up thread from building twice
+_init_lock = threading.RLock()
+_preprocessing_ready = False
+_ocr_backends = None
+_result_cache = None
+_change_detector = None
+_digit_cells = None
+_variant_stats = None
+_readings_store = None
+_calibrator = None
+_frame_quality = None
+_batch_pool = None
+_job_queue = None
+_variant_pool = None
+_save_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def configure(config=None):
+    """Loads .env and makes config (default: read from the environment) the active settings.
+
+    Anything built for earlier settings is closed and dropped, so the
+    next request builds it again from these.
+    """
+    global settings
+    if config is None:
+        from dotenv import load_dotenv
+
+        # 🔑 Load environment variables from .env
+        load_dotenv()
+        config = Config()
+    with _init_lock:
+        _reset_pipeline()
+        settings = config
+    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
+    configure_logging(settings.LOG_LEVEL, settings.LOG_SAMPLE_RATE)
+    if not settings.OCR_API_KEY:
+        log_event('ocr_key_missing', logging.WARNING, backend='ocrspace')
+    return settings
+
+
+def _reset_pipeline():
+    global _preprocessing_ready, _ocr_backends, _result_cache, _change_detector, _digit_cells, _variant_stats
+    global _readings_store, _calibrator, _frame_quality, _batch_pool, _job_queue, _variant_pool
+    if _job_queue is not None:
+        _job_queue.close()
+    for pool in (_batch_pool, _variant_pool):
+        if pool is not None:
+            pool.shutdown(wait=False)
+    for backend in (_ocr_backends or {}).values():
+        backend.close()
+    for store in (_result_cache, _readings_store):
+        if store is not None:
+            store.close()
+    _preprocessing_ready = False
+    _ocr_backends = _result_cache = _change_detector = _digit_cells = _variant_stats = None
+    _readings_store = _calibrator = _frame_quality = _batch_pool = _job_queue = _variant_pool = None
+
+
+def create_app(config=None):
+    """Application factory: a Flask app serving the API with config (default: the environment)"""
+    configure(config)
+    flask_app = Flask(__name__)
+    flask_app.config.from_object(settings)
+    flask_app.register_blueprint(api)
+
+    if settings.WARM_UP == 'eager':
+        warm_up()
+    elif settings.WARM_UP == 'background':
+        # Not with gunicorn --preload: a thread started before fork does not reach the workers.
+        # Not a daemon either: one killed inside OpenCV at exit aborts the process
+        threading.Thread(target=warm_up, name='warm-up').start()
+    return flask_app
+
+
+def warm_up():
+    """Loads everything an upload touches, once per worker, so the first request is not the slow one"""
+    started = time.perf_counter()
+    try:
+        load_preprocessing()
+        get_ocr_backends()
+        get_result_cache()
+        get_change_detector()
+        get_digit_cells()
+        get_variant_stats()
+        get_readings_store()
+        get_calibrator()
+        get_frame_quality()
+        from local_ocr import LocalDigitEngine
+        from preprocessing import PREPROCESS_CONFIG, crop_display, filter_display, prepare_for_ocr
+        import numpy as np
+
+        # One tiny frame through the chain: OpenCV's first calls set up its thread pool and kernels
+        frame = np.full((240, 320, 3), 255, np.uint8)
+        processed, _ = prepare_for_ocr(filter_display(crop_display(frame, PREPROCESS_CONFIG), PREPROCESS_CONFIG),
+                                       PREPROCESS_CONFIG)
+        get_ocr_backend(LocalDigitEngine.name).request_detailed(processed)
+    except Exception as e:
+        log_event('warm_up_failed', logging.ERROR, error=str(e))
+        raise
+    log_event('warm_up', ms=elapsed_ms(started))
+
+
+def load_preprocessing():
+    """Imports OpenCV and applies the settings to PREPROCESS_CONFIG, on first use"""
+    global _preprocessing_ready
+    if _preprocessing_ready:
+        return
+    with _init_lock:
+        if _preprocessing_ready:
+            return
+        from filter_engine import SERVED_PROFILES
+        from preprocessing import PREPROCESS_CONFIG
+
+        if settings.PREPROCESS_PROFILE not in SERVED_PROFILES:
+            raise ValueError(f"PREPROCESS_PROFILE must be one of {', '.join(SERVED_PROFILES)}")
+        PREPROCESS_CONFIG['target_digit_height'] = settings.OCR_TARGET_DIGIT_HEIGHT
+        PREPROCESS_CONFIG['jpeg_quality'] = settings.OCR_JPEG_QUALITY
+        PREPROCESS_CONFIG['profile'] = settings.PREPROCESS_PROFILE
+        _preprocessing_ready = True
+
+
+def get_ocr_backends():
+    """Builds the OCR engines on first use: {name: backend}, OCR.space behind its quota governor"""
+    global _ocr_backends
+    if _ocr_backends is None:
+        with _init_lock:
+            if _ocr_backends is None:
+                _ocr_backends = _build_ocr_backends()
+    return _ocr_backends
+
+
+def _build_ocr_backends():
+    from local_ocr import LocalDigitEngine
+    from ocr_backends import GoogleVisionClient
+    from ocr_client import OCRSpaceClient
+    from quota import QuotaGovernor, UsageStore
+
+    # One pooled keep-alive session shared by every request
+    ocr_client = OCRSpaceClient(
+        settings.OCR_API_KEY,
+        settings.OCR_API_URL,
+        pool_size=settings.OCR_POOL_SIZE,
+        connect_timeout=settings.OCR_CONNECT_TIMEOUT,
+        read_timeout=settings.OCR_READ_TIMEOUT,
+        max_retries=settings.OCR_MAX_RETRIES,
+        backoff=settings.OCR_RETRY_BACKOFF,
+        overlay=settings.OCR_OVERLAY,
+    )
+    backends = {
+        LocalDigitEngine.name: LocalDigitEngine(),
+    }
+    if settings.GOOGLE_VISION_API_KEY:
+        backends[GoogleVisionClient.name] = GoogleVisionClient(settings.GOOGLE_VISION_API_KEY)
+    fallback = backends.get(settings.OCR_FALLBACK_BACKEND)
+    if settings.OCR_FALLBACK_BACKEND and fallback is None:
+        raise ValueError(f"OCR_FALLBACK_BACKEND={settings.OCR_FALLBACK_BACKEND} is not a configured backend "
+                         f"(one of: {', '.join(backends)})")
+    backends[ocr_client.name] = QuotaGovernor(
+        ocr_client,
+        fallback=fallback,
+        usage=UsageStore(settings.OCR_USAGE_DB),
+        monthly_limit=settings.OCR_MONTHLY_QUOTA,
+        reserve=settings.OCR_QUOTA_RESERVE,
+        rate_per_minute=settings.OCR_RATE_PER_MINUTE,
+        burst=settings.OCR_RATE_BURST,
+        max_wait=settings.OCR_QUEUE_WAIT,
+        cooldown=settings.OCR_QUOTA_COOLDOWN,
+        strikes=settings.OCR_QUOTA_STRIKES,
+        pause=settings.OCR_QUOTA_PAUSE,
+    )
+    if settings.MOSAIC_WINDOW_MS > 0:
+        from mosaic import MosaicBatcher
+        backends[ocr_client.name] = MosaicBatcher(backends[ocr_client.name],
+                                                  window=settings.MOSAIC_WINDOW_MS / 1000.0,
+                                                  max_tiles=settings.MOSAIC_MAX_TILES)
+    return backends
+
+
+def get_ocr_governor():
+    backend = get_ocr_backends()['ocrspace']
+    # Behind the mosaic batcher when MOSAIC_WINDOW_MS is set
+    return getattr(backend, 'backend', backend)
+
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        with _init_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(max_entries=settings.RESULT_CACHE_SIZE, ttl=settings.RESULT_CACHE_TTL,
+                                            db_path=settings.RESULT_CACHE_DB)
+    return _result_cache
+
+
+def get_change_detector():
+    global _change_detector
+    if _change_detector is None:
+        with _init_lock:
+            if _change_detector is None:
+                from change_detect import ChangeDetector
+                _change_detector = ChangeDetector(threshold=settings.CHANGE_THRESHOLD)
+    return _change_detector
+
+
+def get_digit_cells():
+    global _digit_cells
+    if _digit_cells is None:
+        with _init_lock:
+            if _digit_cells is None:
+                load_preprocessing()
+                from digit_cells import DigitCellCache
+                _digit_cells = DigitCellCache(threshold=settings.DIGIT_CELL_THRESHOLD)
+    return _digit_cells
+
+
+def get_variant_stats():
+    global _variant_stats
+    if _variant_stats is None:
+        with _init_lock:
+            if _variant_stats is None:
+                from variants import VariantStats
+                _variant_stats = VariantStats()
+    return _variant_stats
+
+
+def get_readings_store():
+    """The readings store, or None when READINGS_DB is ''"""
+    global _readings_store
+    if _readings_store is None and settings.READINGS_DB:
+        with _init_lock:
+            if _readings_store is None:
+                _readings_store = ReadingsStore(settings.READINGS_DB)
+    return _readings_store
+
+
+def get_calibrator():
+    global _calibrator
+    if _calibrator is None:
+        with _init_lock:
+            if _calibrator is None:
+                load_preprocessing()
+                from calibration import ROICalibrator
+                _calibrator = ROICalibrator(path=settings.CALIBRATION_FILE,
+                                            min_confidence=settings.CALIBRATION_MIN_CONFIDENCE,
+                                            max_misses=settings.CALIBRATION_MAX_MISSES,
+                                            retry_every=settings.CALIBRATION_RETRY_EVERY)
+    return _calibrator
+
+
+def get_frame_quality():
+    global _frame_quality
+    if _frame_quality is None:
+        with _init_lock:
+            if _frame_quality is None:
+                load_preprocessing()
+                from frame_quality import FrameQualityGate
+                _frame_quality = FrameQualityGate(path=settings.FRAME_QUALITY_FILE, defaults={
+                    'min_sharpness': settings.FRAME_MIN_SHARPNESS,
+                    'min_brightness': settings.FRAME_MIN_BRIGHTNESS,
+                    'max_brightness': settings.FRAME_MAX_BRIGHTNESS,
+                    'max_clipped': settings.FRAME_MAX_CLIPPED,
+                    'max_glare': settings.FRAME_MAX_GLARE,
+                })
+    return _frame_quality
 
-print(f"OCR Key loaded: {OCR_API_KEY[:4]}******")  # Optional
-OCR_API_URL = 'https://api.ocr.space/parse/image'
 
 # def preprocess_image(image_path):
 #     """Crops and lightly preprocesses the image"""
@@ -33,109 +309,688 @@ OCR_API_URL = 'https://api.ocr.space/parse/image'
 #     # crop = img[int(height * 0.2):int(height * 0.4), int(width * 0.2):int(width * 0.9)] # works with setuptest3
 #     crop = img[int(height * 0.05):int(height * 0.3), int(width * 0.1):int(width * 0.7)] # works with setup 
 #     gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-#     processed_path = os.path.join(UPLOAD_FOLDER, 'processed.jpg')
+#     processed_path = os.path.join(settings.UPLOAD_FOLDER, 'processed.jpg')
 #     cv2.imwrite(processed_path, gray)
 #     return processed_path
 
 def preprocess_image(image_path):
     """Crops and preprocesses the image for better OCR"""
+    import cv2
+    from preprocessing import preprocess_array
+
     img = cv2.imread(image_path)
     if img is None:
         return None
 
-    height, width = img.shape[:2]
-    crop = img[int(height * 0.05):int(height * 0.35), int(width * 0.05):int(width * 0.75)]  # wider crop
-
-    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-    blur = cv2.bilateralFilter(gray, 9, 75, 75)
-    equalized = cv2.equalizeHist(blur)
-    thresh = cv2.adaptiveThreshold(equalized, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                   cv2.THRESH_BINARY, 11, 2)
+    thresh = preprocess_array(img)
 
-    processed_path = os.path.join(UPLOAD_FOLDER, 'processed.jpg')
+    # Next to the upload, so concurrent requests never share one processed file
+    processed_path = os.path.splitext(image_path)[0] + '-processed.jpg'
     cv2.imwrite(processed_path, thresh)
     return processed_path
 
 
-def extract_reading(ocr_text):
-    """Extracts 5-digit number from OCR result"""
-    cleaned = ocr_text.replace('•', '').replace('*', '').replace('?', '').replace("'", '')
-    
-    match1 = re.findall(r'(\d\s*\d\s*\d\s*\d\s*\d)', cleaned)
-    if match1:
-        digits = re.sub(r'\s+', '', match1[0])
-        if len(digits) == 5:
-            return digits
+def _write_file(path, data):
+    try:
+        with open(path, 'wb') as f:
+            f.write(data)
+    except OSError as e:
+        log_event('upload_save_failed', logging.WARNING, path=path, error=str(e))
 
-    match2 = re.findall(r'\b\d{5}\b', cleaned)
-    if match2:
-        return match2[0]
 
-    digits_only = re.findall(r'\d', cleaned)
-    if len(digits_only) >= 5:
-        return ''.join(digits_only[:5])
+def upload_path(data, filename, device_id=None):
+    """Where a raw upload is kept: device id plus content hash, so concurrent uploads never overwrite each other"""
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    name = f"{secure_filename(device_id or '') or 'upload'}-{hashlib.sha256(data).hexdigest()[:16]}{extension}"
+    return os.path.join(settings.UPLOAD_FOLDER, name)
 
-    return None
 
-def ocr_space_request(image_path):
-    try:
-        with open(image_path, 'rb') as f:
-            files = {'file': f}
-            data = {
-                'apikey': OCR_API_KEY,
-                'language': 'eng',
-                'scale': 'true',
-                'OCREngine': '2'
-            }
-
-            response = requests.post(OCR_API_URL, files=files, data=data)
-
-        # ✅ NOW it's safe to print
-        print("🌐 OCR.space status:", response.status_code)
-        print("🔁 OCR.space raw response:", response.text)
-
-        if response.status_code != 200:
-            return None, "API Error"
-
-        result = response.json()
-        if result.get('OCRExitCode') == 1:
-            text = result['ParsedResults'][0]['ParsedText']
-            return text, None
-        else:
-            return None, result.get('ErrorMessage', 'Unknown OCR error')
+def save_upload_async(data, filename, device_id=None):
+    """Persists a raw upload in the background so the request never waits on disk"""
+    return _save_executor.submit(_write_file, upload_path(data, filename, device_id), data)
+
+
+def ocr_space_request(image):
+    """Sends an image to OCR.space through the quota governor and the shared pooled client"""
+    return get_ocr_governor().request(image)
+
+
+def get_batch_pool():
+    """Starts the preprocessing process pool on the first batch request"""
+    global _batch_pool
+    if _batch_pool is None:
+        with _init_lock:
+            if _batch_pool is None:
+                _batch_pool = ProcessPoolExecutor(max_workers=settings.BATCH_PREPROCESS_WORKERS)
+    return _batch_pool
+
+
+def get_job_queue():
+    """Starts the upload job workers on first use"""
+    global _job_queue
+    if _job_queue is None:
+        with _init_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue(run_upload_job, workers=settings.JOB_WORKERS, db_path=settings.JOB_QUEUE_DB)
+    return _job_queue
 
+
+def get_variant_pool():
+    """Thread pool for consensus variants; OpenCV and socket I/O both release the GIL"""
+    global _variant_pool
+    if _variant_pool is None:
+        with _init_lock:
+            if _variant_pool is None:
+                _variant_pool = ThreadPoolExecutor(max_workers=settings.VARIANT_WORKERS)
+    return _variant_pool
+
+
+def get_device_id():
+    """Device id from the form field or X-Device-Id header, if the client sent one"""
+    return request.form.get('device_id') or request.headers.get('X-Device-Id')
+
+
+def get_ocr_backend(name=None):
+    """Looks up a registered OCR backend, falling back to the configured default"""
+    return get_ocr_backends().get(name or settings.OCR_BACKEND)
+
+
+def record_reading(device_id, reading, captured_at=None, raw_text=None, confidence=None, source='ocr'):
+    """Appends an accepted reading to the meter's history (meter id = device id)"""
+    readings_store = get_readings_store()
+    if readings_store is None or not device_id:
+        return
+    try:
+        readings_store.add(device_id, reading, captured_at, raw_text, confidence, source)
+    except Exception as e:
+        log_event('reading_store_failed', logging.ERROR, device_id=device_id, error=str(e))
+
+
+def last_known_reading(device_id, captured_at=None):
+    """(reading, epoch) of the meter's latest stored reading before captured_at, if validation applies"""
+    readings_store = get_readings_store()
+    if not settings.VALIDATE_READINGS or readings_store is None or not device_id:
+        return None, None
+    last = readings_store.last(device_id, before=captured_at)
+    if last is None:
+        return None, None
+    return last['reading'], parse_timestamp(last['captured_at'])
+
+
+def recover_reading(device_id, candidates, last_at, captured_at=None):
+    """Checks rejected candidates against the meter's earlier rejections.
+
+    Returns (reading, run): reading is the first candidate whose run of
+    agreeing rejections reached VALIDATION_RECOVER_AFTER - the stored
+    readings it contradicts are superseded - else None; run is the longest
+    such run, so the caller can tell a self-consistent read from a misread.
+    """
+    readings_store = get_readings_store()
+    needed = settings.VALIDATION_RECOVER_AFTER
+    if readings_store is None or not device_id or needed <= 0 or not candidates:
+        return None, 0
+    captured_at = captured_at or time.time()
+    rejections = readings_store.rejections(device_id, after=last_at, before=captured_at)
+    longest = 0
+    for candidate in candidates:
+        run = rejection_run(candidate, captured_at, rejections, settings.MAX_CONSUMPTION_PER_HOUR)
+        longest = max(longest, len(run))
+        if len(run) < needed:
+            continue
+        first, first_at = run[0]
+        superseded = []
+        # The run outvotes at most as many stored readings as it has agreeing ones
+        for _ in range(len(run)):
+            last = readings_store.last(device_id, before=first_at)
+            last_at = parse_timestamp(last['captured_at']) if last else None
+            if last is None or is_plausible(first, last['reading'],
+                                            allowed_delta(last_at, first_at, settings.MAX_CONSUMPTION_PER_HOUR)):
+                break
+            readings_store.supersede(last['id'])
+            superseded.append(last['reading'])
+        log_event('reading_recovered', logging.WARNING, device_id=device_id, reading=candidate,
+                  run=len(run), superseded=superseded)
+        return candidate, len(run)
+    return None, longest
+
+
+def reject_reading(device_id, reading, captured_at=None):
+    """Remembers a reading validation turned down, for recover_reading"""
+    readings_store = get_readings_store()
+    if readings_store is None or not device_id or not reading or settings.VALIDATION_RECOVER_AFTER <= 0:
+        return
+    try:
+        readings_store.reject(device_id, reading, captured_at)
     except Exception as e:
-        print(f"❌ OCR request failed: {e}")
-        return None, str(e)
+        log_event('reading_store_failed', logging.ERROR, device_id=device_id, error=str(e))
+
+
+def retry_with_variants(display, backend, last_reading, last_at, captured_at=None):
+    """Costly path: OCR other preprocessing variants until one yields a plausible reading.
+
+    Returns (reading or None, ocr_text, candidates, names of the variants tried).
+    """
+    from variants import VARIANTS, ocr_variant
+
+    tried = []
+    names = [name for name in get_variant_stats().ordered(list(VARIANTS)) if name != 'bilateral_adaptive']
+    for name in names[:settings.VALIDATION_MAX_RETRIES]:
+        tried.append(name)
+        ocr_text, error = ocr_variant(name, display, backend)
+        if error:
+            continue
+        candidates = extract_candidates(ocr_text)
+        reading, _ = choose_reading([c['reading'] for c in candidates], last_reading, last_at,
+                                    captured_at or time.time(), settings.MAX_CONSUMPTION_PER_HOUR)
+        if reading:
+            return reading, ocr_text, candidates, tried
+    return None, None, [], tried
+
+
+def process_upload(data, filename, backend, device_id=None, consensus=None, captured_at=None):
+    """Runs one raw upload through cache -> preprocess -> OCR -> extract.
+
+    Returns (body, status_code) so it can serve both the synchronous route
+    and the background job workers. With consensus, several preprocessing
+    variants are OCR'd and voted on instead of the single filter chain.
+    Every call feeds the /metrics stage histograms and outcome counters.
+    """
+    timer = StageTimer()
+    started = time.perf_counter()
+    body, status = _process_upload(data, filename, backend, device_id, consensus, captured_at, timer)
+    observe_upload(body, status, backend, device_id, started, timer)
+    return body, status
+
+
+def observe_upload(body, status, backend, device_id, started, timer):
+    """Counts a finished upload in /metrics and the sampled upload log"""
+    outcome = upload_outcome(body, status)
+    UPLOADS.inc(outcome=outcome)
+    UPLOAD_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+    log_event('upload', sampled=True, outcome=outcome, status=status, backend=backend.name,
+              device_id=device_id, ms=elapsed_ms(started), stages_ms=timer.timings,
+              reading=body.get('meter_reading'), error=body.get('error'))
+
+
+def _process_upload(data, filename, backend, device_id, consensus, captured_at, timer):
+    upload = Upload(data, filename, backend, device_id, consensus, captured_at, timer)
+    early = prepare_upload(upload)
+    if early:
+        return early
+    if upload.consensus:
+        return read_consensus(upload)
+    with timer.stage('ocr'):
+        ocr_text, words, error = backend.request_detailed(upload.processed)
+    return finish_upload(upload, ocr_text, words, error)
+
+
+class Upload:
+    """One upload's state between the pipeline phases.
+
+    prepare_upload() runs everything before the OCR call and
+    finish_upload() everything after it, so the call in between can be
+    the blocking one (process_upload) or an awaited one (asgi.py).
+    """
+
+    def __init__(self, data, filename, backend, device_id, consensus, captured_at, timer):
+        self.data = data
+        self.filename = filename
+        self.backend = backend
+        self.device_id = device_id
+        self.captured_at = captured_at
+        self.timer = timer
+        self.consensus = ((settings.CONSENSUS_MODE if consensus is None else consensus)
+                          and settings.UPLOAD_MODE != 'disk')
+        self.calibrated = bool(device_id and settings.AUTO_CALIBRATE and settings.UPLOAD_MODE != 'disk')
+        self.config = None
+        self.key = None
+        self.display = None
+        self.display_signature = None
+        self.processed = None
+        self.cells = None
+        self.filtered = None
+        self.extra = {}
+
+
+def prepare_upload(upload):
+    """Cache lookup, decode, quality gate, calibrate, crop, change detection, filter, digit cells and encode.
+
+    Returns (body, status) when the upload is answered without OCR (cache
+    hit, unchanged frame, bad image, frame to recapture), otherwise None
+    with upload.processed ready for the OCR backend.
+    """
+    load_preprocessing()
+    from preprocessing import (PREPROCESS_CONFIG, config_signature, crop_display, decode_image, filter_display,
+                               prepare_for_ocr)
+
+    timer, device_id = upload.timer, upload.device_id
+    pipeline = 'consensus' if upload.consensus else 'single'
+    config = get_calibrator().stored_config(device_id) if upload.calibrated else PREPROCESS_CONFIG
+
+    upload.key = reading_key(upload.data, config_signature(config), upload.backend.name, pipeline)
+    cached = get_result_cache().get(upload.key)
+    if cached:
+        # The same bytes were read before and went into the meter's history then; a retry adds no row
+        reading, confidence = cached
+        return {'meter_reading': reading, 'confidence': confidence, 'cache_hit': True}, 200
+
+    if settings.UPLOAD_MODE == 'disk':
+        filepath = upload_path(upload.data, upload.filename, device_id)
+        with open(filepath, 'wb') as f:
+            f.write(upload.data)
+
+        with timer.stage('preprocess'):
+            upload.processed = preprocess_image(filepath)
+        if not upload.processed:
+            return {'error': 'Image preprocessing failed'}, 500
+        return None
+
+    if settings.SAVE_UPLOADS:
+        save_upload_async(upload.data, upload.filename, device_id)
+
+    with timer.stage('decode'):
+        img = decode_image(upload.data)
+    if img is None:
+        return {'error': 'Image preprocessing failed'}, 500
+
+    if settings.FRAME_QUALITY_GATE:
+        with timer.stage('quality'):
+            reason, quality = get_frame_quality().check(img, device_id, config['crop'])
+        if reason:
+            # Before calibration, so an unusable frame neither moves the ROI nor counts as a miss
+            from frame_quality import RECAPTURE_HINTS
+
+            FRAME_REJECTS.inc(reason=reason)
+            return {'error': f'Frame rejected: {reason}', 'recapture': reason, 'hint': RECAPTURE_HINTS[reason],
+                    'quality': quality}, 422
+
+    if upload.calibrated:
+        with timer.stage('calibrate'):
+            config = get_calibrator().config_for(device_id, img)
+        upload.key = reading_key(upload.data, config_signature(config), upload.backend.name, pipeline)
+    upload.config = config
+
+    with timer.stage('crop'):
+        upload.display = crop_display(img, config)
+    if (not upload.consensus and upload.calibrated and settings.DIGIT_CELLS and not upload.backend.wants_display
+            and get_calibrator().is_calibrated(device_id)):
+        # Per-drum comparison; finer than the display hash, which cannot see one drum turn
+        with timer.stage('cells'):
+            upload.cells = get_digit_cells().frame(device_id, upload.display)
+        distance = upload.cells.distance
+        if settings.CHANGE_THRESHOLD >= 0 and distance is not None and distance <= settings.CHANGE_THRESHOLD:
+            previous = upload.cells.previous_reading
+            confidence = upload.cells.previous_confidence
+            record_reading(device_id, previous, upload.captured_at, confidence=confidence, source='unchanged')
+            return {'meter_reading': previous, 'confidence': confidence, 'cache_hit': False, 'ocr_skipped': True,
+                    'digit_cells': [], 'change_distance': distance}, 200
+        if upload.cells.partial and not upload.cells.moved:
+            # No drum moved, but reusing unchanged frames is off (or stricter than DIGIT_CELL_THRESHOLD)
+            upload.cells.recognise_all()
+        if upload.cells.partial:
+            upload.extra['digit_cells'] = upload.cells.changed
+            if not upload.cells.changed:
+                # Only drums caught mid-roll moved: the cached digits give the whole reading
+                return finish_upload(upload, '', None, None)
+    elif settings.CHANGE_THRESHOLD >= 0 and upload.calibrated and get_calibrator().is_calibrated(device_id):
+        # Only a calibrated crop is known to frame the drums the signatures compare
+        with timer.stage('change_detect'):
+            change_detector = get_change_detector()
+            upload.display_signature = change_detector.signature(upload.display)
+            previous, confidence, distance = change_detector.match(device_id, upload.display_signature)
+        if previous:
+            record_reading(device_id, previous, upload.captured_at, confidence=confidence, source='unchanged')
+            return {'meter_reading': previous, 'confidence': confidence, 'cache_hit': False,
+                    'ocr_skipped': True, 'change_distance': distance}, 200
+
+    if not upload.consensus and upload.backend.wants_display:
+        upload.processed = upload.display
+    elif not upload.consensus:
+        with timer.stage('filter'):
+            upload.processed = upload.filtered = filter_display(upload.display, config)
+        if upload.cells is not None and upload.cells.partial:
+            upload.processed = upload.cells.strip(upload.filtered)
+        if not upload.backend.accepts_arrays:
+            with timer.stage('encode'):
+                upload.processed, payload_stats = prepare_for_ocr(upload.processed, config,
+                                                                  settings.OCR_PAYLOAD_STATS)
+            upload.extra.update(payload_stats)
+            if upload.processed is None:
+                return {'error': 'Image preprocessing failed'}, 500
+    return None
+
+
+def read_consensus(upload):
+    """Consensus pipeline: OCR several variants of the display and vote"""
+    from variants import read_with_consensus
+
+    with upload.timer.stage('consensus'):
+        vote = read_with_consensus(upload.display, upload.backend, extract_reading, get_variant_pool(),
+                                   get_variant_stats(), concurrency=settings.VARIANT_CONCURRENCY,
+                                   agree=settings.VARIANT_AGREE)
+    if vote['reading'] is None and vote['error']:
+        return {'error': vote['error']}, error_status(vote['error'])
+    reading = vote['reading']
+    upload.extra = {'votes': vote['votes'], 'variants': vote['variants']}
+    confidence = round(vote['votes'] / len(vote['variants']), 3) if vote['variants'] else None
+
+    last_reading, last_at = last_known_reading(upload.device_id, upload.captured_at)
+    if reading and last_reading:
+        by_votes = Counter(r for r in vote['variants'].values() if r)
+        reading, rejected = choose_reading([r for r, _ in by_votes.most_common()], last_reading, last_at,
+                                           upload.captured_at or time.time(), settings.MAX_CONSUMPTION_PER_HOUR)
+        upload.extra.update(last_reading=last_reading, rejected_candidates=rejected)
+        if reading is None:
+            reading, run = recover_reading(upload.device_id, rejected, last_at, upload.captured_at)
+            upload.extra['recovered' if reading else 'rejection_run'] = run
+            if reading is None:
+                reject_reading(upload.device_id, rejected[0], upload.captured_at)
+    return _conclude(upload, reading, None, confidence)
+
+
+def finish_upload(upload, ocr_text, words, error):
+    """Extract, validate against the meter's history (retrying variants if needed) and store"""
+    extra, timer = upload.extra, upload.timer
+    if 'ocr' in timer.timings:
+        extra['ocr_ms'] = round(timer.timings['ocr'], 1)
+    if upload.cells is not None and upload.cells.partial:
+        reading = upload.cells.merge(ocr_text) if not error else None
+        if reading:
+            last_reading, last_at = last_known_reading(upload.device_id, upload.captured_at)
+            reading, _ = choose_reading([reading], last_reading, last_at, upload.captured_at or time.time(),
+                                        settings.MAX_CONSUMPTION_PER_HOUR)
+        if reading:
+            extra['strategy'] = 'digit_cells'
+            return _conclude(upload, reading, ocr_text, DIGIT_CELL_CONFIDENCE)
+        if error == QUOTA_ERROR:
+            return {'error': error, **extra}, 429
+        # The cells did not read as digits: OCR the whole display after all
+        extra['digit_cells_fallback'] = True
+        with timer.stage('ocr_full'):
+            ocr_text, words, error = upload.backend.request_detailed(encode_display(upload))
+    if error:
+        return {'error': error, **extra}, error_status(error)
+    with timer.stage('extract'):
+        candidates = extract_candidates(ocr_text, words)
+    if upload.cells is not None:
+        for candidate in candidates:
+            candidate['reading'] = upload.cells.round(candidate['reading'])
+    reading = candidates[0]['reading'] if candidates else None
+
+    last_reading, last_at = last_known_reading(upload.device_id, upload.captured_at)
+    if last_reading:
+        # Cheap pass first: any other ranked candidate from the same text that fits the history
+        reading, rejected = choose_reading([c['reading'] for c in candidates], last_reading, last_at,
+                                           upload.captured_at or time.time(), settings.MAX_CONSUMPTION_PER_HOUR)
+        extra.update(last_reading=last_reading, rejected_candidates=rejected)
+        run = 0
+        if reading is None:
+            reading, run = recover_reading(upload.device_id, rejected, last_at, upload.captured_at)
+            extra['recovered' if reading else 'rejection_run'] = run
+        # A text that continues earlier rejections is no misread: other variants would not change it
+        if reading is None and run < 2 and upload.display is not None:
+            with timer.stage('retry'):
+                reading, ocr_text, candidates, retried = retry_with_variants(
+                    upload.display, upload.backend, last_reading, last_at, upload.captured_at)
+            extra['retried_variants'] = retried
+        if reading is None and rejected:
+            reject_reading(upload.device_id, rejected[0], upload.captured_at)
+
+    confidence = None
+    chosen = next((c for c in candidates if c['reading'] == reading), None)
+    if chosen:
+        confidence = chosen['confidence']
+        extra['strategy'] = chosen['strategy']
+    return _conclude(upload, reading, ocr_text, confidence)
+
+
+def encode_display(upload):
+    """The whole filtered display as the backend takes it, for when the digit-cell strip was sent instead"""
+    from preprocessing import filter_display, prepare_for_ocr
+
+    if upload.backend.wants_display:
+        return upload.display
+    if upload.filtered is None:
+        upload.filtered = filter_display(upload.display, upload.config)
+    if upload.backend.accepts_arrays:
+        return upload.filtered
+    return prepare_for_ocr(upload.filtered, upload.config)[0]
+
+
+def _conclude(upload, reading, ocr_text, confidence):
+    if upload.calibrated:
+        get_calibrator().record(upload.device_id, success=bool(reading))
+    if reading:
+        get_result_cache().set(upload.key, reading, confidence)
+        if upload.display_signature is not None:
+            get_change_detector().accept(upload.device_id, upload.display_signature, reading, confidence)
+        if upload.cells is not None:
+            get_digit_cells().accept(upload.device_id, upload.cells, reading, confidence)
+        record_reading(upload.device_id, reading, upload.captured_at, raw_text=ocr_text, confidence=confidence)
+        return {'meter_reading': reading, 'confidence': confidence, 'cache_hit': False,
+                'ocr_skipped': False, **upload.extra}, 200
+    else:
+        return {'error': 'Could not extract meter reading', **upload.extra}, 422
+
+
+def count_outcomes(results):
+    """Passes batch results through, counting each image like a single upload"""
+    for result in results:
+        UPLOADS.inc(outcome=upload_outcome(result, result['status']))
+        yield result
+
+
+def run_upload_job(payload):
+    """Job worker entry point: payload is what upload() queued"""
+    backend = get_ocr_backend(payload.get('backend'))
+    if backend is None:
+        return {'error': f"Unknown OCR backend: {payload.get('backend')}"}, 400
+    return process_upload(payload['data'], payload['filename'], backend, payload.get('device_id'),
+                          payload.get('consensus'), payload.get('captured_at'))
+
+
+def request_flag(name, default):
+    """Boolean query/form flag such as ?async=1, falling back to the configured default"""
+    flag = request.args.get(name) or request.form.get(name)
+    if flag is None:
+        return default
+    return flag.lower() in ('1', 'true', 'yes')
+
 
+def respond_to_upload(data, filename, backend, device_id, consensus, captured_at):
+    """Queues the upload (?async=1) or processes it now, as the response to return"""
+    if request_flag('async', settings.ASYNC_UPLOADS):
+        job_id = get_job_queue().submit({
+            'data': data,
+            'filename': filename,
+            'backend': backend.name,
+            'device_id': device_id,
+            'consensus': consensus,
+            'captured_at': captured_at,
+        })
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202, {'Location': f'/jobs/{job_id}'}
 
-@app.route('/upload', methods=['POST'])
+    body, status = process_upload(data, filename, backend, device_id, consensus, captured_at)
+    return jsonify(body), status
+
+
+@api.route('/upload', methods=['POST'])
 def upload():
     if 'image' not in request.files:
         return jsonify({'error': 'No image uploaded'}), 400
 
+    backend_name = request.args.get('backend') or request.form.get('backend')
+    backend = get_ocr_backend(backend_name)
+    if backend is None:
+        return jsonify({'error': f'Unknown OCR backend: {backend_name}',
+                        'available': sorted(get_ocr_backends())}), 400
+
     file = request.files['image']
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
+    filename = secure_filename(file.filename) or 'upload.jpg'
+    device_id = get_device_id()
+    captured_at = parse_timestamp(request.form.get('captured_at') or request.headers.get('X-Capture-Time'))
+    data = file.stream.read()
+
+    consensus = request_flag('consensus', settings.CONSENSUS_MODE)
+
+    return respond_to_upload(data, filename, backend, device_id, consensus, captured_at)
+
+
+@api.route('/upload/raw', methods=['POST', 'PUT'])
+def upload_raw():
+    """Device endpoint: the body is the image, metadata comes in X-Device-Id / X-Capture-Time headers"""
+    if not is_raw_image(request.content_type):
+        return jsonify({'error': 'Send the image as the body with Content-Type: image/jpeg'}), 415
+
+    backend_name = request.args.get('backend')
+    backend = get_ocr_backend(backend_name)
+    if backend is None:
+        return jsonify({'error': f'Unknown OCR backend: {backend_name}',
+                        'available': sorted(get_ocr_backends())}), 400
+
+    try:
+        data = read_body(request.stream, request.content_length, settings.RAW_UPLOAD_MAX_BYTES)
+    except BodyTooLarge:
+        return jsonify({'error': f'Image larger than {settings.RAW_UPLOAD_MAX_BYTES} bytes'}), 413
+    except (IncompleteBody, ClientDisconnected):
+        # Werkzeug's stream raises ClientDisconnected itself when the body ends before its Content-Length
+        return jsonify({'error': 'Body shorter than Content-Length'}), 400
+    if not data:
+        return jsonify({'error': 'No image uploaded'}), 400
+
+    filename = secure_filename(request.headers.get('X-Filename', '')) or 'upload.jpg'
+    device_id = request.headers.get('X-Device-Id')
+    captured_at = parse_timestamp(request.headers.get('X-Capture-Time'))
+    consensus = request_flag('consensus', settings.CONSENSUS_MODE)
+    return respond_to_upload(data, filename, backend, device_id, consensus, captured_at)
 
-    processed_path = preprocess_image(filepath)
-    if not processed_path:
-        return jsonify({'error': 'Image preprocessing failed'}), 500
 
-    ocr_text, error = ocr_space_request(processed_path)
+@api.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Job state; ?wait=<seconds> long-polls until the job finishes"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), settings.JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+
+    job = get_job_queue().get(job_id, wait=wait)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+
+    body = {'job_id': job_id, 'status': job['status']}
+    if job['status'] != 'done':
+        return jsonify(body), 202
+    body.update(result=job['result'], status_code=job['status_code'])
+    return jsonify(body), 200
+
+
+@api.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """Accepts many images (or a zip/tar) and streams one NDJSON line per image as it completes"""
+    backend_name = request.args.get('backend') or request.form.get('backend')
+    backend = get_ocr_backend(backend_name)
+    if backend is None:
+        return jsonify({'error': f'Unknown OCR backend: {backend_name}',
+                        'available': sorted(get_ocr_backends())}), 400
+
+    load_preprocessing()
+    from batch import archive_kind, iter_batch_images, run_batch, to_ndjson
+
+    files = request.files.getlist('images') + request.files.getlist('image')
+    content_type = request.content_type or ''
+    body = None
+    if not files:
+        if not archive_kind(content_type=content_type):
+            return jsonify({'error': 'No images uploaded'}), 400
+        body = request.stream
+
+    images = iter_batch_images(files, body, content_type)
+    results = run_batch(images, backend, extract_reading, get_batch_pool(),
+                        ocr_concurrency=settings.BATCH_OCR_CONCURRENCY, max_images=settings.BATCH_MAX_IMAGES,
+                        cache=get_result_cache(), window=settings.BATCH_WINDOW)
+    return Response(stream_with_context(to_ndjson(count_outcomes(results))), mimetype='application/x-ndjson')
+
+
+def _range_args():
+    start = parse_timestamp(request.args.get('from'))
+    end = parse_timestamp(request.args.get('to'))
+    if (request.args.get('from') and start is None) or (request.args.get('to') and end is None):
+        return None, None, 'from/to must be epoch seconds or ISO 8601'
+    return start, end, None
+
+
+@api.route('/meters/<meter_id>/readings', methods=['GET'])
+def meter_readings(meter_id):
+    """Stored readings for a meter, oldest first; page with ?cursor=<next_cursor>"""
+    readings_store = get_readings_store()
+    if readings_store is None:
+        return jsonify({'error': 'Readings store is disabled'}), 404
+    start, end, error = _range_args()
     if error:
-        return jsonify({'error': error}), 500
+        return jsonify({'error': error}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 100)), settings.READINGS_MAX_PAGE))
+        after = int(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+
+    rows, next_cursor = readings_store.range(meter_id, start, end, limit=limit, after=after)
+    return jsonify({'meter_id': meter_id, 'readings': rows, 'next_cursor': next_cursor}), 200
+
+
+@api.route('/meters/<meter_id>/consumption', methods=['GET'])
+def meter_consumption(meter_id):
+    """Consumption deltas between consecutive stored readings in ?from=&to="""
+    readings_store = get_readings_store()
+    if readings_store is None:
+        return jsonify({'error': 'Readings store is disabled'}), 404
+    start, end, error = _range_args()
+    if error:
+        return jsonify({'error': error}), 400
+
+    deltas, total = readings_store.consumption(meter_id, start, end)
+    return jsonify({'meter_id': meter_id, 'total': total, 'deltas': deltas}), 200
 
-    reading = extract_reading(ocr_text)
-    if reading:
-        return jsonify({'meter_reading': reading}), 200
-    else:
-        return jsonify({'error': 'Could not extract meter reading'}), 422
 
-@app.route('/', methods=['GET'])
+@api.route('/meters/<meter_id>/frame-quality', methods=['GET', 'PUT'])
+def meter_frame_quality(meter_id):
+    """The quality gate thresholds for a meter; PUT a JSON object to override some (null restores the default)"""
+    gate = get_frame_quality()
+    if request.method == 'PUT':
+        overrides = request.get_json(silent=True)
+        if not isinstance(overrides, dict):
+            return jsonify({'error': 'Send a JSON object of thresholds'}), 400
+        try:
+            gate.set_thresholds(meter_id, overrides)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'thresholds': sorted(gate.defaults)}), 400
+    return jsonify({'meter_id': meter_id, 'thresholds': gate.thresholds_for(meter_id)}), 200
+
+
+@api.route('/usage', methods=['GET'])
+def ocr_usage():
+    """OCR.space quota use this month, the projected month total and calls per day per backend"""
+    return jsonify(get_ocr_governor().report()), 200
+
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage latency histograms and upload outcome counters in the Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@api.route('/', methods=['GET'])
 def home():
     return '📸 OCR API is running!', 200
 
+
+def __getattr__(name):
+    # `app:app` (gunicorn, older scripts) builds the default app on first access
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,308 @@
+"""ASGI entry point: the /upload contract on asyncio.
+
+    uvicorn asgi:app --port 5000
+
+Serves POST /upload (multipart, same fields, flags and responses as the
+Flask route), POST|PUT /upload/raw, GET /jobs/<id> for ?async=1 uploads,
+GET /metrics and GET /. Everything else - readings, usage - stays on the
+Flask app.
+
+The pipeline is the one in app.py, split around the OCR call: decode,
+calibrate, crop, filter and encode run on a bounded thread pool
+(ASGI_CPU_WORKERS), then the OCR.space request is awaited on a pooled
+httpx client, so an upload waiting on the API holds no thread and one
+process can keep hundreds in flight. Other backends (local, google) and
+the consensus / validation-retry paths are blocking and run on the pool.
+With MOSAIC_WINDOW_MS set, OCR.space requests go through the (blocking)
+mosaic batcher instead, on a thread pool of their own.
+"""
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import parse_qs
+
+import app as pipeline
+from event_log import log_event
+from metrics import REGISTRY, StageTimer
+from raw_upload import BodyTooLarge, IncompleteBody, is_raw_image, read_body_async
+from readings_store import parse_timestamp
+
+# How often a GET /jobs/<id>?wait= long poll looks at the job again
+JOB_POLL_INTERVAL = 0.05
+
+
+class Request:
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query = {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        self.form = {}
+
+    @property
+    def content_length(self):
+        value = self.headers.get('content-length')
+        return int(value) if value and value.isdigit() else None
+
+    def flag(self, name, default):
+        """Same rules as app.request_flag"""
+        value = self.query.get(name) or self.form.get(name)
+        if value is None:
+            return default
+        return value.lower() in ('1', 'true', 'yes')
+
+
+class MeterApp:
+    """The ASGI application; settings are loaded (and the pipeline warmed) on lifespan startup"""
+
+    def __init__(self, config=None):
+        self.config = config
+        self.settings = None
+        self.executor = None
+        self.mosaic_executor = None
+        self.ocr_client = None
+        self.in_flight = 0
+        self.started = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        # Servers without lifespan support start the app on the first request instead
+        await self.startup()
+
+        request = Request(scope)
+        try:
+            status, body, headers = await self.route(request, receive)
+        except Exception as e:
+            log_event('asgi_error', logging.ERROR, path=request.path, error=str(e))
+            status, body, headers = 500, {'error': 'Internal server error'}, {}
+        await self.respond(send, status, body, headers)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        if self.started is None:
+            self.started = asyncio.ensure_future(self._start())
+        await asyncio.shield(self.started)
+
+    async def _start(self):
+        from ocr_client import AsyncOCRSpaceClient
+
+        settings = self.settings = pipeline.configure(self.config)
+        self.executor = ThreadPoolExecutor(max_workers=settings.ASGI_CPU_WORKERS, thread_name_prefix='asgi-cpu')
+        self.ocr_client = AsyncOCRSpaceClient(
+            settings.OCR_API_KEY,
+            settings.OCR_API_URL,
+            max_connections=settings.ASGI_OCR_CONNECTIONS,
+            connect_timeout=settings.OCR_CONNECT_TIMEOUT,
+            read_timeout=settings.OCR_READ_TIMEOUT,
+            max_retries=settings.OCR_MAX_RETRIES,
+            backoff=settings.OCR_RETRY_BACKOFF,
+            overlay=settings.OCR_OVERLAY,
+        )
+        if settings.MOSAIC_WINDOW_MS > 0:
+            # Callers of the mosaic batcher block for its window; they wait here, not on the CPU pool
+            self.mosaic_executor = ThreadPoolExecutor(max_workers=settings.ASGI_OCR_CONNECTIONS,
+                                                      thread_name_prefix='asgi-mosaic')
+        if settings.WARM_UP != 'off':
+            await self.run_cpu(pipeline.warm_up)
+
+    async def shutdown(self):
+        if self.ocr_client is not None:
+            await self.ocr_client.aclose()
+        if pipeline._job_queue is not None:
+            await asyncio.to_thread(pipeline._job_queue.close)
+        for executor in (self.executor, self.mosaic_executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def run_cpu(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def route(self, request, receive):
+        if request.path == '/' and request.method == 'GET':
+            return 200, '📸 OCR API is running!', {}
+        if request.path == '/metrics' and request.method == 'GET':
+            return 200, REGISTRY.render(), {'content-type': 'text/plain; version=0.0.4'}
+        if request.path.startswith('/jobs/') and request.method == 'GET':
+            return await self.job_status(request, request.path[len('/jobs/'):])
+        if request.path == '/upload' and request.method == 'POST':
+            handler = self.upload
+        elif request.path == '/upload/raw' and request.method in ('POST', 'PUT'):
+            handler = self.upload_raw
+        elif request.path in ('/upload', '/upload/raw', '/', '/metrics') or request.path.startswith('/jobs/'):
+            return 405, {'error': 'Method not allowed'}, {}
+        else:
+            return 404, {'error': 'Not found'}, {}
+
+        if self.in_flight >= self.settings.ASGI_MAX_IN_FLIGHT:
+            return 503, {'error': 'Too many uploads in flight'}, {'retry-after': '1'}
+        self.in_flight += 1
+        try:
+            return await handler(request, receive)
+        finally:
+            self.in_flight -= 1
+
+    async def job_status(self, request, job_id):
+        """app.job_status; a ?wait= long poll sleeps on the event loop instead of holding a thread"""
+        try:
+            wait = min(float(request.query.get('wait', 0)), self.settings.JOB_MAX_WAIT)
+        except ValueError:
+            return 400, {'error': 'wait must be a number of seconds'}, {}
+
+        deadline = time.monotonic() + wait
+        while True:
+            job = await self.run_cpu(pipeline.get_job_queue().get, job_id)
+            if job is None:
+                return 404, {'error': 'Unknown job id'}, {}
+            if job['status'] == 'done' or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+        body = {'job_id': job_id, 'status': job['status']}
+        if job['status'] != 'done':
+            return 202, body, {}
+        body.update(result=job['result'], status_code=job['status_code'])
+        return 200, body, {}
+
+    async def read_body(self, request, receive):
+        try:
+            return await read_body_async(receive, request.content_length, self.settings.RAW_UPLOAD_MAX_BYTES), None
+        except BodyTooLarge:
+            return None, (413, {'error': f'Image larger than {self.settings.RAW_UPLOAD_MAX_BYTES} bytes'}, {})
+        except IncompleteBody:
+            return None, (400, {'error': 'Body shorter than Content-Length'}, {})
+
+    async def upload(self, request, receive):
+        from werkzeug.formparser import parse_form_data
+
+        body, error = await self.read_body(request, receive)
+        if error:
+            return error
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'CONTENT_TYPE': request.headers.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+        }
+        _, form, files = parse_form_data(environ)
+        request.form = form
+        if 'image' not in files:
+            return 400, {'error': 'No image uploaded'}, {}
+
+        from werkzeug.utils import secure_filename
+
+        file = files['image']
+        return await self.handle(
+            request,
+            data=file.stream.read(),
+            filename=secure_filename(file.filename) or 'upload.jpg',
+            backend_name=request.query.get('backend') or form.get('backend'),
+            device_id=form.get('device_id') or request.headers.get('x-device-id'),
+            captured_at=parse_timestamp(form.get('captured_at') or request.headers.get('x-capture-time')),
+        )
+
+    async def upload_raw(self, request, receive):
+        from werkzeug.utils import secure_filename
+
+        if not is_raw_image(request.headers.get('content-type')):
+            return 415, {'error': 'Send the image as the body with Content-Type: image/jpeg'}, {}
+        data, error = await self.read_body(request, receive)
+        if error:
+            return error
+        if not data:
+            return 400, {'error': 'No image uploaded'}, {}
+        return await self.handle(
+            request,
+            data=data,
+            filename=secure_filename(request.headers.get('x-filename', '')) or 'upload.jpg',
+            backend_name=request.query.get('backend'),
+            device_id=request.headers.get('x-device-id'),
+            captured_at=parse_timestamp(request.headers.get('x-capture-time')),
+        )
+
+    async def handle(self, request, data, filename, backend_name, device_id, captured_at):
+        """What app.respond_to_upload does, with the OCR call awaited"""
+        backend = pipeline.get_ocr_backend(backend_name)
+        if backend is None:
+            return 400, {'error': f'Unknown OCR backend: {backend_name}',
+                         'available': sorted(pipeline.get_ocr_backends())}, {}
+        consensus = request.flag('consensus', self.settings.CONSENSUS_MODE)
+
+        if request.flag('async', self.settings.ASYNC_UPLOADS):
+            job_id = await self.run_cpu(pipeline.get_job_queue().submit, {
+                'data': data,
+                'filename': filename,
+                'backend': backend.name,
+                'device_id': device_id,
+                'consensus': consensus,
+                'captured_at': captured_at,
+            })
+            return 202, {'job_id': job_id, 'status': 'queued'}, {'location': f'/jobs/{job_id}'}
+
+        body, status = await self.process_upload(data, filename, backend, device_id, consensus, captured_at)
+        return status, body, {}
+
+    async def process_upload(self, data, filename, backend, device_id=None, consensus=None, captured_at=None):
+        """app.process_upload with the pipeline phases on the pool and the OCR.space call awaited"""
+        timer = StageTimer()
+        started = time.perf_counter()
+        upload = pipeline.Upload(data, filename, backend, device_id, consensus, captured_at, timer)
+
+        result = await self.run_cpu(pipeline.prepare_upload, upload)
+        if result is None and upload.consensus:
+            result = await self.run_cpu(pipeline.read_consensus, upload)
+        elif result is None:
+            with timer.stage('ocr'):
+                ocr_text, words, error = await self.request_ocr(backend, upload.processed)
+            result = await self.run_cpu(pipeline.finish_upload, upload, ocr_text, words, error)
+
+        body, status = result
+        pipeline.observe_upload(body, status, backend, device_id, started, timer)
+        return body, status
+
+    async def request_ocr(self, backend, image):
+        if backend is pipeline.get_ocr_governor() and isinstance(image, (bytes, bytearray)):
+            return await backend.request_detailed_async(image, self.ocr_client)
+        if self.mosaic_executor is not None and backend is pipeline.get_ocr_backend('ocrspace'):
+            return await asyncio.get_running_loop().run_in_executor(self.mosaic_executor,
+                                                                    backend.request_detailed, image)
+        return await self.run_cpu(backend.request_detailed, image)
+
+    async def respond(self, send, status, body, headers):
+        if isinstance(body, str):
+            payload = body.encode()
+            headers = {'content-type': 'text/html; charset=utf-8', **headers}
+        else:
+            payload = (json.dumps(body) + '\n').encode()
+            headers = {'content-type': 'application/json', **headers}
+        headers['content-length'] = str(len(payload))
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]})
+        await send({'type': 'http.response.body', 'body': payload})
+
+
+def create_asgi_app(config=None):
+    """ASGI application factory; config defaults to the environment, as for create_app"""
+    return MeterApp(config)
+
+
+app = create_asgi_app()
@@ -0,0 +1,151 @@
+import io
+import json
+import logging
+import os
+import tarfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from event_log import log_event
+from metrics import STAGE_SECONDS
+from ocr_backends import error_status
+from preprocessing import config_signature, preprocess_bytes
+from result_cache import reading_key
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def _is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def archive_kind(name='', content_type=''):
+    """Returns 'zip', 'tar' or None from a filename or Content-Type"""
+    name = name.lower()
+    content_type = content_type.split(';')[0].strip()
+    if name.endswith('.zip') or content_type in ('application/zip', 'application/x-zip-compressed'):
+        return 'zip'
+    if name.endswith(('.tar', '.tar.gz', '.tgz')) or content_type in ('application/x-tar', 'application/gzip', 'application/x-gzip'):
+        return 'tar'
+    return None
+
+
+def iter_archive(stream, kind):
+    """Yields (filename, bytes) for every image inside a zip or tar stream.
+
+    Tar archives are read as a stream ('r|*'), so members are handed on as
+    soon as they arrive; zip needs random access and is buffered first.
+    """
+    if kind == 'zip':
+        with zipfile.ZipFile(io.BytesIO(stream.read())) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_image_name(info.filename):
+                    yield os.path.basename(info.filename), archive.read(info)
+        return
+
+    with tarfile.open(fileobj=stream, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and _is_image_name(member.name):
+                yield os.path.basename(member.name), archive.extractfile(member).read()
+
+
+def iter_batch_images(files, body=None, content_type=''):
+    """Yields (filename, bytes) from uploaded files and/or a raw archive body"""
+    for file in files:
+        name = file.filename or 'upload.jpg'
+        kind = archive_kind(name, file.mimetype or '')
+        if kind:
+            yield from iter_archive(file.stream, kind)
+        else:
+            yield name, file.stream.read()
+
+    kind = archive_kind(content_type=content_type)
+    if body is not None and kind:
+        yield from iter_archive(body, kind)
+
+
+def _timed_request(backend, processed):
+    with STAGE_SECONDS.time(stage='ocr'):
+        return backend.request(processed)
+
+
+def run_batch(images, backend, extract, process_pool, ocr_concurrency=4, max_images=500, cache=None, window=16):
+    """Preprocesses images across process_pool and OCRs them with bounded concurrency.
+
+    Yields one result dict per image in completion order, carrying the same
+    status code a single /upload would have returned. Images already in
+    cache are answered without being preprocessed. At most window images
+    are read ahead of their results, so results stream while the input is
+    still arriving and a large archive is never held in memory whole.
+    """
+    encode = not backend.accepts_arrays
+    ocr_pool = ThreadPoolExecutor(max_workers=ocr_concurrency)
+    images = enumerate(images)
+    pending = {}
+    reading_input = True
+
+    try:
+        while True:
+            while reading_input and len(pending) < window:
+                try:
+                    index, (filename, data) = next(images)
+                except StopIteration:
+                    reading_input = False
+                    break
+                if index >= max_images:
+                    yield {'index': index, 'filename': filename, 'status': 413,
+                           'error': f'Batch limit of {max_images} images reached'}
+                    reading_input = False
+                    break
+
+                key = reading_key(data, config_signature(), backend.name)
+                cached = cache.get(key) if cache else None
+                if cached:
+                    yield {'index': index, 'filename': filename, 'status': 200,
+                           'meter_reading': cached[0], 'cache_hit': True}
+                    continue
+
+                future = process_pool.submit(preprocess_bytes, data, encode, not backend.wants_display)
+                pending[future] = ('preprocess', index, filename, key)
+
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, index, filename, key = pending.pop(future)
+                result = {'index': index, 'filename': filename}
+
+                if stage == 'preprocess':
+                    try:
+                        processed = future.result()
+                    except Exception as e:
+                        processed = None
+                        log_event('batch_preprocess_failed', logging.ERROR, filename=filename, error=str(e))
+                    if processed is None:
+                        yield {**result, 'status': 500, 'error': 'Image preprocessing failed'}
+                        continue
+                    pending[ocr_pool.submit(_timed_request, backend, processed)] = ('ocr', index, filename, key)
+                    continue
+
+                ocr_text, error = future.result()
+                if error:
+                    yield {**result, 'status': error_status(error), 'error': error}
+                    continue
+
+                with STAGE_SECONDS.time(stage='extract'):
+                    reading = extract(ocr_text)
+                if reading:
+                    if cache:
+                        cache.set(key, reading)
+                    yield {**result, 'status': 200, 'meter_reading': reading, 'cache_hit': False}
+                else:
+                    yield {**result, 'status': 422, 'error': 'Could not extract meter reading'}
+    finally:
+        for future in pending:
+            future.cancel()
+        ocr_pool.shutdown(wait=False)
+
+
+def to_ndjson(results):
+    for result in results:
+        yield json.dumps(result) + '\n'
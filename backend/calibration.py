@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+
+import cv2
+
+from event_log import log_event
+from local_ocr import LocalDigitEngine
+from preprocessing import PREPROCESS_CONFIG
+
+# Counter windows are wide, short rectangles holding a run of digits
+MIN_ASPECT, MAX_ASPECT = 2.0, 12.0
+MIN_AREA, MAX_AREA = 0.002, 0.35  # fraction of the frame
+EXPECTED_DIGITS = 5
+# Frames are shrunk to this width before searching, which is plenty for a rectangle
+SEARCH_WIDTH = 640
+# Padding added around a detected window (fraction of its width / height) so drums are not clipped
+PAD_X, PAD_Y = 0.04, 0.15
+# A fitted row of evenly spaced digits is good evidence of the counter, but
+# a frame with a clean window outline scores higher
+ROW_CONFIDENCE = 0.7
+
+
+def _count_glyphs(gray_roi):
+    """Counts digit-like blobs in the taller of the two polarities of a candidate window"""
+    height = gray_roi.shape[0]
+    _, binary = cv2.threshold(gray_roi, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    best = 0
+    for ink in (binary, cv2.bitwise_not(binary)):
+        contours, _ = cv2.findContours(ink, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        glyphs = 0
+        for contour in contours:
+            _, _, w, h = cv2.boundingRect(contour)
+            if height * 0.35 <= h <= height * 0.95 and 0.1 <= w / h <= 1.0:
+                glyphs += 1
+        best = max(best, glyphs)
+    return best
+
+
+def find_counter_roi(img, digits=EXPECTED_DIGITS):
+    """Locates the counter window in a full frame.
+
+    Looks for a wide rectangle with digit-like blobs in it, and falls back
+    to the local digit engine's row fit when there is none. Returns
+    (crop, confidence) where crop is (start_y, end_y, start_x, end_x) as
+    fractions of the frame - the same shape as PREPROCESS_CONFIG['crop'] -
+    or (None, 0.0) when nothing counter-like is found.
+    """
+    height, width = img.shape[:2]
+    scale = min(1.0, SEARCH_WIDTH / width)
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else img
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    sh, sw = gray.shape[:2]
+
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 3)))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    best, best_score = None, 0.0
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        area = (w * h) / float(sw * sh)
+        if not MIN_AREA <= area <= MAX_AREA or not MIN_ASPECT <= w / h <= MAX_ASPECT:
+            continue
+
+        glyphs = _count_glyphs(gray[y:y + h, x:x + w])
+        if glyphs < 3:
+            continue
+
+        # Closest to the expected digit count wins; rectangularity breaks ties
+        fill = cv2.contourArea(contour) / float(w * h)
+        score = max(0.0, 1.0 - abs(glyphs - digits) / digits) * 0.8 + min(fill, 1.0) * 0.2
+        if score > best_score:
+            best, best_score = (x, y, w, h), score
+
+    if best is None:
+        # No clean window outline (glare, a dark bezel): fit the row of drums instead
+        row = LocalDigitEngine(digits).locate_row(img)
+        if row is None:
+            return None, 0.0
+        return _padded(*row), ROW_CONFIDENCE
+
+    x, y, w, h = best
+    return _padded(y / sh, (y + h) / sh, x / sw, (x + w) / sw), round(best_score, 3)
+
+
+def _padded(start_y, end_y, start_x, end_x):
+    """Pads a window so drums that sit slightly proud of it are not clipped"""
+    pad_x, pad_y = (end_x - start_x) * PAD_X, (end_y - start_y) * PAD_Y
+    crop = (max(0.0, start_y - pad_y), min(1.0, end_y + pad_y),
+            max(0.0, start_x - pad_x), min(1.0, end_x + pad_x))
+    return tuple(round(v, 4) for v in crop)
+
+
+class ROICalibrator:
+    """Per-device counter ROI, found automatically and persisted to a JSON file.
+
+    A device is calibrated on its first frame with a confident detection and
+    keeps that ROI until max_misses consecutive uploads fail to produce a
+    reading, at which point the next frame recalibrates it. After a
+    detection fails, only every retry_every-th frame of that device tries
+    again, so a camera that cannot see its counter does not pay for the
+    search on every upload.
+    """
+
+    def __init__(self, path=None, min_confidence=0.6, max_misses=3, retry_every=10):
+        self.path = path
+        self.min_confidence = min_confidence
+        self.max_misses = max_misses
+        self.retry_every = max(1, retry_every)
+        self.lock = threading.Lock()
+        self.devices = {}
+        # Frames seen per device since its last failed detection
+        self.waiting = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.devices = json.load(f)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.devices, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def stored_config(self, device_id):
+        """Preprocessing config using the device's saved ROI, or the default crop"""
+        with self.lock:
+            entry = self.devices.get(device_id)
+        if not entry:
+            return PREPROCESS_CONFIG
+        return dict(PREPROCESS_CONFIG, crop=tuple(entry['crop']))
+
+    def is_calibrated(self, device_id):
+        """True when the device has its own ROI rather than the default crop"""
+        with self.lock:
+            return device_id in self.devices
+
+    def needs_calibration(self, device_id):
+        with self.lock:
+            entry = self.devices.get(device_id)
+        return entry is None or entry['misses'] >= self.max_misses
+
+    def _detection_due(self, device_id):
+        with self.lock:
+            waited = self.waiting.get(device_id)
+            if waited is not None and waited + 1 < self.retry_every:
+                self.waiting[device_id] = waited + 1
+                return False
+            self.waiting.pop(device_id, None)
+            return True
+
+    def config_for(self, device_id, img):
+        """Returns the device's config, calibrating from img first when needed and due"""
+        if self.needs_calibration(device_id) and self._detection_due(device_id):
+            crop, confidence = find_counter_roi(img)
+            if crop and confidence >= self.min_confidence:
+                with self.lock:
+                    self.devices[device_id] = {
+                        'crop': list(crop),
+                        'confidence': confidence,
+                        'calibrated_at': time.time(),
+                        'misses': 0,
+                    }
+                    self._save()
+                log_event('roi_calibrated', device_id=device_id, crop=crop, confidence=confidence)
+            else:
+                with self.lock:
+                    self.waiting[device_id] = 0
+                log_event('roi_calibration_failed', device_id=device_id, confidence=confidence,
+                          retry_in=self.retry_every)
+        return self.stored_config(device_id)
+
+    def record(self, device_id, success):
+        """Tracks consecutive failed readings so a drifting ROI gets recalibrated"""
+        with self.lock:
+            entry = self.devices.get(device_id)
+            if entry is None:
+                return
+            misses = 0 if success else entry['misses'] + 1
+            if misses != entry['misses']:
+                entry['misses'] = misses
+                self._save()
@@ -0,0 +1,55 @@
+import threading
+
+from digit_cells import cell_distance, cell_signature, split_cells
+from extraction import READING_DIGITS
+
+
+def display_signature(display, digits=READING_DIGITS):
+    """One thresholded thumbnail per drum of a calibrated display.
+
+    A hash of the whole display is too coarse to see a reading change (an
+    8x8 dHash of 15709 and 15710 differs by 3 bits, no more than exposure
+    noise), so frames are compared drum by drum at digit resolution.
+    """
+    return [cell_signature(cell) for cell in split_cells(display, digits)]
+
+
+def signature_distance(a, b):
+    """Largest fraction of differing pixels over the drums: one turned drum is a change"""
+    return max(cell_distance(x, y) for x, y in zip(a, b))
+
+
+class ChangeDetector:
+    """Remembers the drum signatures and reading of each device's last accepted frame.
+
+    A new frame in which no drum differs from that frame by more than
+    threshold is treated as unchanged, so its reading can be reused without
+    another OCR call. The signatures assume the display is the calibrated
+    counter crop; an uncalibrated crop may not show the digits at all.
+    """
+
+    def __init__(self, threshold=0.015, digits=READING_DIGITS):
+        self.threshold = threshold
+        self.digits = digits
+        self.devices = {}
+        self.lock = threading.Lock()
+
+    def signature(self, display):
+        return display_signature(display, self.digits)
+
+    def match(self, device_id, signature):
+        """(previous reading, its confidence, distance) when unchanged, else (None, None, distance or None)"""
+        with self.lock:
+            previous = self.devices.get(device_id)
+        if previous is None:
+            return None, None, None
+
+        previous_signature, reading, confidence = previous
+        distance = round(signature_distance(previous_signature, signature), 4)
+        if distance <= self.threshold:
+            return reading, confidence, distance
+        return None, None, distance
+
+    def accept(self, device_id, signature, reading, confidence=None):
+        with self.lock:
+            self.devices[device_id] = (signature, reading, confidence)
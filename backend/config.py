@@ -0,0 +1,183 @@
+import os
+
+
+def _flag(name, default):
+    return os.getenv(name, default).lower() == 'true'
+
+
+class Config:
+    """Every backend setting, read from the environment (and .env) when constructed.
+
+    create_app(Config(READINGS_DB='', CONSENSUS_MODE=True)) overrides
+    single settings, e.g. in tests. Building a Config touches neither
+    OpenCV nor the network; the pipeline reads it when it first loads.
+    """
+
+    def __init__(self, **overrides):
+        self.UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+
+        self.OCR_API_KEY = os.getenv('OCR_API_KEY')  # ✅ pulled from .env
+        self.OCR_API_URL = os.getenv('OCR_API_URL', 'https://api.ocr.space/parse/image')
+
+        # Structured JSON logs; per-request events (raw OCR responses, stage timings) are sampled
+        self.LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+        self.LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.05'))
+
+        # What create_app does about loading OpenCV, the OCR clients and the stores:
+        # 'background' warms them up in a thread so the worker can accept requests at once,
+        # 'eager' finishes before create_app returns, 'off' leaves everything to the first request
+        self.WARM_UP = os.getenv('WARM_UP', 'background').lower()
+
+        # OCR payload shaping: digits are shrunk to this height and the smaller of PNG/JPEG is sent
+        self.OCR_TARGET_DIGIT_HEIGHT = int(os.getenv('OCR_TARGET_DIGIT_HEIGHT', '40'))
+        self.OCR_JPEG_QUALITY = int(os.getenv('OCR_JPEG_QUALITY', '85'))
+        # Also report bytes_saved against a full-size JPEG; off by default, it costs one more encode per upload
+        self.OCR_PAYLOAD_STATS = _flag('OCR_PAYLOAD_STATS', 'false')
+
+        # Smoothing step of the filter chain, one of filter_engine.SERVED_PROFILES (only bilateral so far)
+        self.PREPROCESS_PROFILE = os.getenv('PREPROCESS_PROFILE', 'bilateral')
+
+        # 'memory' decodes uploads straight from the request stream, 'disk' keeps the old save -> imread path
+        self.UPLOAD_MODE = os.getenv('UPLOAD_MODE', 'memory').lower()
+        # Optional copy of every raw upload to UPLOAD_FOLDER, written off the request thread
+        self.SAVE_UPLOADS = _flag('SAVE_UPLOADS', 'false')
+
+        # /upload/raw takes the JPEG itself as the body (plain or chunked) instead of multipart;
+        # bodies over RAW_UPLOAD_MAX_BYTES (UXGA frames are well under 1 MB) are refused with 413
+        self.RAW_UPLOAD_MAX_BYTES = int(os.getenv('RAW_UPLOAD_MAX_BYTES', str(4 * 1024 * 1024)))
+
+        # One pooled keep-alive session shared by every request
+        self.OCR_POOL_SIZE = int(os.getenv('OCR_POOL_SIZE', '10'))
+        self.OCR_CONNECT_TIMEOUT = float(os.getenv('OCR_CONNECT_TIMEOUT', '5'))
+        self.OCR_READ_TIMEOUT = float(os.getenv('OCR_READ_TIMEOUT', '30'))
+        self.OCR_MAX_RETRIES = int(os.getenv('OCR_MAX_RETRIES', '2'))
+        self.OCR_RETRY_BACKOFF = float(os.getenv('OCR_RETRY_BACKOFF', '0.5'))
+        self.OCR_OVERLAY = _flag('OCR_OVERLAY', 'true')  # word boxes help rank candidates
+
+        # OCR engines selectable per request with ?backend=<name>, defaulting to OCR_BACKEND
+        self.OCR_BACKEND = os.getenv('OCR_BACKEND', 'ocrspace')
+        self.GOOGLE_VISION_API_KEY = os.getenv('GOOGLE_VISION_API_KEY')
+
+        # OCR.space calls are counted per day in OCR_USAGE_DB against OCR_MONTHLY_QUOTA (free tier:
+        # 25,000/month) and limited to OCR_RATE_PER_MINUTE with bursts of OCR_RATE_BURST. A call waits
+        # up to OCR_QUEUE_WAIT seconds for the rate limit, then goes to OCR_FALLBACK_BACKEND, as do all
+        # calls once fewer than OCR_QUOTA_RESERVE remain or the API reports its limit ('' = no fallback).
+        # The fallback defaults to 'google' when GOOGLE_VISION_API_KEY is set; 'local' is not the default:
+        # it misreads a quarter of the sample photos (Tests/localOcr_Test.py). Default OCR_USAGE_DB:
+        # UPLOAD_FOLDER/ocr_usage.db
+        self.OCR_FALLBACK_BACKEND = os.getenv('OCR_FALLBACK_BACKEND')
+        self.OCR_USAGE_DB = os.getenv('OCR_USAGE_DB')
+        self.OCR_MONTHLY_QUOTA = int(os.getenv('OCR_MONTHLY_QUOTA', '25000'))
+        self.OCR_QUOTA_RESERVE = int(os.getenv('OCR_QUOTA_RESERVE', '500'))
+        self.OCR_RATE_PER_MINUTE = float(os.getenv('OCR_RATE_PER_MINUTE', '60'))
+        self.OCR_RATE_BURST = int(os.getenv('OCR_RATE_BURST', '10'))
+        self.OCR_QUEUE_WAIT = float(os.getenv('OCR_QUEUE_WAIT', '5'))
+        # OCR_QUOTA_STRIKES quota errors from the API in a row pause OCR.space for OCR_QUOTA_PAUSE
+        # seconds, doubling with each further one up to OCR_QUOTA_COOLDOWN; a lone one only sends that
+        # call to the fallback
+        self.OCR_QUOTA_STRIKES = int(os.getenv('OCR_QUOTA_STRIKES', '3'))
+        self.OCR_QUOTA_PAUSE = float(os.getenv('OCR_QUOTA_PAUSE', '1'))
+        self.OCR_QUOTA_COOLDOWN = float(os.getenv('OCR_QUOTA_COOLDOWN', '60'))
+
+        # Mosaic batching: OCR.space requests arriving within MOSAIC_WINDOW_MS of each other (up to
+        # MOSAIC_MAX_TILES) are stacked into one image and sent as one call; 0 sends each on its own
+        self.MOSAIC_WINDOW_MS = float(os.getenv('MOSAIC_WINDOW_MS', '0'))
+        self.MOSAIC_MAX_TILES = int(os.getenv('MOSAIC_MAX_TILES', '8'))
+
+        # /upload/batch: preprocessing runs in a process pool, OCR calls in a bounded thread pool
+        self.BATCH_PREPROCESS_WORKERS = int(os.getenv('BATCH_PREPROCESS_WORKERS', str(os.cpu_count() or 2)))
+        self.BATCH_OCR_CONCURRENCY = int(os.getenv('BATCH_OCR_CONCURRENCY', '4'))
+        self.BATCH_MAX_IMAGES = int(os.getenv('BATCH_MAX_IMAGES', '500'))
+        # Images read from the request ahead of their results; results stream out while the rest arrives
+        self.BATCH_WINDOW = int(os.getenv('BATCH_WINDOW', '16'))
+
+        # Readings keyed by hash(raw bytes + preprocessing config + backend); RESULT_CACHE_DB adds a SQLite tier
+        self.RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '1024'))
+        self.RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '86400'))
+        self.RESULT_CACHE_DB = os.getenv('RESULT_CACHE_DB')
+
+        # Frames of a calibrated device in which no drum differs by more than CHANGE_THRESHOLD of its
+        # thresholded pixels from the last accepted frame reuse that reading instead of calling OCR,
+        # with or without DIGIT_CELLS; -1 turns it off. Two different digits differ by at least 0.023,
+        # JPEG and exposure noise by 0.012
+        self.CHANGE_THRESHOLD = float(os.getenv('CHANGE_THRESHOLD', '0.015'))
+
+        # Async mode: /upload returns 202 + job id and JOB_WORKERS threads do the work.
+        # ASYNC_UPLOADS makes it the default; ?async=1/0 overrides per request.
+        self.ASYNC_UPLOADS = _flag('ASYNC_UPLOADS', 'false')
+        self.JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+        self.JOB_QUEUE_DB = os.getenv('JOB_QUEUE_DB')  # SQLite file for a durable queue
+        self.JOB_MAX_WAIT = float(os.getenv('JOB_MAX_WAIT', '30'))
+
+        # Consensus mode OCRs several preprocessing variants (variants.VARIANTS) and votes.
+        # VARIANT_CONCURRENCY run at once per upload; VARIANT_AGREE matching readings end it early.
+        self.CONSENSUS_MODE = _flag('CONSENSUS_MODE', 'false')
+        self.VARIANT_WORKERS = int(os.getenv('VARIANT_WORKERS', '8'))
+        self.VARIANT_CONCURRENCY = int(os.getenv('VARIANT_CONCURRENCY', '3'))
+        self.VARIANT_AGREE = int(os.getenv('VARIANT_AGREE', '2'))
+
+        # Accepted readings per meter (device id) for history and consumption queries;
+        # READINGS_DB='' turns the store off (default: UPLOAD_FOLDER/readings.db)
+        self.READINGS_DB = os.getenv('READINGS_DB')
+        self.READINGS_MAX_PAGE = int(os.getenv('READINGS_MAX_PAGE', '1000'))
+
+        # Readings must not go backwards or rise faster than MAX_CONSUMPTION_PER_HOUR units/hour
+        # since the meter's last stored reading; up to VALIDATION_MAX_RETRIES other variants are
+        # OCR'd when no candidate in the text fits
+        self.VALIDATE_READINGS = _flag('VALIDATE_READINGS', 'true')
+        self.MAX_CONSUMPTION_PER_HOUR = float(os.getenv('MAX_CONSUMPTION_PER_HOUR', '10'))
+        self.VALIDATION_MAX_RETRIES = int(os.getenv('VALIDATION_MAX_RETRIES', '2'))
+        # VALIDATION_RECOVER_AFTER rejected readings in a row that agree with each other outvote
+        # the stored readings they contradict (a misread that got in first); 0 turns this off.
+        # A rejection that continues such a run skips the variant retries.
+        self.VALIDATION_RECOVER_AFTER = int(os.getenv('VALIDATION_RECOVER_AFTER', '3'))
+
+        # asgi.py: OpenCV work runs on ASGI_CPU_WORKERS threads while OCR.space calls are awaited
+        # over up to ASGI_OCR_CONNECTIONS sockets; past ASGI_MAX_IN_FLIGHT open uploads new ones get 503
+        self.ASGI_CPU_WORKERS = int(os.getenv('ASGI_CPU_WORKERS', str(os.cpu_count() or 2)))
+        self.ASGI_OCR_CONNECTIONS = int(os.getenv('ASGI_OCR_CONNECTIONS', '100'))
+        self.ASGI_MAX_IN_FLIGHT = int(os.getenv('ASGI_MAX_IN_FLIGHT', '500'))
+
+        # Per-device counter ROI found from the first good frame and kept in CALIBRATION_FILE;
+        # recalibrates after CALIBRATION_MAX_MISSES uploads in a row without a reading; after a failed
+        # detection only every CALIBRATION_RETRY_EVERY-th frame of the device searches again
+        # (default file: UPLOAD_FOLDER/calibration.json)
+        self.AUTO_CALIBRATE = _flag('AUTO_CALIBRATE', 'true')
+        self.CALIBRATION_FILE = os.getenv('CALIBRATION_FILE')
+        self.CALIBRATION_MIN_CONFIDENCE = float(os.getenv('CALIBRATION_MIN_CONFIDENCE', '0.6'))
+        self.CALIBRATION_MAX_MISSES = int(os.getenv('CALIBRATION_MAX_MISSES', '3'))
+        self.CALIBRATION_RETRY_EVERY = int(os.getenv('CALIBRATION_RETRY_EVERY', '10'))
+
+        # Calibrated counters are split into one cell per drum; of a frame that CHANGE_THRESHOLD does not
+        # find unchanged, only cells where more than DIGIT_CELL_THRESHOLD of the thresholded pixels
+        # changed since the meter's last reading are OCR'd, the rest reuse its digits
+        self.DIGIT_CELLS = _flag('DIGIT_CELLS', 'true')
+        self.DIGIT_CELL_THRESHOLD = float(os.getenv('DIGIT_CELL_THRESHOLD', '0.01'))
+
+        # Frames that are too dark, overexposed, glared over the counter or out of focus are refused
+        # with a recapture reason before any filtering or OCR; FRAME_QUALITY_FILE holds per-device
+        # overrides of these defaults (PUT /meters/<id>/frame-quality; default: UPLOAD_FOLDER/frame_quality.json)
+        self.FRAME_QUALITY_GATE = _flag('FRAME_QUALITY_GATE', 'true')
+        self.FRAME_QUALITY_FILE = os.getenv('FRAME_QUALITY_FILE')
+        self.FRAME_MIN_SHARPNESS = float(os.getenv('FRAME_MIN_SHARPNESS', '15'))
+        self.FRAME_MIN_BRIGHTNESS = float(os.getenv('FRAME_MIN_BRIGHTNESS', '35'))
+        self.FRAME_MAX_BRIGHTNESS = float(os.getenv('FRAME_MAX_BRIGHTNESS', '225'))
+        self.FRAME_MAX_CLIPPED = float(os.getenv('FRAME_MAX_CLIPPED', '0.4'))
+        self.FRAME_MAX_GLARE = float(os.getenv('FRAME_MAX_GLARE', '0.15'))
+
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise ValueError(f'Unknown setting: {name}')
+            setattr(self, name, value)
+
+        # Defaults that follow other settings, filled in after the overrides so they follow those too
+        if self.OCR_FALLBACK_BACKEND is None:
+            self.OCR_FALLBACK_BACKEND = 'google' if self.GOOGLE_VISION_API_KEY else ''
+        for name, filename in (('OCR_USAGE_DB', 'ocr_usage.db'), ('READINGS_DB', 'readings.db'),
+                               ('CALIBRATION_FILE', 'calibration.json'),
+                               ('FRAME_QUALITY_FILE', 'frame_quality.json')):
+            if getattr(self, name) is None:
+                setattr(self, name, os.path.join(self.UPLOAD_FOLDER, filename))
+
+        if self.WARM_UP not in ('background', 'eager', 'off'):
+            raise ValueError('WARM_UP must be one of background, eager, off')
@@ -0,0 +1,208 @@
+import threading
+
+import cv2
+import numpy as np
+
+from calibration import PAD_X, PAD_Y
+from extraction import NON_DIGIT, READING_DIGITS
+
+# A row of a cell is ink when this fraction of its (trimmed) width is ink
+INK_ROW = 0.08
+# Columns trimmed off each side of a cell before looking at rows: drum edges and separators
+SIDE_TRIM = 0.15
+# A drum is mid-roll when its cell shows two ink bands, one cut off by each window edge,
+# separated by a blank gap of at least this fraction of the window height
+ROLL_GAP = 0.08
+ROLL_EDGE = 0.12
+# Cells are compared as Otsu-binarised thumbnails of this size (w, h); the display dHash is too
+# coarse for a single digit (a 9 and a 0 differ by two bits)
+SIGNATURE_SIZE = (24, 40)
+# Blank columns between cells in the strip sent for recognition, as a fraction of a cell width
+STRIP_GAP = 0.5
+
+
+def split_cells(display, digits=READING_DIGITS):
+    """Cuts a calibrated counter display into one cell per drum, left to right.
+
+    The calibrated crop is the counter window plus PAD_X of its width on
+    each side, so the window itself is split into equal slices.
+    """
+    width = display.shape[1]
+    margin = width * PAD_X / (1 + 2 * PAD_X)
+    pitch = (width - 2 * margin) / digits
+    return [display[:, int(margin + i * pitch):int(margin + (i + 1) * pitch)] for i in range(digits)]
+
+
+def cell_signature(cell):
+    if cell.ndim == 3:
+        cell = cv2.cvtColor(cell, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(cell, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary > 0
+
+
+def cell_distance(a, b):
+    """Fraction of signature pixels that differ; invariant to exposure since both are thresholded"""
+    return float(np.count_nonzero(a != b)) / a.size
+
+
+def is_rolling(cell):
+    """True when the drum is caught between two digits: the bottom of one and the top of the next"""
+    if cell.ndim == 3:
+        cell = cv2.cvtColor(cell, cv2.COLOR_BGR2GRAY)
+    height, width = cell.shape[:2]
+    # The window sits inside the PAD_Y padding above and below it
+    top = int(height * PAD_Y / (1 + 2 * PAD_Y))
+    window = cell[top:height - top, int(width * SIDE_TRIM):width - int(width * SIDE_TRIM)]
+    if window.size == 0:
+        return False
+
+    _, binary = cv2.threshold(window, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    ink = binary > 0
+    if ink.mean() > 0.5:
+        ink = ~ink
+    rows = ink.mean(axis=1) > INK_ROW
+
+    bands, start = [], None
+    for y, inked in enumerate(rows):
+        if inked and start is None:
+            start = y
+        elif not inked and start is not None:
+            bands.append((start, y))
+            start = None
+    if start is not None:
+        bands.append((start, len(rows)))
+
+    window_height = len(rows)
+    if len(bands) != 2:
+        return False
+    (_, first_end), (second_start, second_end) = bands
+    return (bands[0][0] <= window_height * ROLL_EDGE
+            and second_end >= window_height * (1 - ROLL_EDGE)
+            and second_start - first_end >= window_height * ROLL_GAP)
+
+
+def round_drum(previous, right, last):
+    """Digit for a drum caught mid-roll between previous and previous + 1.
+
+    A drum only turns while the drum to its right goes 9 -> 0, so it has
+    finished the step once that neighbour shows 0-4 and not before. The
+    rightmost drum has no neighbour and is read down, as meter readers do.
+    """
+    lower = int(previous)
+    if last or right is None or int(right) >= 5:
+        return str(lower)
+    return str((lower + 1) % 10)
+
+
+class CellFrame:
+    """One frame's counter split into digit cells and compared with the meter's previous frame.
+
+    changed lists the cells that need recognising: those that look
+    different from the cached frame, except drums caught mid-roll, which
+    are resolved from the cached digit and their neighbour instead.
+    """
+
+    def __init__(self, display, previous, threshold, digits=READING_DIGITS, previous_confidence=None):
+        self.digits = digits
+        self.cells = split_cells(display, digits)
+        self.signatures = [cell_signature(cell) for cell in self.cells]
+        self.rolling = [is_rolling(cell) for cell in self.cells]
+        self.previous = previous
+        self.previous_confidence = previous_confidence
+
+        if previous is None:
+            self.distances = None
+            self.changed = list(range(digits))
+            self.moved = list(range(digits))
+        else:
+            self.distances = [cell_distance(signature, old)
+                              for signature, (old, _) in zip(self.signatures, previous)]
+            self.moved = [i for i, distance in enumerate(self.distances) if distance > threshold]
+            self.changed = [i for i in self.moved if not self.rolling[i]]
+
+    def recognise_all(self):
+        """Sends every cell (the whole display) for recognition, e.g. when reusing unchanged frames is off"""
+        self.changed = list(range(self.digits))
+
+    @property
+    def distance(self):
+        """Largest fraction of differing pixels over the drums, None without a previous frame"""
+        return round(max(self.distances), 4) if self.distances else None
+
+    @property
+    def previous_reading(self):
+        return ''.join(digit for _, digit in self.previous) if self.previous else None
+
+    @property
+    def partial(self):
+        """True when the cached digits can stand in for some cells, so only changed ones need OCR"""
+        return self.previous is not None and len(self.changed) < self.digits
+
+    def strip(self, processed):
+        """The changed cells of the filtered display side by side, for one recognition call"""
+        cells = [cell for i, cell in enumerate(split_cells(processed, self.digits)) if i in self.changed]
+        height = min(cell.shape[0] for cell in cells)
+        gap = np.full((height, max(1, int(cells[0].shape[1] * STRIP_GAP))) + cells[0].shape[2:], 255,
+                      dtype=cells[0].dtype)
+        parts = [gap]
+        for cell in cells:
+            parts += [cell[:height], gap]
+        return np.hstack(parts)
+
+    def merge(self, ocr_text):
+        """Reading from the recognised changed cells plus cached digits, or None if the text does not fit"""
+        read = NON_DIGIT.sub('', ocr_text or '')
+        if len(read) != len(self.changed):
+            return None
+        digits = [digit for _, digit in self.previous]
+        for index, digit in zip(self.changed, read):
+            digits[index] = digit
+        return self.round(''.join(digits))
+
+    def round(self, reading):
+        """Replaces the digits of drums caught mid-roll with the cached digit, rounded by the neighbour.
+
+        Applies to moved cells only and needs the previous frame's digits;
+        otherwise the reading is returned as recognised.
+        """
+        if self.previous is None or not reading or len(reading) != self.digits:
+            return reading
+        digits = list(reading)
+        # Right to left, so each drum sees its neighbour already resolved
+        for index in reversed(range(self.digits)):
+            if self.rolling[index] and index in self.moved:
+                right = digits[index + 1] if index + 1 < self.digits else None
+                digits[index] = round_drum(self.previous[index][1], right, last=index == self.digits - 1)
+        return ''.join(digits)
+
+
+class DigitCellCache:
+    """Per-device cell signatures, digits and confidence of the last accepted reading.
+
+    Cells that did not move keep the signature they were cached with, so slow
+    drift (light, focus) cannot creep past the threshold one frame at a time.
+    """
+
+    def __init__(self, threshold=0.01, digits=READING_DIGITS):
+        self.threshold = threshold
+        self.digits = digits
+        self.devices = {}
+        self.lock = threading.Lock()
+
+    def frame(self, device_id, display):
+        with self.lock:
+            previous, confidence = self.devices.get(device_id, (None, None))
+        return CellFrame(display, previous, self.threshold, self.digits, confidence)
+
+    def accept(self, device_id, frame, reading, confidence=None):
+        if not reading or len(reading) != self.digits:
+            return
+        moved = set(frame.moved)
+        cells = []
+        for index, (signature, digit) in enumerate(zip(frame.signatures, reading)):
+            if frame.previous is not None and index not in moved:
+                signature = frame.previous[index][0]
+            cells.append((signature, digit))
+        with self.lock:
+            self.devices[device_id] = (cells, confidence)
@@ -0,0 +1,54 @@
+import json
+import logging
+import random
+import sys
+import time
+
+logger = logging.getLogger('ceb')
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, event name and the event's fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=str)
+
+
+_handler = logging.StreamHandler(sys.stderr)
+_handler.setFormatter(JSONFormatter())
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+_sample_rate = 1.0
+
+
+def configure_logging(level='INFO', sample_rate=1.0):
+    """Sets the log level and the fraction of sampled (per-request) events kept"""
+    global _sample_rate
+    logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    _sample_rate = max(0.0, min(1.0, float(sample_rate)))
+
+
+def log_event(event, level=logging.INFO, sampled=False, **fields):
+    """Logs a structured event.
+
+    sampled events are the per-request ones (raw OCR responses, stage
+    timings) and are only kept for a configured fraction of calls, so they
+    stay useful under load without flooding the log; errors should not be
+    sampled.
+    """
+    if sampled and random.random() >= _sample_rate:
+        return
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': fields})
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
@@ -0,0 +1,170 @@
+import re
+
+READING_DIGITS = 5
+
+# OCR artifacts that show up between drum digits
+ARTIFACTS = re.compile(r"[•*?']")
+# One line-local run of digit groups separated by spaces/tabs, with an optional trailing '.'
+DIGIT_RUN = re.compile(r'\d+(?:[ \t]+\d+)*(\.)?')
+DIGIT_GROUP = re.compile(r'\d+')
+NON_DIGIT = re.compile(r'\D')
+
+# Prior confidence of each strategy before overlay geometry is considered
+STRATEGY_CONFIDENCE = {
+    'decimal': 0.9,   # 15709. - the decimal drum reads as a trailing dot
+    'word': 0.85,     # a standalone 5-digit token
+    'spaced': 0.75,   # 1 5 7 0 9 on one line
+    'window': 0.4,    # 5 digits cut out of a longer run
+    'fallback': 0.2,  # digits gathered across the whole text
+}
+# Extra confidence for candidates printed in the tallest, most central word boxes
+SIZE_BONUS, CENTRE_BONUS = 0.1, 0.05
+# Extra confidence when more than one strategy finds the same reading
+AGREEMENT_BONUS = 0.05
+
+
+def _is_word_edge(text, index):
+    return index < 0 or index >= len(text) or not text[index].isalnum()
+
+
+def _scan(text):
+    """Single pass over the text: returns [(reading, strategy, position)]"""
+    found, all_digits = [], []
+    for match in DIGIT_RUN.finditer(text):
+        run = match.group(0).rstrip('.')
+        groups = [(m.group(0), match.start() + m.start()) for m in DIGIT_GROUP.finditer(run)]
+        digits = ''.join(g for g, _ in groups)
+        all_digits.append(digits)
+        last = len(groups) - 1
+
+        for index, (group, position) in enumerate(groups):
+            if len(group) == READING_DIGITS and _is_word_edge(text, position - 1) \
+                    and _is_word_edge(text, position + len(group)):
+                strategy = 'decimal' if index == last and match.group(1) else 'word'
+                found.append((group, strategy, position))
+
+            # Neighbouring groups that add up to exactly five digits: "1 5 7 0 9", "157 09"
+            spaced = group
+            for following, _ in groups[index + 1:]:
+                spaced += following
+                if len(spaced) >= READING_DIGITS:
+                    break
+            if len(spaced) == READING_DIGITS and spaced != group:
+                found.append((spaced, 'spaced', position))
+
+        for i in range(len(digits) - READING_DIGITS + 1):
+            found.append((digits[i:i + READING_DIGITS], 'window', match.start()))
+
+    joined = ''.join(all_digits)
+    for i in range(len(joined) - READING_DIGITS + 1):
+        found.append((joined[i:i + READING_DIGITS], 'fallback', len(text) + i))
+    return found
+
+
+def _overlay_scores(words):
+    """Maps each digit string printed in the overlay to a (size, centrality) score in [0, 1]"""
+    if not words:
+        return {}
+    lefts = [w['left'] for w in words]
+    rights = [w['left'] + w['width'] for w in words]
+    tops = [w['top'] for w in words]
+    bottoms = [w['top'] + w['height'] for w in words]
+    cx, cy = (min(lefts) + max(rights)) / 2, (min(tops) + max(bottoms)) / 2
+    half_diag = max(1.0, ((max(rights) - min(lefts)) ** 2 + (max(bottoms) - min(tops)) ** 2) ** 0.5 / 2)
+    tallest = max(w['height'] for w in words) or 1
+
+    scores = {}
+    lines = {}
+    for word in words:
+        lines.setdefault(word.get('line', 0), []).append(word)
+    for line in lines.values():
+        line.sort(key=lambda w: w['left'])
+        # Consecutive words on a line can spell one reading: "1 5 7 0 9" or "157 09"
+        for start in range(len(line)):
+            digits = ''
+            for end in range(start, len(line)):
+                digits += NON_DIGIT.sub('', line[end]['text'])
+                if len(digits) > READING_DIGITS:
+                    break
+                if len(digits) == READING_DIGITS:
+                    span = line[start:end + 1]
+                    height = max(w['height'] for w in span) / tallest
+                    x = (span[0]['left'] + span[-1]['left'] + span[-1]['width']) / 2
+                    y = sum(w['top'] + w['height'] / 2 for w in span) / len(span)
+                    centrality = 1 - min(1.0, ((x - cx) ** 2 + (y - cy) ** 2) ** 0.5 / half_diag)
+                    best = scores.get(digits, (0.0, 0.0))
+                    scores[digits] = max(best, (height, centrality))
+    return scores
+
+
+def extract_candidates(ocr_text, words=None):
+    """Ranks every 5-digit reading the OCR text could contain.
+
+    words is the optional OCR.space overlay (see parse_overlay); readings
+    printed in the tallest, most central boxes get a confidence boost.
+    Returns [{'reading', 'confidence', 'strategy'}] best first.
+    """
+    if not ocr_text:
+        return []
+    text = ARTIFACTS.sub('', ocr_text)
+    overlay = _overlay_scores(words)
+
+    best = {}
+    for reading, strategy, position in _scan(text):
+        confidence = STRATEGY_CONFIDENCE[strategy]
+        if reading in overlay:
+            size, centrality = overlay[reading]
+            confidence += SIZE_BONUS * size + CENTRE_BONUS * centrality
+
+        current = best.get(reading)
+        if current is None:
+            best[reading] = {'reading': reading, 'confidence': confidence, 'strategy': strategy,
+                             'position': position, 'strategies': {strategy}}
+            continue
+        current['strategies'].add(strategy)
+        if confidence > current['confidence']:
+            current.update(confidence=confidence, strategy=strategy)
+        current['position'] = min(current['position'], position)
+
+    candidates = []
+    for candidate in best.values():
+        agreement = AGREEMENT_BONUS * (len(candidate['strategies'] - {'fallback'}) - 1)
+        candidates.append({
+            'reading': candidate['reading'],
+            'confidence': round(min(1.0, candidate['confidence'] + max(0.0, agreement)), 3),
+            'strategy': candidate['strategy'],
+            '_position': candidate['position'],
+        })
+    candidates.sort(key=lambda c: (-c['confidence'], c['_position']))
+    for candidate in candidates:
+        del candidate['_position']
+    return candidates
+
+
+def extract_reading(ocr_text, words=None):
+    """Extracts the most likely 5-digit reading from OCR text, or None"""
+    candidates = extract_candidates(ocr_text, words)
+    return candidates[0]['reading'] if candidates else None
+
+
+def parse_overlay(parsed_result):
+    """Flattens an OCR.space ParsedResults entry's TextOverlay into word boxes.
+
+    None when the entry has no TextOverlay at all; [] when it has one
+    without words (nothing was read).
+    """
+    overlay = (parsed_result or {}).get('TextOverlay')
+    if overlay is None:
+        return None
+    words = []
+    for index, line in enumerate(overlay.get('Lines') or []):
+        for word in line.get('Words') or []:
+            words.append({
+                'text': word.get('WordText', ''),
+                'left': float(word.get('Left', 0)),
+                'top': float(word.get('Top', 0)),
+                'width': float(word.get('Width', 0)),
+                'height': float(word.get('Height', 0)),
+                'line': index,
+            })
+    return words
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Frames are judged at this width: the measures are then comparable across camera resolutions
+# and cost a few ms whatever was uploaded
+QUALITY_WIDTH = 320
+# Pixels at or above this are clipped highlights
+SATURATED = 250
+
+# Defaults for every threshold a device can override (0, or 255 / 1.0 for the max_* ones, turns a check off)
+DEFAULT_THRESHOLDS = {
+    'min_sharpness': 15.0,    # variance of the Laplacian over the counter region
+    'min_brightness': 35.0,   # mean gray level of the frame
+    'max_brightness': 225.0,
+    'max_clipped': 0.4,       # fraction of the frame that is clipped white
+    'max_glare': 0.15,        # largest clipped blob in the counter region, as a fraction of it
+}
+
+# What the device should change before the next capture, per recapture reason
+RECAPTURE_HINTS = {
+    'too_dark': 'raise exposure or turn the flash on',
+    'overexposed': 'lower exposure',
+    'glare': 'turn the flash off or change the camera angle',
+    'blurry': 'hold the camera still and refocus',
+}
+
+
+def measure(img, crop=None):
+    """Focus, exposure and glare measures of a decoded frame, on a QUALITY_WIDTH copy.
+
+    crop is the counter region as (start_y, end_y, start_x, end_x)
+    fractions, as in PREPROCESS_CONFIG; sharpness and glare are taken
+    there, exposure over the whole frame.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    height, width = gray.shape[:2]
+    if width > QUALITY_WIDTH:
+        scale = QUALITY_WIDTH / width
+        gray = cv2.resize(gray, (QUALITY_WIDTH, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+    region = gray
+    if crop:
+        h, w = gray.shape[:2]
+        start_y, end_y, start_x, end_x = crop
+        region = gray[int(h * start_y):int(h * end_y), int(w * start_x):int(w * end_x)]
+        if region.size == 0:
+            region = gray
+
+    clipped = gray >= SATURATED
+    glare = 0.0
+    region_clipped = (region >= SATURATED).astype(np.uint8)
+    if region_clipped.any():
+        _, _, stats, _ = cv2.connectedComponentsWithStats(region_clipped, connectivity=8)
+        glare = float(stats[1:, cv2.CC_STAT_AREA].max()) / region.size
+
+    return {
+        'sharpness': round(float(cv2.Laplacian(region, cv2.CV_64F).var()), 1),
+        'brightness': round(float(gray.mean()), 1),
+        'clipped': round(float(np.count_nonzero(clipped)) / clipped.size, 4),
+        'glare': round(glare, 4),
+    }
+
+
+def recapture_reason(measures, thresholds):
+    """The first failed check, or None. Exposure comes first: a dark frame also measures as blurry."""
+    def beyond(limit, value, low):
+        return limit is not None and (value < limit if low else value > limit)
+
+    if beyond(thresholds.get('min_brightness'), measures['brightness'], True):
+        return 'too_dark'
+    if (beyond(thresholds.get('max_brightness'), measures['brightness'], False)
+            or beyond(thresholds.get('max_clipped'), measures['clipped'], False)):
+        return 'overexposed'
+    if beyond(thresholds.get('max_glare'), measures['glare'], False):
+        return 'glare'
+    if beyond(thresholds.get('min_sharpness'), measures['sharpness'], True):
+        return 'blurry'
+    return None
+
+
+class FrameQualityGate:
+    """Rejects frames no OCR can read, before any filtering or OCR is spent on them.
+
+    Thresholds start from `defaults` and can be overridden per device; the
+    overrides are kept in `path` (JSON, device id -> {threshold: value}),
+    so a camera with a soft lens or a dim cabinet can be loosened alone.
+    """
+
+    def __init__(self, defaults=None, path=None):
+        self.defaults = dict(DEFAULT_THRESHOLDS, **(defaults or {}))
+        self.path = path
+        self.lock = threading.Lock()
+        self.devices = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.devices = json.load(f)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.devices, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def thresholds_for(self, device_id):
+        with self.lock:
+            overrides = self.devices.get(device_id) or {}
+        return dict(self.defaults, **overrides)
+
+    def set_thresholds(self, device_id, overrides):
+        """Merges overrides into the device's thresholds (a None value restores the default).
+
+        Raises ValueError for unknown names or values that are not numbers.
+        """
+        for name, value in overrides.items():
+            if name not in DEFAULT_THRESHOLDS:
+                raise ValueError(f'Unknown threshold: {name}')
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise ValueError(f'{name} must be a number or null')
+        with self.lock:
+            entry = self.devices.setdefault(device_id, {})
+            for name, value in overrides.items():
+                if value is None:
+                    entry.pop(name, None)
+                else:
+                    entry[name] = float(value)
+            if not entry:
+                del self.devices[device_id]
+            self._save()
+        return self.thresholds_for(device_id)
+
+    def check(self, img, device_id=None, crop=None):
+        """Returns (reason, measures); reason is None when the frame is good enough to read"""
+        measures = measure(img, crop)
+        return recapture_reason(measures, self.thresholds_for(device_id)), measures
@@ -0,0 +1,233 @@
+"""Backfill readings from the ESP32-CAM GitHub image archive.
+
+The firmware PUTs every frame to the GitHub contents API as base64 JSON,
+so a clone of the archive repo holds one file per frame under images/,
+named after the device's local capture time:
+
+    images/photo_20250614_083000.jpg   (photo_YYYYMMDD_HHMMSS.jpg)
+    images/2025-06-14_08-30.jpg        (YYYY-MM-DD_HH-MM.jpg, current firmware)
+
+Files are processed oldest first through the same pipeline as /upload,
+with bounded concurrency. Progress is checkpointed after every file with
+a final outcome, so an interrupted backfill resumes where it stopped,
+frames that hit a quota or server error are tried again, and later runs
+only pick up frames added since:
+
+    python ingest.py /path/to/archive-clone --meter home --pull
+"""
+import argparse
+import base64
+import binascii
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+from event_log import log_event
+
+FILENAME_PATTERNS = (
+    (re.compile(r'^photo_(\d{8}_\d{6})\.jpe?g$', re.IGNORECASE), '%Y%m%d_%H%M%S'),
+    (re.compile(r'^(\d{4}-\d{2}-\d{2}_\d{2}-\d{2})\.jpe?g$', re.IGNORECASE), '%Y-%m-%d_%H-%M'),
+)
+JPEG_MAGIC = b'\xff\xd8'
+# The firmware's GMT_OFFSET_SEC: filenames are device local time (Sri Lanka, UTC+5:30)
+DEFAULT_TZ_OFFSET = 19800
+
+
+def capture_time(filename, tz_offset=DEFAULT_TZ_OFFSET):
+    """Epoch seconds encoded in an archive filename, or None for names like photo_unknown.jpg"""
+    for pattern, fmt in FILENAME_PATTERNS:
+        match = pattern.match(filename)
+        if match:
+            local = datetime.strptime(match.group(1), fmt)
+            return local.replace(tzinfo=timezone(timedelta(seconds=tz_offset))).timestamp()
+    return None
+
+
+def decode_archive_file(raw):
+    """JPEG bytes from an archive file: raw JPEG, base64 JSON {"content": ...} or bare base64"""
+    if raw[:2] == JPEG_MAGIC:
+        return raw
+    text = raw.strip()
+    if text[:1] == b'{':
+        try:
+            text = json.loads(text).get('content', '').encode('ascii')
+        except (ValueError, AttributeError, UnicodeEncodeError):
+            return None
+    try:
+        data = base64.b64decode(text)
+    except (binascii.Error, ValueError):
+        return None
+    return data if data[:2] == JPEG_MAGIC else None
+
+
+def is_final(status):
+    """A reading, or a 4xx retrying cannot change; 429 (quota) and 5xx are worth another run"""
+    return status < 500 and status != 429
+
+
+def pull(repo):
+    """Fast-forwards the clone; returns False (and keeps going offline) if that fails"""
+    result = subprocess.run(['git', '-C', repo, 'pull', '--ff-only', '--quiet'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        log_event('ingest_pull_failed', logging.WARNING, repo=repo, error=result.stderr.strip())
+    return result.returncode == 0
+
+
+def list_frames(folder, tz_offset=DEFAULT_TZ_OFFSET):
+    """[(captured_at, filename)] for every timestamped frame, oldest first"""
+    frames = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            captured_at = capture_time(entry.name, tz_offset)
+            if captured_at is None:
+                log_event('ingest_skipped', sampled=True, filename=entry.name, reason='no timestamp')
+                continue
+            frames.append((captured_at, entry.name))
+    frames.sort()
+    return frames
+
+
+class Checkpoint:
+    """Ingest progress in a JSON file.
+
+    watermark is the (captured_at, filename) up to which every frame is
+    done; frames finished out of order beyond it are kept in ahead, so a
+    resumed run neither skips nor repeats a frame.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.watermark = None
+        self.ahead = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.watermark = tuple(state['watermark']) if state.get('watermark') else None
+            self.ahead = {tuple(frame) for frame in state.get('ahead', [])}
+
+    def is_done(self, frame):
+        return (self.watermark is not None and frame <= self.watermark) or frame in self.ahead
+
+    def complete(self, frame, floor):
+        """Marks frame done; floor is the oldest frame not done yet, None once all are"""
+        self.ahead.add(frame)
+        covered = {f for f in self.ahead if floor is None or f < floor}
+        if covered:
+            self.watermark = max(covered | ({self.watermark} if self.watermark else set()))
+            self.ahead -= covered
+        self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'watermark': self.watermark, 'ahead': sorted(self.ahead)}, f)
+        # Atomic, so an interruption mid-write leaves the previous checkpoint
+        os.replace(tmp, self.path)
+
+
+def ingest(repo, process, checkpoint_path, folder='images', concurrency=4, tz_offset=DEFAULT_TZ_OFFSET,
+           limit=None):
+    """Runs every new frame of the archive through process(data, filename, captured_at).
+
+    process returns (body, status) like app.process_upload. Yields one
+    result dict per frame as it completes. Frames without a final outcome
+    (see is_final) are left out of the checkpoint for the next run.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    frames = [f for f in list_frames(os.path.join(repo, folder), tz_offset) if not checkpoint.is_done(f)]
+    # With a limit, the first frame left for the next run caps the watermark
+    boundary = frames[limit] if limit and len(frames) > limit else None
+    if limit:
+        frames = frames[:limit]
+    pending = list(frames)
+
+    def run(frame):
+        captured_at, filename = frame
+        with open(os.path.join(repo, folder, filename), 'rb') as f:
+            data = decode_archive_file(f.read())
+        if data is None:
+            return {'error': 'Not a JPEG or base64 JPEG'}, 415
+        return process(data, filename, captured_at)
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    running = {}
+    queue = iter(frames)
+    try:
+        while True:
+            # Only `concurrency` frames are read into memory at a time
+            for frame in queue:
+                running[pool.submit(run, frame)] = frame
+                if len(running) >= concurrency:
+                    break
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                frame = running.pop(future)
+                try:
+                    body, status = future.result()
+                except Exception as e:
+                    body, status = {'error': str(e)}, 500
+                if is_final(status):
+                    pending.remove(frame)
+                    checkpoint.complete(frame, pending[0] if pending else boundary)
+                yield {'filename': frame[1], 'captured_at': frame[0], 'status': status, **body}
+    finally:
+        for future in running:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('repo', help='local clone of the ESP32 image archive')
+    parser.add_argument('--meter', help='meter/device id the readings belong to (default: clone directory name)')
+    parser.add_argument('--folder', default='images', help='image folder inside the clone')
+    parser.add_argument('--checkpoint', help='progress file (default: uploads/ingest_<meter>.json)')
+    parser.add_argument('--pull', action='store_true', help='git pull --ff-only before ingesting')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('INGEST_CONCURRENCY', 4)))
+    parser.add_argument('--backend', help='OCR backend (default: OCR_BACKEND)')
+    parser.add_argument('--tz-offset', type=int, default=int(os.getenv('INGEST_TZ_OFFSET', DEFAULT_TZ_OFFSET)),
+                        help='seconds east of UTC the filenames are written in')
+    parser.add_argument('--limit', type=int, help='process at most this many new frames')
+    args = parser.parse_args(argv)
+
+    # The pipeline, its stores and the OCR backends are configured by app.py
+    import app
+
+    settings = app.configure()
+    meter = args.meter or os.path.basename(os.path.abspath(args.repo))
+    checkpoint = args.checkpoint or os.path.join(settings.UPLOAD_FOLDER, f'ingest_{meter}.json')
+    backend = app.get_ocr_backend(args.backend)
+    if backend is None:
+        parser.error(f'Unknown OCR backend: {args.backend}')
+    if args.pull:
+        pull(args.repo)
+
+    def process(data, filename, captured_at):
+        return app.process_upload(data, filename, backend, meter, captured_at=captured_at)
+
+    # process_upload counts every frame in the upload metrics; one NDJSON line per frame here
+    statuses = {}
+    for result in ingest(args.repo, process, checkpoint, args.folder, args.concurrency, args.tz_offset,
+                         args.limit):
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        print(json.dumps(result), flush=True)
+    log_event('ingest_done', repo=args.repo, meter=meter, frames=sum(statuses.values()),
+              statuses={str(k): v for k, v in statuses.items()})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import atexit
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from event_log import log_event
+
+QUEUED, RUNNING, DONE = 'queued', 'running', 'done'
+
+
+class JobQueue:
+    """In-process job queue drained by a pool of worker threads.
+
+    handler(payload) does the actual work and returns (body, status_code).
+    Payloads are dicts whose 'data' entry holds the raw image bytes. With a
+    db_path every job is also written to SQLite, and jobs that were queued
+    or running when the process stopped are picked up again on start.
+    The workers are stopped at interpreter exit (see close).
+    """
+
+    def __init__(self, handler, workers=4, db_path=None, result_ttl=3600):
+        self.handler = handler
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self.cond = threading.Condition()
+        self.queue = queue.Queue()
+        self.db = None
+        self.db_lock = threading.Lock()
+
+        if db_path:
+            self._open_db(db_path)
+
+        self.stopping = threading.Event()
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def _open_db(self, db_path):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS upload_jobs ('
+            'id TEXT PRIMARY KEY, state TEXT NOT NULL, meta TEXT NOT NULL, data BLOB, '
+            'result TEXT, status_code INTEGER, created REAL NOT NULL, finished REAL)'
+        )
+        self.db.commit()
+
+        rows = self.db.execute(
+            'SELECT id, meta, data, created FROM upload_jobs WHERE state != ? ORDER BY created', (DONE,)
+        ).fetchall()
+        for job_id, meta, data, created in rows:
+            payload = dict(json.loads(meta), data=data)
+            self.jobs[job_id] = {'status': QUEUED, 'created': created}
+            self.queue.put((job_id, payload))
+        if rows:
+            log_event('jobs_requeued', count=len(rows))
+
+    def _db_execute(self, sql, params):
+        if self.db is None:
+            return None
+        with self.db_lock:
+            rows = self.db.execute(sql, params).fetchall()
+            self.db.commit()
+            return rows
+
+    def submit(self, payload):
+        """Queues a payload and returns its job id"""
+        job_id = uuid.uuid4().hex
+        created = time.time()
+        meta = {k: v for k, v in payload.items() if k != 'data'}
+
+        with self.cond:
+            self._prune(created)
+            self.jobs[job_id] = {'status': QUEUED, 'created': created}
+        self._db_execute(
+            'INSERT INTO upload_jobs (id, state, meta, data, created) VALUES (?, ?, ?, ?, ?)',
+            (job_id, QUEUED, json.dumps(meta), payload.get('data'), created),
+        )
+        self.queue.put((job_id, payload))
+        return job_id
+
+    def get(self, job_id, wait=0):
+        """Returns the job's state dict, blocking up to wait seconds for it to finish"""
+        with self.cond:
+            if wait > 0:
+                self.cond.wait_for(lambda: self.jobs.get(job_id, {}).get('status', DONE) == DONE, timeout=wait)
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+
+        rows = self._db_execute(
+            'SELECT state, result, status_code, created, finished FROM upload_jobs WHERE id = ?', (job_id,)
+        )
+        if not rows:
+            return None
+        state, result, status_code, created, finished = rows[0]
+        job = {'status': state, 'created': created}
+        if state == DONE:
+            job.update(result=json.loads(result), status_code=status_code, finished=finished)
+        return job
+
+    def _set(self, job_id, **fields):
+        with self.cond:
+            self.jobs.setdefault(job_id, {}).update(fields)
+            self.cond.notify_all()
+
+    def close(self, timeout=30.0):
+        """Stops the workers once their current job is done; jobs still queued stay in SQLite.
+
+        A daemon worker still inside OpenCV when the interpreter shuts down
+        aborts the process ('terminate called without an active exception').
+        """
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        for _ in self.threads:
+            self.queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None or self.stopping.is_set():
+                return
+            job_id, payload = item
+            self._set(job_id, status=RUNNING)
+            self._db_execute('UPDATE upload_jobs SET state = ? WHERE id = ?', (RUNNING, job_id))
+
+            try:
+                body, status_code = self.handler(payload)
+            except Exception as e:
+                log_event('job_failed', logging.ERROR, job_id=job_id, error=str(e))
+                body, status_code = {'error': str(e)}, 500
+
+            finished = time.time()
+            self._set(job_id, status=DONE, result=body, status_code=status_code, finished=finished)
+            # The image is no longer needed once the job has a result
+            self._db_execute(
+                'UPDATE upload_jobs SET state = ?, result = ?, status_code = ?, finished = ?, data = NULL '
+                'WHERE id = ?',
+                (DONE, json.dumps(body), status_code, finished, job_id),
+            )
+            self.queue.task_done()
+
+    def _prune(self, now):
+        """Drops finished jobs from memory once they are older than result_ttl"""
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.get('status') == DONE and now - job.get('finished', now) > self.result_ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
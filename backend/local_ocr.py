@@ -0,0 +1,365 @@
+import logging
+
+import cv2
+import numpy as np
+
+from event_log import log_event
+from ocr_backends import NO_DIGITS_ERROR, OCRBackend, read_image_bytes
+
+# Frames (or crops) are read at this width, so every size below is in comparable pixels
+READ_WIDTH = 800
+
+# Adaptive threshold windows (fractions of READ_WIDTH) and offsets used to find glyph blobs;
+# several are tried because drum faces range from a few to a few dozen pixels wide
+BLOCK_FRACTIONS = (0.04, 0.08, 0.16)
+THRESHOLD_OFFSETS = (-8, -20)
+
+# Drums are spaced this many digit heights apart; printed text runs tighter
+MIN_PITCH, MAX_PITCH = 1.2, 2.6
+# Least gray-level step between a digit's strokes and its drum, so paper texture is not read
+MIN_CONTRAST = 25
+
+# Glyphs narrower than this (w/h) are a '1' whatever their shape
+ONE_ASPECT = 0.38
+
+# Glyphs are resampled to this grid before their ink profile is measured
+PROFILE_W, PROFILE_H = 24, 40
+
+
+def _crop_to_ink(glyph):
+    points = cv2.findNonZero(glyph)
+    if points is None:
+        return None
+    x, y, w, h = cv2.boundingRect(points)
+    return glyph[y:y + h, x:x + w]
+
+
+def _holes(glyph):
+    """(centre_y, height) of each enclosed hole, as fractions of the glyph height, top to bottom"""
+    height, width = glyph.shape
+    contours, hierarchy = cv2.findContours(glyph.copy(), cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return []
+    holes = []
+    for contour, (_, _, _, parent) in zip(contours, hierarchy[0]):
+        if parent >= 0 and cv2.contourArea(contour) >= 0.015 * height * width:
+            _, y, _, h = cv2.boundingRect(contour)
+            holes.append(((y + h / 2) / height, h / height))
+    return sorted(holes)
+
+
+def _band(grid, top, bottom):
+    """Mean left edge, right edge and ink fill of the rows between two height fractions"""
+    rows = grid[int(top * PROFILE_H):max(int(top * PROFILE_H) + 1, int(bottom * PROFILE_H))]
+    lefts, rights, fills = [], [], []
+    for row in rows:
+        ink = np.flatnonzero(row)
+        if len(ink):
+            lefts.append(ink[0] / PROFILE_W)
+            rights.append((ink[-1] + 1) / PROFILE_W)
+            fills.append(len(ink) / PROFILE_W)
+        else:
+            lefts.append(1.0)
+            rights.append(0.0)
+            fills.append(0.0)
+    return float(np.mean(lefts)), float(np.mean(rights)), float(np.mean(fills))
+
+
+def _side_ink(grid, top, bottom):
+    """Ink density in the left and right thirds of the rows between two height fractions"""
+    rows = grid[int(top * PROFILE_H):int(bottom * PROFILE_H)]
+    side = int(PROFILE_W * 0.35)
+    return float(rows[:, :side].mean()), float(rows[:, -side:].mean())
+
+
+def classify_glyph(glyph):
+    """Names the digit in a binary glyph (white ink), or returns None when there is no ink.
+
+    Drum faces differ between meter makes (open or closed 4, flat or
+    round-topped 3, tails on 6 and 9), so rather than correlating against
+    one font the digit is told apart by its topology - how many holes and
+    where - and by where its ink sits in a few horizontal bands.
+    """
+    glyph = _crop_to_ink(glyph)
+    if glyph is None:
+        return None
+    height, width = glyph.shape
+    if width / height < ONE_ASPECT:
+        return '1'
+
+    grid = (cv2.resize(glyph, (PROFILE_W, PROFILE_H), interpolation=cv2.INTER_AREA) > 127).astype(np.uint8)
+    holes = _holes(glyph)
+
+    # A 4's crossbar fills the lower third, and its stem leaves the bottom-left empty
+    _, _, lower_fill = _band(grid, 0.6, 0.82)
+    bottom_left, _, bottom_fill = _band(grid, 0.88, 1.0)
+    if lower_fill >= 0.7 and bottom_left >= 0.45:
+        return '4'
+
+    # A serifed '1' is too wide for ONE_ASPECT but keeps an unbroken stem off the right edge
+    cover = grid[int(0.1 * PROFILE_H):int(0.9 * PROFILE_H)].mean(axis=0)
+    if (not holes and cover[PROFILE_W // 4:-(PROFILE_W // 4)].max() >= 0.85
+            and cover[-(PROFILE_W // 5):].max() < 0.6
+            and _band(grid, 0.3, 0.7)[2] < 0.4 and _band(grid, 0.0, 0.15)[2] < 0.6):
+        return '1'
+
+    upper_left, upper_right = _side_ink(grid, 0.25, 0.45)
+    lower_left, lower_right = _side_ink(grid, 0.55, 0.75)
+    if len(holes) >= 2 and holes[-1][0] - holes[0][0] > 0.25:
+        return '8'
+    if holes and upper_left < 0.25:
+        return '4'  # a closed 4: the only loop with nothing up its left side
+    if holes:
+        centre, hole_height = max(holes, key=lambda hole: hole[1])
+        if hole_height > 0.5:
+            return '0'
+        # One loop: an 8 whose other loop closed up still has ink on both sides of it
+        if centre < 0.5:
+            return '8' if lower_left > 0.5 else '9'
+        return '8' if upper_right > 0.5 else '6'
+
+    if lower_right < 0.5:
+        return '2' if bottom_fill >= 0.55 else '7'
+    # Below the top bar a 5 has its left stroke, a 3 (round or flat-topped) its right one
+    return '5' if _side_ink(grid, 0.15, 0.35)[1] < 0.45 else '3'
+
+
+class LocalDigitEngine(OCRBackend):
+    """Offline digit reader for the 5-drum counter.
+
+    Finds the row of `digits` evenly spaced, equally tall glyphs in the
+    frame (or a crop of it), cuts each drum cell out, and names every glyph
+    with classify_glyph, so a reading needs no network round trip or API
+    quota. Light digits on dark drums are looked for first, then dark on
+    light.
+    """
+    name = 'local'
+    accepts_arrays = True
+    wants_display = True
+
+    def __init__(self, digits=5):
+        self.digits = digits
+
+    def request(self, image):
+        try:
+            gray = self._to_gray(image)
+            if gray is None:
+                return None, "Could not decode image"
+
+            digits = self.read_digits(gray)
+            if digits is None:
+                return None, NO_DIGITS_ERROR
+            return digits, None
+
+        except Exception as e:
+            log_event('ocr_request_failed', logging.ERROR, backend=self.name, error=str(e))
+            return None, str(e)
+
+    @staticmethod
+    def _to_gray(image):
+        if isinstance(image, np.ndarray):
+            img = image
+        else:
+            buf = np.frombuffer(read_image_bytes(image), dtype=np.uint8)
+            img = cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
+            if img is None:
+                return None
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return img
+
+    @staticmethod
+    def _to_read_width(gray):
+        scale = READ_WIDTH / gray.shape[1]
+        return cv2.resize(gray, (READ_WIDTH, max(1, int(gray.shape[0] * scale))),
+                          interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+    def locate_row(self, image):
+        """Box around the row of drum cells as (start_y, end_y, start_x, end_x) fractions, or None.
+
+        The same row fit read_digits uses, for finding a counter whose
+        window has no clean outline.
+        """
+        gray = self._to_gray(image)
+        if gray is None:
+            return None
+        gray = self._to_read_width(gray)
+        height, width = gray.shape
+        for ink in (gray, cv2.bitwise_not(gray)):
+            row = self._find_row(ink)
+            if row is None:
+                continue
+            pitch, origin, centres, digit_height = row
+            centre_y = float(np.median(centres))
+            return (max(0.0, (centre_y - 0.65 * digit_height) / height),
+                    min(1.0, (centre_y + 0.65 * digit_height) / height),
+                    max(0.0, (origin - pitch / 2) / width),
+                    min(1.0, (origin + (self.digits - 0.5) * pitch) / width))
+        return None
+
+    def read_digits(self, gray):
+        """Returns the digit string read from a grayscale image, or None when no counter row is found"""
+        gray = self._to_read_width(gray)
+
+        for ink in (gray, cv2.bitwise_not(gray)):
+            row = self._find_row(ink)
+            if row is None:
+                continue
+            pitch, origin, centres, height = row
+            digits = []
+            for position in range(self.digits):
+                centre_x = origin + position * pitch
+                if not 0 <= centre_x < ink.shape[1]:
+                    break
+                cell = self._cell(ink, centre_x, centres[position], pitch, height)
+                glyph = self._glyph(cell, height)
+                if not self._is_digit(cell, glyph, height):
+                    break
+                digits.append(classify_glyph(glyph))
+            if len(digits) == self.digits:
+                return ''.join(digits)
+        return None
+
+    @staticmethod
+    def _is_digit(cell, glyph, height):
+        """A drum digit fills most of the row height and stands out from its drum"""
+        points = cv2.findNonZero(glyph)
+        if points is None:
+            return False
+        _, _, _, glyph_height = cv2.boundingRect(points)
+        contrast = float(np.mean(cell[glyph > 0])) - float(np.median(cell[glyph == 0]))
+        return glyph_height >= 0.75 * height and contrast >= MIN_CONTRAST
+
+    @staticmethod
+    def _candidates(gray):
+        """Bounding boxes of bright, digit-shaped blobs, near-duplicates merged"""
+        width = gray.shape[1]
+        boxes = []
+        for fraction in BLOCK_FRACTIONS:
+            block = max(3, int(width * fraction) | 1)
+            for offset in THRESHOLD_OFFSETS:
+                binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY,
+                                               block, offset)
+                count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+                for x, y, w, h, area in stats[1:count]:
+                    if not width * 0.025 <= h <= width * 0.6 or not 0.12 <= w / h <= 0.95:
+                        continue
+                    if not 0.12 <= area / (w * h) <= 0.8:
+                        continue
+                    box = (int(x), int(y), int(w), int(h))
+                    if not any(abs(box[0] + box[2] / 2 - b[0] - b[2] / 2) <= 0.1 * h
+                               and abs(box[1] + box[3] / 2 - b[1] - b[3] / 2) <= 0.1 * h
+                               and abs(box[3] - b[3]) <= 0.1 * h for b in boxes):
+                        boxes.append(box)
+        return boxes
+
+    def _find_row(self, gray):
+        """Fits `digits` evenly spaced cells to the candidate blobs.
+
+        Returns (pitch, origin, centre_ys, height) - origin is the centre x
+        of the first cell - or None when fewer than all but one of the cells
+        line up with a blob.
+        """
+        boxes = self._candidates(gray)
+        groups = set()
+        for _, y, _, h in boxes:
+            centre = y + h / 2
+            groups.add(tuple(sorted(b for b in boxes if abs(b[3] - h) <= 0.2 * h
+                                    and abs(b[1] + b[3] / 2 - centre) <= 0.25 * h)))
+
+        best = None
+        for group in groups:
+            if len(group) < self.digits - 1:
+                continue
+            height = float(np.median([b[3] for b in group]))
+            centres = [b[0] + b[2] / 2 for b in group]
+            for i, first in enumerate(centres):
+                for second in centres[i + 1:]:
+                    for steps in range(1, self.digits):
+                        pitch = (second - first) / steps
+                        if not MIN_PITCH * height <= pitch <= MAX_PITCH * height:
+                            continue
+                        for start in range(self.digits - steps):
+                            origin = first - start * pitch
+                            cells, error = [], 0.0
+                            for position in range(self.digits):
+                                x = origin + position * pitch
+                                nearest = min(group, key=lambda b: abs(b[0] + b[2] / 2 - x))
+                                offset = abs(nearest[0] + nearest[2] / 2 - x)
+                                if offset <= 0.2 * pitch:
+                                    cells.append(nearest)
+                                    error += offset / pitch
+                                else:
+                                    cells.append(None)
+                            matched = sum(cell is not None for cell in cells)
+                            if matched >= self.digits - 1 and (best is None or (matched, -error) > best[0]):
+                                best = ((matched, -error), pitch, origin, cells, height)
+        if best is None:
+            return None
+
+        _, pitch, origin, cells, height = best
+        row_centre = float(np.median([c[1] + c[3] / 2 for c in cells if c is not None]))
+        shift = self._decimal_shift(gray, pitch, origin, row_centre, height)
+        origin -= shift * pitch
+        cells = [None] * shift + cells[:self.digits - shift]
+        centres = [c[1] + c[3] / 2 if c is not None else row_centre for c in cells]
+        return pitch, origin, centres, height
+
+    def _decimal_shift(self, gray, pitch, origin, row_centre, height):
+        """How many cells the row must move left because it ran into the decimal drum.
+
+        The tenths drum sits in its own light frame, so the gap before it
+        is much brighter than the gap before the previous drum. When the
+        integer drum further left was too faint to be found, the fitted row
+        slides right onto the decimal; this spots that and undoes it.
+        """
+        gaps = []
+        for position in range(1, self.digits):
+            x = origin + (position - 0.5) * pitch
+            strip = gray[max(0, int(row_centre - 0.4 * height)):int(row_centre + 0.4 * height),
+                         max(0, int(x - 0.06 * pitch)):int(x + 0.06 * pitch) + 1]
+            gaps.append(float(np.median(strip)) if strip.size else 0.0)
+        for position in range(2, self.digits):
+            if gaps[position - 1] > 1.35 * max(gaps[position - 2], 1.0):
+                return self.digits - position
+        return 0
+
+    @staticmethod
+    def _cell(gray, centre_x, centre_y, pitch, height):
+        x0, x1 = int(max(0, centre_x - pitch * 0.45)), int(min(gray.shape[1], centre_x + pitch * 0.45))
+        y0, y1 = int(max(0, centre_y - height * 0.65)), int(min(gray.shape[0], centre_y + height * 0.65))
+        return gray[y0:y1, x0:x1]
+
+    @staticmethod
+    def _glyph(cell, height):
+        """The digit's ink in a drum cell: the bright strokes, less the drum edges and neighbours' slivers"""
+        size = max(3, int(height * 0.45)) | 1
+        strokes = cv2.morphologyEx(cell, cv2.MORPH_TOPHAT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size)))
+        _, binary = cv2.threshold(strokes, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        cell_h, cell_w = binary.shape
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        candidates = []
+        for i in range(1, count):
+            x, y, w, h, _ = stats[i]
+            centre_x = centroids[i][0]
+            if w < cell_w * 0.18 and not cell_w * 0.2 <= centre_x <= cell_w * 0.8:
+                continue  # a drum edge
+            if x + w < cell_w * 0.15 or x > cell_w * 0.85 or h < cell_h * 0.3:
+                continue
+            candidates.append(i)
+
+        glyph = np.zeros_like(binary)
+        if not candidates:
+            return glyph
+        main = max(candidates, key=lambda i: stats[i][4])
+        mx, my, mw, mh, main_area = stats[main]
+        margin = 0.1 * mh
+        for i in range(1, count):
+            x, y, w, h, area = stats[i]
+            # Keep the broken-off pieces of the digit: blobs that lie inside its box
+            inside_x = max(0, min(x + w, mx + mw + margin) - max(x, mx - margin))
+            inside_y = max(0, min(y + h, my + mh + margin) - max(y, my - margin))
+            if i == main or (inside_x * inside_y >= 0.7 * w * h and area >= 0.02 * main_area):
+                glyph[labels == i] = 255
+        return glyph
@@ -0,0 +1,169 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a cached decode (~1 ms) up to a slow OCR.space round trip
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield self.name, _label_text(self.labels, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition shape"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                yield self.name + '_bucket', _label_text(self.labels, key, [('le', repr(bound))]), count
+            yield self.name + '_bucket', _label_text(self.labels, key, [('le', '+Inf')]), series[-1]
+            yield self.name + '_sum', _label_text(self.labels, key), series[-2]
+            yield self.name + '_count', _label_text(self.labels, key), series[-1]
+
+
+class Registry:
+    """In-process metric registry rendered in the Prometheus text format.
+
+    Metrics live in this process only: behind a multi-worker server each
+    worker exposes its own counts and the scraper sums them.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'ceb_stage_seconds', 'Time spent in each reading pipeline stage', ('stage',))
+UPLOAD_SECONDS = REGISTRY.histogram(
+    'ceb_upload_seconds', 'End-to-end time to answer one upload', ('outcome',))
+UPLOADS = REGISTRY.counter(
+    'ceb_uploads_total', 'Uploads by outcome: success, cache_hit, unchanged, unreadable, recapture, '
+                         'ocr_error, preprocess_error, quota, rejected', ('outcome',))
+FRAME_REJECTS = REGISTRY.counter(
+    'ceb_frame_rejects_total', 'Frames refused by the quality gate, by recapture reason', ('reason',))
+OCR_CALLS = REGISTRY.counter(
+    'ceb_ocr_calls_total', 'Metered OCR calls by the backend that served them and why '
+                           '(primary, fallback_*, refused_*, coalesced)', ('backend', 'route'))
+MOSAIC_TILES = REGISTRY.histogram(
+    'ceb_mosaic_tiles', 'Uploads tiled into each OCR request by the mosaic batcher', ('backend',),
+    buckets=(1, 2, 4, 8, 16, 32))
+
+
+class StageTimer:
+    """Times the stages of one upload into STAGE_SECONDS and keeps them for logging"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.observe(elapsed, stage=name)
+            # A stage can run more than once per upload (validation retries)
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed * 1000, 3)
+
+
+def upload_outcome(body, status):
+    """Outcome label for an upload result dict as returned by process_upload"""
+    if status == 200:
+        if body.get('cache_hit'):
+            return 'cache_hit'
+        return 'unchanged' if body.get('ocr_skipped') else 'success'
+    if status == 422:
+        return 'recapture' if body.get('recapture') else 'unreadable'
+    if status == 429:
+        return 'quota'
+    if body.get('error') == 'Image preprocessing failed':
+        return 'preprocess_error'
+    return 'ocr_error' if status >= 500 else 'rejected'
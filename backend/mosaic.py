@@ -0,0 +1,140 @@
+import threading
+
+import cv2
+import numpy as np
+
+from metrics import MOSAIC_TILES
+from ocr_backends import OCRBackend
+from preprocessing import encode_for_ocr
+
+# Blank rows between tiles, as a fraction of the tallest tile; keeps OCR from joining two tiles' lines
+TILE_GAP = 0.6
+
+
+class _Batch:
+    def __init__(self):
+        self.tiles = []
+        self.results = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+def build_mosaic(tiles):
+    """Stacks grayscale tiles in one column on a white page.
+
+    Returns (mosaic, spans) where spans[i] is tile i's (top, bottom) row
+    range; tiles are left-aligned so their x coordinates carry over as is.
+    """
+    width = max(tile.shape[1] for tile in tiles)
+    gap = max(4, int(max(tile.shape[0] for tile in tiles) * TILE_GAP))
+    height = gap + sum(tile.shape[0] + gap for tile in tiles)
+    mosaic = np.full((height, width), 255, np.uint8)
+
+    spans, top = [], gap
+    for tile in tiles:
+        mosaic[top:top + tile.shape[0], :tile.shape[1]] = tile
+        spans.append((top, top + tile.shape[0]))
+        top += tile.shape[0] + gap
+    return mosaic, spans
+
+
+def split_words(words, spans):
+    """Assigns each OCR word box to the tile its centre falls in (or the nearest).
+
+    Returns per tile (text, words) with boxes moved into tile coordinates;
+    text is rebuilt line by line from the words, like ParsedText.
+    """
+    per_tile = [[] for _ in spans]
+    for word in words:
+        centre = word['top'] + word['height'] / 2
+        index = min(range(len(spans)),
+                    key=lambda i: 0 if spans[i][0] <= centre < spans[i][1]
+                    else min(abs(centre - spans[i][0]), abs(centre - spans[i][1])))
+        per_tile[index].append(dict(word, top=word['top'] - spans[index][0]))
+
+    results = []
+    for tile_words in per_tile:
+        lines = {}
+        for word in tile_words:
+            lines.setdefault(word.get('line', 0), []).append(word)
+        text = '\n'.join(' '.join(w['text'] for w in sorted(line, key=lambda w: w['left']))
+                         for _, line in sorted(lines.items()))
+        results.append((text + '\n' if text else '', tile_words))
+    return results
+
+
+class MosaicBatcher(OCRBackend):
+    """Tiles the requests that arrive within `window` seconds into one OCR call.
+
+    The first request of a batch waits up to window (less if max_tiles
+    arrive first), stacks every batched image into a mosaic, sends it to
+    backend once and hands each caller the words that landed on its tile.
+    Callers block just as with a direct request, so concurrent uploads,
+    job workers and /upload/batch all share calls without knowing it.
+
+    The mapping needs word boxes: if backend returns no overlay at all
+    (overlay off, or a fallback engine answered) each tile is sent on its
+    own instead. An overlay without words means no tile had any text.
+    """
+    accepts_arrays = False
+
+    def __init__(self, backend, window=0.05, max_tiles=8):
+        self.backend = backend
+        self.name = backend.name
+        self.window = window
+        self.max_tiles = max_tiles
+        self.lock = threading.Lock()
+        self.open = None
+
+    def request(self, image):
+        text, _, error = self.request_detailed(image)
+        return text, error
+
+    def request_detailed(self, image):
+        with self.lock:
+            batch = self.open
+            leader = batch is None
+            if leader:
+                batch = self.open = _Batch()
+            index = len(batch.tiles)
+            batch.tiles.append(image)
+            if len(batch.tiles) >= self.max_tiles:
+                self.open = None
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+            return batch.results[index]
+
+        batch.full.wait(self.window)
+        with self.lock:
+            if self.open is batch:
+                self.open = None
+        try:
+            batch.results = self._send(batch.tiles)
+        except Exception as e:
+            batch.results = [(None, None, str(e))] * len(batch.tiles)
+        finally:
+            batch.done.set()
+        return batch.results[index]
+
+    def _send(self, images):
+        MOSAIC_TILES.observe(len(images), backend=self.name)
+        if len(images) == 1:
+            return [self.backend.request_detailed(images[0])]
+
+        tiles = [cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE) for image in images]
+        if any(tile is None for tile in tiles):
+            return [self.backend.request_detailed(image) for image in images]
+
+        mosaic, spans = build_mosaic(tiles)
+        data, _ = encode_for_ocr(mosaic)
+        text, words, error = self.backend.request_detailed(data)
+        if error:
+            return [(None, None, error)] * len(images)
+        if words is None:
+            return [self.backend.request_detailed(image) for image in images]
+        return [(text, tile_words, None) for text, tile_words in split_words(words, spans)]
+
+    def close(self):
+        self.backend.close()
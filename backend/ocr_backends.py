@@ -0,0 +1,96 @@
+import base64
+import logging
+
+from event_log import log_event
+
+# Returned as the error when a metered backend is out of quota or rate-limited
+QUOTA_ERROR = 'OCR quota exceeded'
+# Returned as the error when an engine found no digits: the image is at fault, not the engine
+NO_DIGITS_ERROR = 'No digits found'
+
+
+def error_status(error):
+    """HTTP status for an OCR error: 429 out of quota, 422 nothing readable in the image, 500 otherwise"""
+    if error == QUOTA_ERROR:
+        return 429
+    if error == NO_DIGITS_ERROR:
+        return 422
+    return 500
+
+
+class OCRBackend:
+    """Interface every OCR engine implements.
+
+    request(image) takes a file path, encoded image bytes or - when
+    accepts_arrays is True - a decoded NumPy image, and returns
+    (text, error) so callers can hand the text to extract_reading.
+    request_detailed(image) also returns word boxes in the shape of
+    extraction.parse_overlay when the engine has them. An engine with
+    wants_display set does its own thresholding and is given the unfiltered
+    display crop rather than the filtered one.
+    """
+    name = 'base'
+    accepts_arrays = False
+    wants_display = False
+
+    def request(self, image):
+        raise NotImplementedError
+
+    def request_detailed(self, image):
+        """Returns (text, words, error); words are word boxes when the engine reports them"""
+        text, error = self.request(image)
+        return text, None, error
+
+    def close(self):
+        pass
+
+
+def read_image_bytes(image):
+    """Returns the encoded bytes for a path or bytes input"""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    with open(image, 'rb') as f:
+        return f.read()
+
+
+class GoogleVisionClient(OCRBackend):
+    """Google Cloud Vision TEXT_DETECTION, as sketched in Tests/cOCR.py"""
+    name = 'google'
+
+    def __init__(self, api_key, connect_timeout=5.0, read_timeout=30.0):
+        import requests  # only paid for when the backend is configured
+
+        self.api_key = api_key
+        self.url = 'https://vision.googleapis.com/v1/images:annotate'
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+
+    def request(self, image):
+        try:
+            content = base64.b64encode(read_image_bytes(image)).decode('utf-8')
+            payload = {
+                "requests": [{
+                    "image": {"content": content},
+                    "features": [{"type": "TEXT_DETECTION"}]
+                }]
+            }
+
+            response = self.session.post(self.url, params={'key': self.api_key},
+                                         json=payload, timeout=self.timeout)
+            if response.status_code != 200:
+                return None, f"API Error: {response.status_code}"
+
+            result = response.json()
+            responses = result.get('responses') or []
+            if not responses:
+                return None, "Invalid API response"
+            if 'textAnnotations' not in responses[0]:
+                return None, "No text detected"
+            return responses[0]['textAnnotations'][0]['description'], None
+
+        except Exception as e:
+            log_event('ocr_request_failed', logging.ERROR, backend=self.name, error=str(e))
+            return None, str(e)
+
+    def close(self):
+        self.session.close()
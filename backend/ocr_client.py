@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import TimeoutError as Urllib3Timeout
+from urllib3.util.retry import Retry
+
+from event_log import elapsed_ms, log_event
+from extraction import parse_overlay
+from ocr_backends import QUOTA_ERROR, OCRBackend
+
+OCR_API_URL = 'https://api.ocr.space/parse/image'
+
+# Transient gateway errors worth retrying; quota/auth errors are not
+RETRY_STATUSES = (500, 502, 503, 504)
+# What OCR.space answers once the rate or monthly limit is used up, e.g. "You may only
+# perform this action upto maximum 180 number of times within 3600 seconds"
+QUOTA_STATUSES = (403, 429)
+QUOTA_MESSAGES = ('number of times within', 'quota')
+# Raw responses are logged (sampled) truncated to this many characters
+LOG_RESPONSE_CHARS = 500
+
+
+def form_fields(api_key, overlay):
+    data = {
+        'apikey': api_key,
+        'language': 'eng',
+        'scale': 'true',
+        'OCREngine': '2'
+    }
+    if overlay:
+        data['isOverlayRequired'] = 'true'
+    return data
+
+
+def file_part(image):
+    """The multipart file field for encoded PNG or JPEG bytes"""
+    if image[:4] == b'\x89PNG':
+        return {'file': ('processed.png', bytes(image), 'image/png')}
+    return {'file': ('processed.jpg', bytes(image), 'image/jpeg')}
+
+
+def parse_response(backend, response, overlay, started):
+    """(text, words, error) from an OCR.space response (requests or httpx, same attributes)"""
+    log_event('ocr_response', sampled=True, backend=backend, status=response.status_code,
+              ms=elapsed_ms(started), response=response.text[:LOG_RESPONSE_CHARS])
+
+    if response.status_code in QUOTA_STATUSES:
+        return None, None, QUOTA_ERROR
+    if response.status_code != 200:
+        return None, None, "API Error"
+
+    result = response.json()
+    if result.get('OCRExitCode') == 1:
+        parsed = result['ParsedResults'][0]
+        return parsed['ParsedText'], parse_overlay(parsed) if overlay else None, None
+    else:
+        message = result.get('ErrorMessage', 'Unknown OCR error')
+        if isinstance(message, list):
+            message = ' '.join(message)
+        if any(word in str(message).lower() for word in QUOTA_MESSAGES):
+            return None, None, QUOTA_ERROR
+        return None, None, message
+
+
+class OCRSpaceClient(OCRBackend):
+    """OCR.space client shared across requests.
+
+    Owns a keep-alive, connection-pooled session so each reading reuses an
+    open TLS connection instead of paying DNS + TCP + TLS setup every time.
+    """
+    name = 'ocrspace'
+
+    def __init__(self, api_key, api_url=OCR_API_URL, pool_size=10,
+                 connect_timeout=5.0, read_timeout=30.0, max_retries=2, backoff=0.5, overlay=False):
+        self.api_key = api_key
+        self.overlay = overlay
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = self._build_session(pool_size, max_retries, backoff)
+
+    @staticmethod
+    def _build_session(pool_size, max_retries, backoff):
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,  # OCR.space only takes POST, which urllib3 skips by default
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def request(self, image):
+        """Sends an image to OCR.space; accepts a file path or already-encoded JPEG bytes.
+
+        Returns (text, error) like the rest of the pipeline.
+        """
+        text, _, error = self.request_detailed(image)
+        return text, error
+
+    def request_detailed(self, image):
+        """Like request, plus the word boxes when the client was built with overlay=True"""
+        text, words, error, _ = self.request_counted(image)
+        return text, words, error
+
+    def request_counted(self, image):
+        """request_detailed plus the number of HTTP responses the call got, retried ones included.
+
+        That is what OCR.space bills; a timeout or dropped connection got
+        none (attempts answered before a final failure are not known then).
+        """
+        started = time.perf_counter()
+        try:
+            data = form_fields(self.api_key, self.overlay)
+            if isinstance(image, (bytes, bytearray)):
+                response = self.session.post(self.api_url, files=file_part(image), data=data, timeout=self.timeout)
+            else:
+                with open(image, 'rb') as f:
+                    files = {'file': f}
+                    response = self.session.post(self.api_url, files=files, data=data, timeout=self.timeout)
+
+            retries = getattr(response.raw, 'retries', None)
+            responses = 1 + sum(attempt.status is not None for attempt in (retries.history if retries else ()))
+            return (*parse_response(self.name, response, self.overlay, started), responses)
+
+        except requests.exceptions.Timeout:
+            log_event('ocr_timeout', logging.WARNING, backend=self.name, ms=elapsed_ms(started))
+            return None, None, "OCR request timed out", 0
+        except requests.exceptions.ConnectionError as e:
+            # Once retries are exhausted urllib3 wraps the timeout in a MaxRetryError
+            if isinstance(getattr(e.args[0], 'reason', None), Urllib3Timeout):
+                log_event('ocr_timeout', logging.WARNING, backend=self.name, ms=elapsed_ms(started))
+                return None, None, "OCR request timed out", 0
+            log_event('ocr_request_failed', logging.ERROR, backend=self.name, error=str(e))
+            return None, None, str(e), 0
+        except Exception as e:
+            log_event('ocr_request_failed', logging.ERROR, backend=self.name, error=str(e))
+            return None, None, str(e), 0
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOCRSpaceClient:
+    """Non-blocking OCR.space client for the ASGI server (needs httpx).
+
+    Same request and result shape as OCRSpaceClient, but awaited: a
+    request waiting on the API holds a coroutine, not a thread, so one
+    process can have hundreds in flight over max_connections pooled
+    keep-alive connections. Gateway errors and dropped connections are
+    retried with the same exponential backoff as the blocking client.
+    Takes encoded image bytes only.
+    """
+    name = 'ocrspace'
+
+    def __init__(self, api_key, api_url=OCR_API_URL, max_connections=100,
+                 connect_timeout=5.0, read_timeout=30.0, max_retries=2, backoff=0.5, overlay=False):
+        import httpx
+
+        self.httpx = httpx
+        self.api_key = api_key
+        self.api_url = api_url
+        self.overlay = overlay
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    async def request_detailed(self, image):
+        text, words, error, _ = await self.request_counted(image)
+        return text, words, error
+
+    async def request_counted(self, image):
+        """request_detailed plus the number of HTTP responses the call got, as OCRSpaceClient.request_counted"""
+        started = time.perf_counter()
+        data = form_fields(self.api_key, self.overlay)
+        responses = 0
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                response = await self.client.post(self.api_url, data=data, files=file_part(image))
+            except self.httpx.TimeoutException:
+                if last:
+                    log_event('ocr_timeout', logging.WARNING, backend=self.name, ms=elapsed_ms(started))
+                    return None, None, "OCR request timed out", responses
+            except self.httpx.TransportError as e:
+                if last:
+                    log_event('ocr_request_failed', logging.ERROR, backend=self.name, error=str(e))
+                    return None, None, str(e), responses
+            else:
+                responses += 1
+                if response.status_code not in RETRY_STATUSES or last:
+                    try:
+                        return (*parse_response(self.name, response, self.overlay, started), responses)
+                    except Exception as e:
+                        log_event('ocr_request_failed', logging.ERROR, backend=self.name, error=str(e))
+                        return None, None, str(e), responses
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def request(self, image):
+        text, _, error = await self.request_detailed(image)
+        return text, error
+
+    async def aclose(self):
+        await self.client.aclose()
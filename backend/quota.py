@@ -0,0 +1,320 @@
+import asyncio
+import calendar
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from event_log import log_event
+from metrics import OCR_CALLS
+from ocr_backends import QUOTA_ERROR, OCRBackend
+
+
+class TokenBucket:
+    """Per-minute rate limit that allows short bursts of up to `burst` calls"""
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout=0.0):
+        """Takes one token, waiting up to timeout seconds for one to refill; False if none did"""
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(min((1 - self.tokens) / self.rate, remaining))
+
+    def available(self):
+        with self.cond:
+            self._refill()
+            return round(self.tokens, 2)
+
+
+def _day(now=None):
+    return datetime.fromtimestamp(now or time.time(), tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+class UsageStore:
+    """Calls per backend per UTC day, in SQLite so the monthly count survives restarts"""
+
+    def __init__(self, db_path=None):
+        self.db = sqlite3.connect(db_path or ':memory:', check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS ocr_usage '
+                '(backend TEXT NOT NULL, day TEXT NOT NULL, calls INTEGER NOT NULL, '
+                'PRIMARY KEY (backend, day))'
+            )
+            self.db.commit()
+
+    def add(self, backend, calls=1):
+        with self.lock:
+            self.db.execute(
+                'INSERT INTO ocr_usage (backend, day, calls) VALUES (?, ?, ?) '
+                'ON CONFLICT (backend, day) DO UPDATE SET calls = calls + excluded.calls',
+                (backend, _day(), calls),
+            )
+            self.db.commit()
+
+    def month_total(self, backend, month=None):
+        month = month or _day()[:7]
+        with self.lock:
+            row = self.db.execute('SELECT COALESCE(SUM(calls), 0) FROM ocr_usage WHERE backend = ? AND day LIKE ?',
+                                  (backend, month + '-%')).fetchone()
+        return row[0]
+
+    def daily(self, month=None):
+        """{day: {backend: calls}} for one month"""
+        month = month or _day()[:7]
+        with self.lock:
+            rows = self.db.execute('SELECT day, backend, calls FROM ocr_usage WHERE day LIKE ? ORDER BY day',
+                                   (month + '-%',)).fetchall()
+        days = {}
+        for day, backend, calls in rows:
+            days.setdefault(day, {})[backend] = calls
+        return days
+
+    def close(self):
+        self.db.close()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class QuotaGovernor(OCRBackend):
+    """Wraps a metered OCR backend (OCR.space) with its quota rules.
+
+    - calls are counted per day in a UsageStore against monthly_limit;
+      once fewer than `reserve` calls remain, traffic moves to `fallback`
+    - a TokenBucket enforces the per-minute rate; a call waits up to
+      max_wait seconds for a token before falling back
+    - identical payloads already in flight share that one call
+    - `strikes` quota errors from the API in a row pause the primary for
+      `pause` seconds, doubling with each further one up to `cooldown`;
+      a stray one only diverts its own call
+
+    Without a fallback, a call that cannot go to the primary returns
+    QUOTA_ERROR instead of spending quota the account does not have. The
+    fallback is given the primary's payload, so it must read the same
+    input (not a wants_display engine).
+    """
+
+    def __init__(self, primary, fallback=None, usage=None, monthly_limit=25000, reserve=500,
+                 rate_per_minute=60, burst=10, max_wait=5.0, cooldown=60.0, strikes=3, pause=1.0):
+        if fallback is not None and (fallback.wants_display or fallback.name == primary.name):
+            raise ValueError(f"{fallback.name} cannot stand in for {primary.name}: it does not read the same payload")
+        self.primary = primary
+        self.fallback = fallback
+        self.usage = usage or UsageStore()
+        self.monthly_limit = monthly_limit
+        self.reserve = reserve
+        self.rate_per_minute = rate_per_minute
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.max_wait = max_wait
+        self.cooldown = cooldown
+        self.strikes = max(1, strikes)
+        self.pause = pause
+        self.quota_errors = 0  # in a row
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.inflight_async = {}
+
+    @property
+    def name(self):
+        return self.primary.name
+
+    @property
+    def accepts_arrays(self):
+        return self.primary.accepts_arrays
+
+    def budget_low(self):
+        if not self.monthly_limit:
+            return False
+        return self.usage.month_total(self.primary.name) >= self.monthly_limit - self.reserve
+
+    def request(self, image):
+        text, _, error = self.request_detailed(image)
+        return text, error
+
+    def request_detailed(self, image):
+        key = hashlib.sha256(image).hexdigest() if isinstance(image, (bytes, bytearray)) else None
+        if key is None:
+            return self._call(image)
+
+        with self.lock:
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = _InFlight()
+        if not leader:
+            OCR_CALLS.inc(backend=self.primary.name, route='coalesced')
+            call.done.wait()
+            return call.result
+
+        try:
+            call.result = self._call(image)
+        except Exception as e:
+            call.result = (None, None, str(e))
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def _call(self, image):
+        reason = self._gate()
+        if reason is None and not self.bucket.acquire(self.max_wait):
+            reason = 'rate'
+        if reason:
+            return self._fall_back(image, reason)
+
+        text, words, error, responses = self._request_primary(image)
+        if self._settle(error, responses):
+            return self._fall_back(image, 'quota')
+        return text, words, error
+
+    def _request_primary(self, image):
+        """(text, words, error, HTTP responses billed); a primary that cannot tell counts as one"""
+        if hasattr(self.primary, 'request_counted'):
+            return self.primary.request_counted(image)
+        return (*self.primary.request_detailed(image), 1)
+
+    def _gate(self):
+        """Why the primary cannot be called right now (ignoring the rate limit), or None"""
+        if self.budget_low():
+            return 'budget'
+        if time.time() < self.paused_until:
+            return 'quota'
+        return None
+
+    def _settle(self, error, responses=1):
+        """Books the HTTP responses a primary call got; True when the API said the quota is used up"""
+        if responses:
+            self.usage.add(self.primary.name, responses)
+        if error != QUOTA_ERROR:
+            with self.lock:
+                self.quota_errors = 0
+            OCR_CALLS.inc(backend=self.primary.name, route='primary')
+            return False
+        with self.lock:
+            self.quota_errors += 1
+            pause = 0.0
+            if self.quota_errors >= self.strikes:
+                pause = min(self.cooldown, self.pause * 2 ** (self.quota_errors - self.strikes))
+                self.paused_until = time.time() + pause
+        log_event('ocr_quota_exceeded', logging.WARNING, backend=self.primary.name, pause=pause)
+        return True
+
+    async def request_detailed_async(self, image, primary):
+        """request_detailed for the event loop.
+
+        primary is an async client of the same API (AsyncOCRSpaceClient);
+        the same budget, pause, rate limit and usage rules apply, and
+        identical payloads in flight share one call. SQLite bookkeeping
+        and the (blocking) fallback run in the default executor.
+        """
+        key = hashlib.sha256(image).hexdigest()
+        while key in self.inflight_async:
+            call = self.inflight_async[key]
+            OCR_CALLS.inc(backend=self.primary.name, route='coalesced')
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                if not call.cancelled():
+                    raise
+                # The leader was cancelled: the first follower to get here makes the call itself
+
+        call = self.inflight_async[key] = asyncio.get_running_loop().create_future()
+        try:
+            try:
+                result = await self._call_async(image, primary)
+            except Exception as e:
+                result = (None, None, str(e))
+            call.set_result(result)
+            return result
+        finally:
+            self.inflight_async.pop(key, None)
+            if not call.done():
+                call.cancel()
+
+    async def _call_async(self, image, primary):
+        reason = await asyncio.to_thread(self._gate)
+        if reason is None:
+            # Poll the bucket instead of blocking a thread in acquire()
+            deadline = time.monotonic() + self.max_wait
+            while not self.bucket.acquire(0):
+                if time.monotonic() >= deadline:
+                    reason = 'rate'
+                    break
+                await asyncio.sleep(min(0.05, max(0.0, deadline - time.monotonic())))
+        if reason:
+            return await asyncio.to_thread(self._fall_back, image, reason)
+
+        if hasattr(primary, 'request_counted'):
+            text, words, error, responses = await primary.request_counted(image)
+        else:
+            text, words, error = await primary.request_detailed(image)
+            responses = 1
+        if await asyncio.to_thread(self._settle, error, responses):
+            return await asyncio.to_thread(self._fall_back, image, 'quota')
+        return text, words, error
+
+    def _fall_back(self, image, reason):
+        if self.fallback is None:
+            OCR_CALLS.inc(backend=self.primary.name, route=f'refused_{reason}')
+            return None, None, QUOTA_ERROR
+        OCR_CALLS.inc(backend=self.fallback.name, route=f'fallback_{reason}')
+        log_event('ocr_fallback', sampled=True, backend=self.fallback.name, reason=reason)
+        self.usage.add(self.fallback.name)
+        return self.fallback.request_detailed(image)
+
+    def report(self):
+        """Usage this month and the run rate it implies, for capacity planning"""
+        now = datetime.now(timezone.utc)
+        month = now.strftime('%Y-%m')
+        used = self.usage.month_total(self.primary.name, month)
+        days_in_month = calendar.monthrange(now.year, now.month)[1]
+        elapsed_days = (now.day - 1) + (now.hour * 3600 + now.minute * 60 + now.second) / 86400.0
+        return {
+            'backend': self.primary.name,
+            'fallback': self.fallback.name if self.fallback else None,
+            'month': month,
+            'used': used,
+            'monthly_limit': self.monthly_limit,
+            'remaining': max(0, self.monthly_limit - used) if self.monthly_limit else None,
+            'reserve': self.reserve,
+            'budget_low': self.budget_low(),
+            'projected_month_total': round(used / elapsed_days * days_in_month) if elapsed_days > 0 else used,
+            'paused_for_seconds': max(0.0, round(self.paused_until - time.time(), 1)),
+            'rate_per_minute': self.rate_per_minute,
+            'tokens_available': self.bucket.available(),
+            'daily': self.usage.daily(month),
+        }
+
+    def close(self):
+        self.primary.close()
+        self.usage.close()
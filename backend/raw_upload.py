@@ -0,0 +1,66 @@
+RAW_CONTENT_TYPES = ('image/jpeg', 'image/jpg', 'image/png', 'application/octet-stream')
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class IncompleteBody(Exception):
+    pass
+
+
+def is_raw_image(content_type):
+    return (content_type or '').split(';')[0].strip().lower() in RAW_CONTENT_TYPES
+
+
+def read_body(stream, content_length, max_bytes, chunk_size=64 * 1024):
+    """Reads a raw request body into one bytearray, refusing anything over max_bytes.
+
+    With a Content-Length the buffer is allocated once at that size and
+    filled in place; a chunked body (no length) grows the buffer chunk by
+    chunk until the stream ends. Either way the result is handed to
+    decode_image as is, with no intermediate copies.
+    """
+    if content_length is not None:
+        if content_length > max_bytes:
+            raise BodyTooLarge(content_length)
+        buf = bytearray(content_length)
+        view = memoryview(buf)
+        pos = 0
+        while pos < content_length:
+            n = stream.readinto(view[pos:pos + chunk_size])
+            if not n:
+                raise IncompleteBody(pos)
+            pos += n
+        return buf
+
+    buf = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return buf
+        if len(buf) + len(chunk) > max_bytes:
+            raise BodyTooLarge(len(buf) + len(chunk))
+        buf += chunk
+
+
+async def read_body_async(receive, content_length, max_bytes):
+    """read_body for ASGI: collects http.request messages until more_body is False"""
+    if content_length is not None and content_length > max_bytes:
+        raise BodyTooLarge(content_length)
+    buf = bytearray(content_length) if content_length is not None else bytearray()
+    pos = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise IncompleteBody(pos)
+        chunk = message.get('body', b'')
+        if pos + len(chunk) > (content_length if content_length is not None else max_bytes):
+            raise BodyTooLarge(pos + len(chunk))
+        buf[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+        if not message.get('more_body', False):
+            break
+    if content_length is not None and pos < content_length:
+        raise IncompleteBody(pos)
+    return buf
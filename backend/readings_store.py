@@ -0,0 +1,179 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def parse_timestamp(value):
+    """Epoch seconds or ISO 8601 (naive means UTC) -> epoch seconds; None if unparseable"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+# Stored readings that a later run of agreeing readings showed to be misreads;
+# they stay in range() for auditing but no longer anchor validation or consumption
+SUPERSEDED = 'superseded'
+
+
+class ReadingsStore:
+    """Time series of accepted readings per meter, in SQLite (WAL mode).
+
+    Rows are indexed on (meter_id, captured_at) so range queries and
+    consumption deltas never touch images or the OCR backend. Readings
+    validation turned down are kept apart in `rejections`.
+    """
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS readings ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, meter_id TEXT NOT NULL, '
+                'captured_at REAL NOT NULL, reading TEXT NOT NULL, raw_text TEXT, '
+                'confidence REAL, source TEXT, created REAL NOT NULL)'
+            )
+            self.db.execute(
+                'CREATE INDEX IF NOT EXISTS readings_meter_time ON readings (meter_id, captured_at, id)'
+            )
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS rejections ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, meter_id TEXT NOT NULL, '
+                'captured_at REAL NOT NULL, reading TEXT NOT NULL)'
+            )
+            self.db.execute(
+                'CREATE INDEX IF NOT EXISTS rejections_meter_time ON rejections (meter_id, captured_at, id)'
+            )
+            self.db.commit()
+
+    def add(self, meter_id, reading, captured_at=None, raw_text=None, confidence=None, source='ocr'):
+        now = time.time()
+        with self.lock:
+            cursor = self.db.execute(
+                'INSERT INTO readings (meter_id, captured_at, reading, raw_text, confidence, source, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (meter_id, captured_at or now, reading, raw_text, confidence, source, now),
+            )
+            self.db.commit()
+            return cursor.lastrowid
+
+    @staticmethod
+    def _row(row):
+        row_id, captured_at, reading, raw_text, confidence, source = row
+        return {
+            'id': row_id,
+            'captured_at': format_timestamp(captured_at),
+            'reading': reading,
+            'raw_text': raw_text,
+            'confidence': confidence,
+            'source': source,
+        }
+
+    def range(self, meter_id, start=None, end=None, limit=100, after=None):
+        """Readings in [start, end] oldest first, at most limit per page.
+
+        after is the id of the last row of the previous page; returns
+        (rows, next_after) with next_after None on the final page.
+        """
+        sql = ('SELECT id, captured_at, reading, raw_text, confidence, source FROM readings '
+               'WHERE meter_id = ? AND captured_at >= ? AND captured_at <= ?')
+        params = [meter_id, start if start is not None else float('-inf'),
+                  end if end is not None else float('inf')]
+        if after is not None:
+            # Keyset pagination: resume strictly after the previous page's last (captured_at, id)
+            sql += ' AND (captured_at, id) > (SELECT captured_at, id FROM readings WHERE id = ?)'
+            params.append(after)
+        sql += ' ORDER BY captured_at, id LIMIT ?'
+        params.append(limit + 1)
+
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        more = len(rows) > limit
+        rows = [self._row(row) for row in rows[:limit]]
+        return rows, (rows[-1]['id'] if more else None)
+
+    def last(self, meter_id, before=None):
+        """Most recent reading for a meter, optionally strictly before a capture time"""
+        sql = ('SELECT id, captured_at, reading, raw_text, confidence, source FROM readings '
+               'WHERE meter_id = ? AND COALESCE(source, \'\') != ?')
+        params = [meter_id, SUPERSEDED]
+        if before is not None:
+            sql += ' AND captured_at < ?'
+            params.append(before)
+        sql += ' ORDER BY captured_at DESC, id DESC LIMIT 1'
+        with self.lock:
+            row = self.db.execute(sql, params).fetchone()
+        return self._row(row) if row else None
+
+    def consumption(self, meter_id, start=None, end=None):
+        """Deltas between consecutive readings in [start, end], with counter roll-over handled"""
+        sql = ('SELECT captured_at, reading FROM readings WHERE meter_id = ? '
+               'AND captured_at >= ? AND captured_at <= ? AND COALESCE(source, \'\') != ? '
+               'ORDER BY captured_at, id')
+        params = (meter_id, start if start is not None else float('-inf'),
+                  end if end is not None else float('inf'), SUPERSEDED)
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+
+        deltas, total = [], 0
+        for (prev_at, prev), (at, current) in zip(rows, rows[1:]):
+            # A 5-drum counter wraps 99999 -> 00000
+            delta = (int(current) - int(prev)) % (10 ** max(len(current), len(prev)))
+            total += delta
+            deltas.append({
+                'from': format_timestamp(prev_at),
+                'to': format_timestamp(at),
+                'start_reading': prev,
+                'end_reading': current,
+                'delta': delta,
+            })
+        return deltas, total
+
+    def supersede(self, row_id):
+        """Marks a stored reading as a misread (see SUPERSEDED)"""
+        with self.lock:
+            self.db.execute('UPDATE readings SET source = ? WHERE id = ?', (SUPERSEDED, row_id))
+            self.db.commit()
+
+    def reject(self, meter_id, reading, captured_at=None):
+        """Keeps a reading validation turned down; ones older than the meter's last reading are dropped"""
+        with self.lock:
+            self.db.execute(
+                'DELETE FROM rejections WHERE meter_id = ? AND captured_at < '
+                '(SELECT MAX(captured_at) FROM readings WHERE meter_id = ? AND COALESCE(source, \'\') != ?)',
+                (meter_id, meter_id, SUPERSEDED),
+            )
+            self.db.execute('INSERT INTO rejections (meter_id, captured_at, reading) VALUES (?, ?, ?)',
+                            (meter_id, captured_at or time.time(), reading))
+            self.db.commit()
+
+    def rejections(self, meter_id, after=None, before=None):
+        """(reading, epoch) pairs turned down in (after, before), oldest first"""
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT reading, captured_at FROM rejections WHERE meter_id = ? AND captured_at > ? '
+                'AND captured_at < ? ORDER BY captured_at, id',
+                (meter_id, after if after is not None else float('-inf'),
+                 before if before is not None else float('inf')),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,100 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(data, *parts):
+    """SHA-256 of the raw image bytes plus whatever else shapes the result"""
+    digest = hashlib.sha256(data)
+    for part in parts:
+        digest.update(b'\0' + str(part).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def reading_key(data, signature, backend_name, pipeline='single'):
+    """Cache key of a reading: /upload, the ASGI app and /upload/batch all build it here.
+
+    signature is preprocessing.config_signature of the crop/filter config;
+    pipeline is 'single' or 'consensus', which can read the same bytes
+    differently.
+    """
+    return cache_key(data, signature, backend_name, pipeline)
+
+
+class ResultCache:
+    """Meter readings and their confidence keyed by content hash.
+
+    An in-memory LRU tier with a TTL sits in front of an optional SQLite
+    tier, so retried uploads and archive replays skip preprocessing and the
+    OCR call entirely. max_entries=0 disables the memory tier.
+    """
+
+    def __init__(self, max_entries=1024, ttl=86400, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS ocr_cache '
+                '(key TEXT PRIMARY KEY, reading TEXT NOT NULL, created REAL NOT NULL, confidence REAL)'
+            )
+            # Cache files written before confidences were kept
+            if 'confidence' not in [row[1] for row in self.db.execute('PRAGMA table_info(ocr_cache)')]:
+                self.db.execute('ALTER TABLE ocr_cache ADD COLUMN confidence REAL')
+            self.db.commit()
+
+    def _expired(self, created):
+        return self.ttl and time.time() - created > self.ttl
+
+    def get(self, key):
+        """(reading, confidence) stored under key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                reading, confidence, created = entry
+                if not self._expired(created):
+                    self.entries.move_to_end(key)
+                    return reading, confidence
+                del self.entries[key]
+
+            if self.db is None:
+                return None
+
+            row = self.db.execute('SELECT reading, confidence, created FROM ocr_cache WHERE key = ?',
+                                  (key,)).fetchone()
+            if row is None:
+                return None
+            reading, confidence, created = row
+            if self._expired(created):
+                self.db.execute('DELETE FROM ocr_cache WHERE key = ?', (key,))
+                self.db.commit()
+                return None
+
+            self._remember(key, reading, confidence, created)
+            return reading, confidence
+
+    def set(self, key, reading, confidence=None):
+        created = time.time()
+        with self.lock:
+            self._remember(key, reading, confidence, created)
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO ocr_cache (key, reading, created, confidence) '
+                                'VALUES (?, ?, ?, ?)', (key, reading, created, confidence))
+                self.db.commit()
+
+    def _remember(self, key, reading, confidence, created):
+        if not self.max_entries:
+            return
+        self.entries[key] = (reading, confidence, created)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
@@ -0,0 +1,48 @@
+def allowed_delta(last_at, captured_at, max_rate_per_hour):
+    """Largest plausible increase between two capture times"""
+    hours = max(0.0, (captured_at - last_at) / 3600.0) if last_at and captured_at else 0.0
+    # One unit of slack so a drum caught mid-roll or a clock skew is not rejected
+    return max_rate_per_hour * hours + 1
+
+
+def is_plausible(candidate, last_reading, allowed):
+    """A counter only goes up - possibly wrapping 99999 -> 00000 - and only so fast"""
+    modulus = 10 ** max(len(candidate), len(last_reading))
+    delta = (int(candidate) - int(last_reading)) % modulus
+    return delta <= allowed
+
+
+def choose_reading(candidates, last_reading, last_at, captured_at, max_rate_per_hour):
+    """Picks the first candidate consistent with the meter's last reading.
+
+    With no last_reading (a meter without history) the first candidate
+    wins. Returns (reading, rejected candidates).
+    """
+    if not candidates:
+        return None, []
+    if not last_reading:
+        return candidates[0], []
+
+    allowed = allowed_delta(last_at, captured_at, max_rate_per_hour)
+    rejected = []
+    for candidate in candidates:
+        if is_plausible(candidate, last_reading, allowed):
+            return candidate, rejected
+        rejected.append(candidate)
+    return None, rejected
+
+
+def rejection_run(candidate, captured_at, rejections, max_rate_per_hour):
+    """The meter's latest rejections that candidate continues, oldest first, ending with candidate.
+
+    rejections are (reading, epoch) pairs oldest first. The run is walked
+    back from the newest for as long as each reading follows plausibly
+    from the one before it; a misread in between ends it. A long run means
+    the OCR agrees with itself and the stored history is what is wrong.
+    """
+    run = [(candidate, captured_at)]
+    for reading, at in reversed(rejections):
+        if not is_plausible(run[0][0], reading, allowed_delta(at, run[0][1], max_rate_per_hour)):
+            break
+        run.insert(0, (reading, at))
+    return run
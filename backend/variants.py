@@ -0,0 +1,130 @@
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import cv2
+
+from metrics import STAGE_SECONDS
+from preprocessing import PREPROCESS_CONFIG, filter_display, prepare_for_ocr
+
+
+def _gray(crop):
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+
+
+def _otsu(crop):
+    return cv2.threshold(_gray(crop), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+# The pipelines Tests/manualTest.py and Tests/cOCR.py compared by hand, plus
+# the production chain. Each takes the cropped BGR display and returns the
+# image handed to OCR.
+VARIANTS = {
+    'bilateral_adaptive': lambda crop: filter_display(crop, PREPROCESS_CONFIG),
+    'gaussian': lambda crop: cv2.GaussianBlur(_gray(crop), (3, 3), 0),
+    'otsu': _otsu,
+    'adaptive': lambda crop: cv2.adaptiveThreshold(_gray(crop), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                                   cv2.THRESH_BINARY, 11, 2),
+    'inverted': lambda crop: cv2.bitwise_not(_otsu(crop)),
+    'gray': _gray,
+}
+
+
+class VariantStats:
+    """Running hit rate per variant: how often it agreed with the final vote"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.attempts = Counter()
+        self.hits = Counter()
+
+    def rate(self, name):
+        # Laplace smoothing so untried variants are neither first nor last forever
+        return (self.hits[name] + 1) / (self.attempts[name] + 2)
+
+    def ordered(self, names):
+        with self.lock:
+            return sorted(names, key=lambda name: -self.rate(name))
+
+    def record(self, results, winner):
+        with self.lock:
+            for name, reading in results.items():
+                self.attempts[name] += 1
+                if winner and reading == winner:
+                    self.hits[name] += 1
+
+
+def ocr_variant(name, crop, backend):
+    """Preprocesses a display crop with one variant and OCRs it; returns (text, error)"""
+    with STAGE_SECONDS.time(stage='filter'):
+        processed = VARIANTS[name](crop)
+    if not backend.accepts_arrays:
+        with STAGE_SECONDS.time(stage='encode'):
+            processed, _ = prepare_for_ocr(processed)
+        if processed is None:
+            return None, 'Image preprocessing failed'
+    with STAGE_SECONDS.time(stage='ocr'):
+        return backend.request(processed)
+
+
+def _run_variant(name, crop, backend, extract):
+    ocr_text, error = ocr_variant(name, crop, backend)
+    if error:
+        return None, error
+    return extract(ocr_text), None
+
+
+def read_with_consensus(crop, backend, extract, pool, stats, names=None, concurrency=3, agree=2):
+    """OCRs several preprocessing variants of one display crop and votes on the reading.
+
+    Variants run best-hit-rate first, at most `concurrency` at a time, and
+    stop early once `agree` of them return the same reading. Returns a dict
+    with the winning reading (or None), its votes, every variant's reading
+    and the first OCR error seen.
+    """
+    order = stats.ordered(names or list(VARIANTS))
+    results, first_error = {}, None
+    pending = {}
+    queued = list(order)
+
+    def fill():
+        while queued and len(pending) < concurrency:
+            name = queued.pop(0)
+            pending[pool.submit(_run_variant, name, crop, backend, extract)] = name
+
+    fill()
+    votes = Counter()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            try:
+                reading, error = future.result()
+            except Exception as e:
+                reading, error = None, str(e)
+            results[name] = reading
+            if error and first_error is None:
+                first_error = error
+            if reading:
+                votes[reading] += 1
+
+        if votes and votes.most_common(1)[0][1] >= agree:
+            break
+        fill()
+
+    for future in pending:
+        future.cancel()
+
+    winner = None
+    if votes:
+        # Ties go to the reading from the variant with the better track record
+        top = max(votes.values())
+        winner = next(results[name] for name in order if name in results and votes[results[name]] == top)
+
+    stats.record(results, winner)
+    return {
+        'reading': winner,
+        'votes': votes[winner] if winner else 0,
+        'variants': results,
+        'error': first_error,
+    }
@@ -4,6 +4,9 @@
 #include <WiFiClientSecure.h>
 #include <time.h>
 #include "secrets.h"
+#ifndef BACKEND_UPLOAD_URL
+#define BACKEND_UPLOAD_URL ""  // Older secrets.h files: keep uploading to GitHub
+#endif
 #include <esp_sleep.h>
 #include <Base64.h>
 
@@ -22,6 +25,9 @@ ScheduleTime photo_schedule[] = {
 };
 const int NUM_SCHEDULES = sizeof(photo_schedule) / sizeof(photo_schedule[0]);
 
+// Extra captures when the backend refuses a frame as too dark, overexposed, glared or blurry
+const int MAX_RECAPTURES = 2;
+
 // === Function Prototypes ===
 void connectWiFi();
 void syncTime();
@@ -32,6 +38,9 @@ void go_to_sleep_until_next_schedule(int sleep_seconds);
 bool is_scheduled_now(struct tm timeinfo);
 String getTimestampFilename();
 bool upload_to_github(const uint8_t* image_data, size_t image_len, const String& filename);
+bool upload_to_backend(const uint8_t* image_data, size_t image_len, const String& filename, String& recapture);
+void adjust_camera_for(const String& recapture);
+String json_string_field(const String& json, const char* key);
 bool resolve_dns(const char* hostname);
 
 void setup() {
@@ -196,20 +205,58 @@ bool take_and_upload_photo() {
     delay(100); // Brief delay between warm-up captures
   }
 
-  // Capture final photo
-  camera_fb_t *fb = esp_camera_fb_get();
-  if (!fb) {
-    Serial.println("Camera capture failed");
-    return false;
-  }
-
   String filename = getTimestampFilename();
-  bool upload_success = upload_to_github(fb->buf, fb->len, filename);
+  bool upload_success = false;
+  for (int attempt = 0; attempt <= MAX_RECAPTURES; attempt++) {
+    // Capture final photo
+    camera_fb_t *fb = esp_camera_fb_get();
+    if (!fb) {
+      Serial.println("Camera capture failed");
+      return false;
+    }
 
-  esp_camera_fb_return(fb);
+    // Straight to the reading backend when configured: the raw frame, no base64 copy in RAM
+    String recapture = "";
+    upload_success = strlen(BACKEND_UPLOAD_URL) > 0
+        ? upload_to_backend(fb->buf, fb->len, filename, recapture)
+        : upload_to_github(fb->buf, fb->len, filename);
+    esp_camera_fb_return(fb);
+
+    if (recapture.length() == 0) {
+      break;
+    }
+    Serial.println("Backend asked for a recapture: " + recapture);
+    adjust_camera_for(recapture);
+  }
+
+  sensor_t *sensor = esp_camera_sensor_get();
+  if (sensor) {
+    sensor->set_ae_level(sensor, 0);
+  }
   return upload_success;
 }
 
+// === Camera adjustment before a recapture ===
+// Shifts auto exposure for exposure problems; every reason gets a settle delay and a
+// discarded frame so the next capture reflects the change (and a steadier camera)
+void adjust_camera_for(const String& recapture) {
+  sensor_t *sensor = esp_camera_sensor_get();
+  if (sensor) {
+    if (recapture == "too_dark") {
+      sensor->set_ae_level(sensor, 2);
+    } else if (recapture == "overexposed") {
+      sensor->set_ae_level(sensor, -2);
+    } else if (recapture == "glare") {
+      sensor->set_ae_level(sensor, -1);
+    }
+  }
+  delay(500);
+  camera_fb_t *fb = esp_camera_fb_get();
+  if (fb) {
+    esp_camera_fb_return(fb);
+  }
+}
+
 // === DNS Resolution Check ===
 bool resolve_dns(const char* hostname) {
   IPAddress ip;
@@ -284,6 +331,70 @@ bool upload_to_github(const uint8_t* image_data, size_t image_len, const String&
   return false;
 }
 
+// === Backend upload function ===
+// POSTs the frame buffer as-is (Content-Type: image/jpeg) to the backend's /upload/raw,
+// with the device id and capture time in headers. A frame the backend cannot use comes back
+// as 422 with a "recapture" reason, which is passed out in recapture
+bool upload_to_backend(const uint8_t* image_data, size_t image_len, const String& filename, String& recapture) {
+  if (WiFi.status() != WL_CONNECTED) {
+    Serial.println("WiFi not connected, attempting to reconnect...");
+    connectWiFi();
+    if (WiFi.status() != WL_CONNECTED) {
+      Serial.println("WiFi reconnection failed, cannot upload");
+      return false;
+    }
+  }
+
+  WiFiClientSecure secure_client;
+  WiFiClient plain_client;
+  HTTPClient http;
+  String url = String(BACKEND_UPLOAD_URL);
+  bool started;
+  if (url.startsWith("https://")) {
+    secure_client.setInsecure(); // As for the GitHub upload
+    started = http.begin(secure_client, url);
+  } else {
+    started = http.begin(plain_client, url);
+  }
+  if (!started) {
+    Serial.println("HTTP client initialization failed");
+    return false;
+  }
+
+  http.setTimeout(10000);
+  http.addHeader("Content-Type", "image/jpeg");
+  http.addHeader("X-Device-Id", DEVICE_HOSTNAME);
+  http.addHeader("X-Capture-Time", String((long)time(nullptr)));
+  http.addHeader("X-Filename", filename);
+
+  Serial.printf("Sending %u byte frame to backend...\n", (unsigned)image_len);
+  int httpCode = http.POST((uint8_t*)image_data, image_len);
+  String response = http.getString();
+  http.end();
+
+  Serial.printf("HTTP response code: %d\n", httpCode);
+  Serial.println("Response: " + response);
+  if (httpCode == 422) {
+    recapture = json_string_field(response, "recapture");
+  }
+  // Otherwise 422 means the frame arrived but had no readable counter; retrying will not change that
+  return httpCode == 200 || httpCode == 202 || httpCode == 422;
+}
+
+// === Minimal JSON lookup ===
+// Value of a top-level string field, or "" when absent; enough for the backend's flat replies
+String json_string_field(const String& json, const char* key) {
+  int at = json.indexOf(String("\"") + key + "\"");
+  if (at < 0) return "";
+  int colon = json.indexOf(':', at);
+  if (colon < 0) return "";
+  int start = json.indexOf('"', colon + 1);
+  if (start < 0) return "";
+  int end = json.indexOf('"', start + 1);
+  if (end < 0) return "";
+  return json.substring(start + 1, end);
+}
+
 // === Timestamped filename ===
 String getTimestampFilename() {
   time_t now = time(nullptr);
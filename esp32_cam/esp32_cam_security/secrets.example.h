@@ -23,6 +23,10 @@ const char* GITHUB_OWNER = "Anuja-jayasinghe";
 const char* GITHUB_REPO = "REPO_NAME";
 const char* GITHUB_BRANCH = "main";  // or "master"
 
+// Reading backend: when set, frames are POSTed raw to /upload/raw instead of the GitHub archive.
+// Optional: a secrets.h without it keeps uploading to GitHub.
+#define BACKEND_UPLOAD_URL ""  // e.g. "http://192.168.1.10:5000/upload/raw"
+
 // Time Configuration for Sri Lanka
 const long GMT_OFFSET_SEC = 19800;  // +5:30 hours (5.5 * 3600)
 const int DAYLIGHT_OFFSET_SEC = 0;   // No daylight saving in Sri Lanka